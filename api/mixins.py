@@ -0,0 +1,71 @@
+"""
+Serializer and viewset mixins shared by every API version
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from rest_framework import status
+from rest_framework.response import Response
+
+
+class FieldSelectionMixin:
+    """
+    Serializer mixin honouring `?fields=a,b,c`: every field not listed is
+    dropped, so clients only pay for the columns they read.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        requested = request.query_params.get('fields') if request is not None else None
+        if not requested:
+            return
+        allowed = {name.strip() for name in requested.split(',') if name.strip()}
+        for name in set(self.fields) - allowed:
+            self.fields.pop(name)
+
+
+class ConditionalETagMixin:
+    """
+    Viewset mixin adding ETag / If-None-Match support to list and retrieve.
+
+    The tag is computed from an aggregate over the filtered queryset (row
+    count and the latest value of each `etag_fields` column), so an
+    unchanged collection answers 304 without serializing a single row.
+    """
+    etag_fields = ('updated_datetime',)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self._conditional(request, queryset, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            **{self.lookup_field: kwargs[lookup_url_kwarg]}
+        )
+        return self._conditional(request, queryset, super().retrieve, *args, **kwargs)
+
+    def _conditional(self, request, queryset, view, *args, **kwargs):
+        aggregates = {'count': Count('pk', distinct=True), 'last_id': Max('pk')}
+        aggregates.update({f'max_{i}': Max(field) for i, field in enumerate(self.etag_fields)})
+        state = queryset.order_by().aggregate(**aggregates)
+        if not state['count']:
+            # Let the view answer (empty page or 404) without a tag
+            return view(request, *args, **kwargs)
+
+        # The tag also covers who is asking and how, since both change the body
+        key = repr([
+            self.action, sorted(state.items()), request.user.pk, request.version,
+            sorted(request.query_params.lists()),
+        ])
+        etag = f'"{hashlib.md5(key.encode()).hexdigest()}"'
+
+        if_none_match = request.headers.get('If-None-Match', '')
+        if etag in [tag.strip() for tag in if_none_match.split(',')]:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = view(request, *args, **kwargs)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
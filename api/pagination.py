@@ -0,0 +1,16 @@
+"""
+Pagination for the JSON API
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Opaque cursor over the primary key, newest first. Unlike page numbers the
+    cursor stays stable while rows are inserted, and each page is an index
+    range scan instead of an OFFSET.
+    """
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
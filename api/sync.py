@@ -0,0 +1,122 @@
+"""
+Delta sync for mobile clients.
+
+A sync token is an opaque, URL-safe string. It holds the time the previous
+sync started and, while a large change set is being paged through, a
+(updated_datetime, id) cursor for every collection that still has rows
+left. Rows are read through the indexed updated_datetime column, and deleted
+rows are reported from Tombstone.
+
+Changes are re-read from a few seconds before the token time, because a
+transaction can commit after a later one started; clients therefore apply
+every row as an upsert and may see a row twice.
+"""
+import base64
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Q
+from django.utils import timezone
+
+from common.exceptions import InvalidInputError
+from common.models import Tombstone
+from employe.models import Employe, Holiday
+from managers.models import Manager
+
+# Rows per collection in one sync response
+SYNC_PAGE_SIZE = 500
+
+# Re-read window covering transactions still in flight at the last sync
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+def encode_sync_token(state):
+    raw = json.dumps(state, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_sync_token(token):
+    """Token state, or an empty state for a first sync; raises InvalidInputError if malformed"""
+    if not token:
+        return {}
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        state = json.loads(raw)
+        if not isinstance(state, dict) or not isinstance(state.get('s', 0), int):
+            raise ValueError
+        return state
+    except (ValueError, TypeError):
+        raise InvalidInputError("Invalid sync token.")
+
+
+def _micros(value):
+    return int(value.timestamp() * 1_000_000)
+
+
+def _from_micros(value):
+    return datetime.fromtimestamp(value / 1_000_000, tz=dt_timezone.utc)
+
+
+def sync_collections(user, scope, profile, leave_requests):
+    """
+    (name, queryset, timestamp field) of every synced collection visible to
+    the caller; `leave_requests` is the caller's visible leave queryset.
+    """
+    employees = Employe.objects.select_related('user', 'manager')
+    managers = Manager.objects.select_related('user')
+    tombstones = Tombstone.objects.all()
+    if scope == 'manager':
+        employees = employees.filter(manager=profile)
+        managers = managers.filter(pk=profile.pk)
+        team_users = Employe.objects.filter(manager=profile).values('user')
+        tombstones = tombstones.filter(Q(kind='holiday') | Q(user=user) | Q(user__in=team_users))
+    elif scope != 'founder':
+        employees = employees.filter(user=user)
+        managers = managers.none()
+        tombstones = tombstones.filter(Q(kind='holiday') | Q(user=user))
+
+    return [
+        ('leave_requests', leave_requests, 'updated_datetime'),
+        ('holidays', Holiday.objects.all(), 'updated_datetime'),
+        ('employee_balances', employees, 'updated_datetime'),
+        ('manager_balances', managers, 'updated_datetime'),
+        ('deleted', tombstones, 'deleted_at'),
+    ]
+
+
+def read_changes(collections, token):
+    """
+    Changed rows per collection since the token, and the token for the next
+    call. Returns (changes, next_token, has_more).
+    """
+    state = decode_sync_token(token)
+    now = timezone.now()
+    since = _from_micros(state['s']) - SYNC_OVERLAP if state.get('s') else None
+    cursors = state.get('c')
+
+    changes, pending = {}, {}
+    for name, queryset, field in collections:
+        if cursors is not None and name not in cursors:
+            # Already drained earlier in this paging sequence
+            changes[name] = []
+            continue
+
+        queryset = queryset.filter(**{f'{field}__isnull': False})
+        if since is not None:
+            queryset = queryset.filter(**{f'{field}__gte': since})
+        if cursors is not None:
+            cursor_time, cursor_id = _from_micros(cursors[name][0]), cursors[name][1]
+            queryset = queryset.filter(
+                Q(**{f'{field}__gt': cursor_time}) | Q(**{field: cursor_time, 'pk__gt': cursor_id})
+            )
+        rows = list(queryset.order_by(field, 'pk')[:SYNC_PAGE_SIZE + 1])
+        if len(rows) > SYNC_PAGE_SIZE:
+            rows = rows[:SYNC_PAGE_SIZE]
+            pending[name] = [_micros(getattr(rows[-1], field)), rows[-1].pk]
+        changes[name] = rows
+
+    # The next sync starts from when the first page of this sequence was read
+    started = state.get('n', _micros(now)) if cursors is not None else _micros(now)
+    if pending:
+        return changes, encode_sync_token({'s': state.get('s', 0), 'n': started, 'c': pending}), True
+    return changes, encode_sync_token({'s': started}), False
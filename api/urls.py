@@ -0,0 +1,11 @@
+from django.urls import include, path, re_path
+
+from api.v1.views import SyncView
+
+app_name = "api"
+
+urlpatterns = [
+    # Unversioned alias used by the mobile clients; served by the default version
+    path('sync', SyncView.as_view(), name='sync'),
+    re_path(r'^(?P<version>v1)/', include('api.v1.urls')),
+]
@@ -0,0 +1,121 @@
+from rest_framework import serializers
+
+from api.mixins import FieldSelectionMixin
+from employe.models import Holiday
+from managers.models import UnifiedLeaveRequest
+from users.models import User
+
+
+class LeaveRequestSerializer(FieldSelectionMixin, serializers.ModelSerializer):
+    role = serializers.CharField(source='requested_by_role', read_only=True)
+    requester = serializers.IntegerField(source='requester_user_id', read_only=True)
+    requester_name = serializers.CharField(read_only=True)
+    requester_email = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = UnifiedLeaveRequest
+        fields = [
+            'id', 'subject', 'leave_type', 'description', 'file', 'start_date', 'end_date',
+            'leave_duration', 'carryforward_used', 'status', 'role',
+            'requester', 'requester_name', 'requester_email',
+            'approval_date', 'rejection_date', 'cancellation_date',
+            'approved_by', 'rejected_by', 'cancelled_by',
+            'created_date', 'updated_datetime', 'version',
+        ]
+        read_only_fields = [
+            'leave_duration', 'carryforward_used', 'status',
+            'approval_date', 'rejection_date', 'cancellation_date',
+            'approved_by', 'rejected_by', 'cancelled_by',
+            'created_date', 'updated_datetime', 'version',
+        ]
+        extra_kwargs = {
+            'subject': {'required': True},
+            'leave_type': {'required': True, 'allow_null': False},
+            'start_date': {'required': True, 'allow_null': False},
+            'end_date': {'required': True, 'allow_null': False},
+        }
+
+    def validate(self, attrs):
+        if attrs['start_date'] > attrs['end_date']:
+            raise serializers.ValidationError("Start date cannot be after end date.")
+        return attrs
+
+
+class HolidaySerializer(FieldSelectionMixin, serializers.ModelSerializer):
+
+    class Meta:
+        model = Holiday
+        fields = ['id', 'title', 'date', 'updated_datetime']
+
+
+def person_profile(user):
+    """
+    (role, profile) of a person from the manager_profile / employee_profile
+    rows prefetched by the viewset; a manager row wins over an employee row.
+    """
+    if not hasattr(user, '_person_profile'):
+        managers = list(user.manager_profile.all())
+        employees = list(user.employee_profile.all())
+        if managers:
+            user._person_profile = ('manager', managers[0])
+        elif employees:
+            user._person_profile = ('employee', employees[0])
+        else:
+            user._person_profile = (None, None)
+    return user._person_profile
+
+
+class ProfileField(serializers.ReadOnlyField):
+    """Reads a column of the person's Employe or Manager profile"""
+
+    def get_attribute(self, user):
+        return getattr(person_profile(user)[1], self.source, None)
+
+
+class PersonSerializer(FieldSelectionMixin, serializers.ModelSerializer):
+    role = serializers.SerializerMethodField()
+    staff_id = serializers.SerializerMethodField()
+    department = ProfileField()
+    designation = ProfileField()
+    manager = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = [
+            'id', 'email', 'first_name', 'last_name', 'phone_number',
+            'role', 'staff_id', 'department', 'designation', 'manager',
+        ]
+
+    def get_role(self, user):
+        return person_profile(user)[0]
+
+    def get_staff_id(self, user):
+        role, profile = person_profile(user)
+        if role == 'manager':
+            return profile.manager_id
+        if role == 'employee':
+            return profile.employe_id
+        return None
+
+    def get_manager(self, user):
+        role, profile = person_profile(user)
+        if role == 'employee' and profile.manager_id:
+            return profile.manager.user_id
+        return None
+
+
+class BalanceSerializer(FieldSelectionMixin, serializers.Serializer):
+    """Current leave balance of a person, read from their Employe or Manager profile"""
+    user = serializers.IntegerField(source='id', read_only=True)
+    role = serializers.SerializerMethodField()
+    available_leaves = ProfileField()
+    leaves_taken = ProfileField()
+    available_medical_leaves = ProfileField()
+    medical_leaves_taken = ProfileField()
+    carryforward_granted = ProfileField()
+    carryforward_available_leaves = ProfileField()
+    carryforward_leaves_taken = ProfileField()
+    updated_datetime = ProfileField()
+
+    def get_role(self, user):
+        return person_profile(user)[0]
@@ -0,0 +1,19 @@
+from django.urls import path
+from fcm_django.api.rest_framework import FCMDeviceAuthorizedViewSet
+from rest_framework.routers import DefaultRouter
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+
+from . import views
+
+router = DefaultRouter()
+router.register('leave-requests', views.LeaveRequestViewSet, basename='leave-request')
+router.register('balances', views.BalanceViewSet, basename='balance')
+router.register('holidays', views.HolidayViewSet, basename='holiday')
+router.register('people', views.PersonViewSet, basename='person')
+router.register('devices', FCMDeviceAuthorizedViewSet, basename='device')
+
+urlpatterns = [
+    path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('sync/', views.SyncView.as_view(), name='sync'),
+] + router.urls
@@ -0,0 +1,237 @@
+import logging
+from collections import defaultdict
+
+from django.db.models import Exists, OuterRef, Prefetch, Q
+from django.urls import reverse
+from rest_framework import mixins, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from api.mixins import ConditionalETagMixin
+from api.pagination import IdCursorPagination
+from api.sync import read_changes, sync_collections
+from common.services import LeaveApprovalService
+from common.utils import is_founder
+from employe.models import Employe, Holiday
+from managers.models import Manager, UnifiedLeaveRequest
+from managers.tasks import send_leave_notifications_batch, send_leave_submission_notifications
+from users.models import User
+from .serializers import BalanceSerializer, HolidaySerializer, LeaveRequestSerializer, PersonSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def viewer_scope(user):
+    """
+    ('founder', None), ('manager', Manager), ('employee', Employe) or
+    (None, None) for the authenticated user, deciding what the API shows them.
+    """
+    if user.is_superuser or is_founder(user):
+        return 'founder', None
+    if user.is_manager:
+        manager = Manager.objects.filter(user=user).first()
+        if manager:
+            return 'manager', manager
+    employe = Employe.objects.filter(user=user).select_related('manager__user').first()
+    if employe:
+        return 'employee', employe
+    return None, None
+
+
+def visible_leave_requests(user, scope, profile):
+    """Leave requests the caller may see: all for founders, own and team for managers, else own"""
+    queryset = UnifiedLeaveRequest.objects.select_related('employee__user', 'manager__user')
+    if scope == 'manager':
+        return queryset.filter(
+            Q(requested_by_role='employee', employee__manager=profile) | Q(requester_user=user)
+        )
+    if scope != 'founder':
+        return queryset.filter(requester_user=user)
+    return queryset
+
+
+def visible_people(user, scope, profile):
+    """Employees and managers the caller may see, with their profiles prefetched"""
+    queryset = User.objects.filter(
+        Q(Exists(Manager.objects.filter(user=OuterRef('pk'))))
+        | Q(Exists(Employe.objects.filter(user=OuterRef('pk'))))
+    ).prefetch_related(
+        'manager_profile',
+        Prefetch('employee_profile', queryset=Employe.objects.select_related('manager')),
+    )
+    if scope == 'manager':
+        return queryset.filter(
+            Q(pk=user.pk) | Q(Exists(Employe.objects.filter(user=OuterRef('pk'), manager=profile)))
+        )
+    if scope != 'founder':
+        return queryset.filter(pk=user.pk)
+    return queryset
+
+
+class ScopedViewSetMixin:
+    permission_classes = [IsAuthenticated]
+    pagination_class = IdCursorPagination
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.scope, self.profile = viewer_scope(request.user)
+
+
+class LeaveRequestViewSet(ScopedViewSetMixin, ConditionalETagMixin, mixins.CreateModelMixin,
+                          mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Leave requests of employees and managers, limited to what the caller may
+    see. Filters: ?status=Pending, ?role=employee|manager, ?requester=<user id>.
+    approve/reject/cancel answer 409 if the request was actioned meanwhile or
+    no longer has the `version` (or If-Match) the client sent.
+    """
+    serializer_class = LeaveRequestSerializer
+    # requester_name and requester_email are read from the requester's User row
+    etag_fields = ('updated_datetime', 'requester_user__updated_at')
+
+    def get_queryset(self):
+        queryset = visible_leave_requests(self.request.user, self.scope, self.profile)
+
+        params = self.request.query_params
+        if params.get('status'):
+            queryset = queryset.filter(status=params['status'])
+        if params.get('role'):
+            queryset = queryset.filter(requested_by_role=params['role'])
+        if params.get('requester'):
+            queryset = queryset.filter(requester_user_id=params['requester'])
+        return queryset
+
+    def perform_create(self, serializer):
+        if self.scope == 'manager':
+            leave_request = UnifiedLeaveRequest(
+                **serializer.validated_data, manager=self.profile, requested_by_role='manager'
+            )
+        elif self.scope == 'employee':
+            leave_request = UnifiedLeaveRequest(
+                **serializer.validated_data, employee=self.profile, requested_by_role='employee'
+            )
+        else:
+            raise PermissionDenied("Only employees and managers can apply for leave.")
+
+        serializer.instance = LeaveApprovalService(self.request.user).submit(leave_request)
+        self._notify_submission(serializer.instance)
+
+    def _notify_submission(self, leave_request):
+        """Queue the manager and requester emails instead of talking SMTP inside the request"""
+        if leave_request.requested_by_role == 'employee':
+            review_path = reverse('managers:leavelist')
+        else:
+            review_path = reverse('managers:manager_leave_requests_list')
+        send_leave_submission_notifications.delay(
+            UnifiedLeaveRequest._meta.label, leave_request.pk, self.request.build_absolute_uri(review_path)
+        )
+
+    def _check_can_action(self, leave_request):
+        if self.scope == 'founder':
+            return
+        if (self.scope == 'manager' and leave_request.requested_by_role == 'employee'
+                and leave_request.employee.manager_id == self.profile.id):
+            return
+        raise PermissionDenied("You do not have permission to action this leave request.")
+
+    def _expected_version(self):
+        """Leave version the client last saw, from a `version` body field or If-Match header"""
+        value = str(self.request.data.get('version', self.request.headers.get('If-Match', ''))).strip('"')
+        return int(value) if value.isdigit() else None
+
+    @action(detail=True, methods=['post'])
+    def approve(self, request, *args, **kwargs):
+        leave_request = self.get_object()
+        self._check_can_action(leave_request)
+        leave_request = LeaveApprovalService(request.user).approve(leave_request, self._expected_version())
+        send_leave_notifications_batch.delay(UnifiedLeaveRequest._meta.label, [leave_request.pk], 'approved')
+        return Response(self.get_serializer(leave_request).data)
+
+    @action(detail=True, methods=['post'])
+    def reject(self, request, *args, **kwargs):
+        leave_request = self.get_object()
+        self._check_can_action(leave_request)
+        leave_request = LeaveApprovalService(request.user).reject(leave_request, self._expected_version())
+        send_leave_notifications_batch.delay(UnifiedLeaveRequest._meta.label, [leave_request.pk], 'rejected')
+        return Response(self.get_serializer(leave_request).data)
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, *args, **kwargs):
+        leave_request = self.get_object()
+        if leave_request.requester_user_id != request.user.pk:
+            raise PermissionDenied("Only the requester can cancel a leave request.")
+        leave_request = LeaveApprovalService(request.user).cancel(leave_request, self._expected_version())
+        return Response(self.get_serializer(leave_request).data)
+
+
+class PersonViewSet(ScopedViewSetMixin, ConditionalETagMixin, viewsets.ReadOnlyModelViewSet):
+    """Employees and managers visible to the caller"""
+    serializer_class = PersonSerializer
+    etag_fields = ('updated_at', 'manager_profile__updated_datetime', 'employee_profile__updated_datetime')
+
+    def get_queryset(self):
+        return visible_people(self.request.user, self.scope, self.profile)
+
+
+class BalanceViewSet(PersonViewSet):
+    """Current leave balances of the people visible to the caller, keyed by user id"""
+    serializer_class = BalanceSerializer
+
+
+class HolidayViewSet(ScopedViewSetMixin, ConditionalETagMixin, viewsets.ReadOnlyModelViewSet):
+    """Company holidays. Filter: ?year=2026"""
+    serializer_class = HolidaySerializer
+
+    def get_queryset(self):
+        queryset = Holiday.objects.all()
+        if self.request.query_params.get('year'):
+            queryset = queryset.filter(date__year=self.request.query_params['year'])
+        return queryset
+
+
+class SyncView(APIView):
+    """
+    Delta sync: GET ?since=<token> returns the leave requests, balances and
+    holidays changed since the token, plus the ids deleted since then, and
+    the token to send next time. Omit `since` for a full first sync; while
+    `has_more` is true, call again straight away with the returned token.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        scope, profile = viewer_scope(request.user)
+        collections = sync_collections(
+            request.user, scope, profile, visible_leave_requests(request.user, scope, profile)
+        )
+        changes, token, has_more = read_changes(collections, request.query_params.get('since'))
+
+        balances = []
+        for role, name in (('employee', 'employee_balances'), ('manager', 'manager_balances')):
+            for person_profile in changes[name]:
+                user = person_profile.user
+                user._person_profile = (role, person_profile)
+                balances.append(user)
+
+        deleted = defaultdict(list)
+        for tombstone in changes['deleted']:
+            deleted[f'{tombstone.kind}s'].append(tombstone.object_id)
+
+        context = self.get_serializer_context()
+        return Response({
+            'token': token,
+            'has_more': has_more,
+            'leave_requests': LeaveRequestSerializer(changes['leave_requests'], many=True, context=context).data,
+            'balances': BalanceSerializer(balances, many=True, context=context).data,
+            'holidays': HolidaySerializer(changes['holidays'], many=True, context=context).data,
+            'deleted': {
+                'leave_requests': deleted['leave_requests'],
+                'balances': deleted['balances'],
+                'holidays': deleted['holidays'],
+            },
+        })
+
+    def get_serializer_context(self):
+        return {'request': self.request, 'view': self}
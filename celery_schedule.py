@@ -68,6 +68,24 @@ CELERY_BEAT_SCHEDULE = {
             'expires': 1800,  # 30 minutes
         }
     },
+
+    # Hourly purge of expired password reset OTPs
+    'purge-expired-otps': {
+        'task': 'managers.tasks.purge_expired_otps',
+        'schedule': crontab(minute=15),
+        'options': {
+            'expires': 1800,
+        }
+    },
+
+    # Daily removal of uploads nothing references any more
+    'collect-unreferenced-blobs': {
+        'task': 'managers.tasks.collect_unreferenced_blobs',
+        'schedule': crontab(minute=30, hour=3),
+        'options': {
+            'expires': 3600,
+        }
+    },
 }
 
 # Timezone setting
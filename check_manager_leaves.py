@@ -12,7 +12,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 # Setup Django
 django.setup()
 
-from managers.models import UnifiedLeaveRequest, Manager, ManagerLeaveRequest
+from managers.models import UnifiedLeaveRequest, Manager, ManagerLeaveRequestArchive
 from users.models import User
 
 print("=== CHECKING MANAGER LEAVE REQUESTS ===")
@@ -23,8 +23,8 @@ print(f"Total manager requests: {manager_requests.count()}")
 for req in manager_requests:
     print(f"  ID: {req.id}, Subject: {req.subject}, Manager: {req.manager.user.email if req.manager else 'None'}, Approved: {req.is_approved}")
 
-print("\n2. ManagerLeaveRequest (Old model):")
-old_manager_requests = ManagerLeaveRequest.objects.all()
+print("\n2. ManagerLeaveRequestArchive (Old model):")
+old_manager_requests = ManagerLeaveRequestArchive.objects.all()
 print(f"Total old manager requests: {old_manager_requests.count()}")
 for req in old_manager_requests:
     print(f"  ID: {req.id}, Subject: {req.subject}, Manager: {req.manager.user.email if req.manager else 'None'}, Approved: {req.is_approved}")
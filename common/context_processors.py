@@ -1,5 +1,12 @@
-from employe.models import Employe, LeaveRequest
-from managers.models import Manager, Founder, UnifiedLeaveRequest
+from django.db.models import Sum
+
+from employe.models import Employe
+from managers.models import Manager, Founder, LeaveBalanceProjection
+
+
+def pending_leave_count(projections):
+    """Pending requests summed from the leave balance projection"""
+    return projections.aggregate(total=Sum('pending_requests'))['total'] or 0
 
 def user_context(request):
     context = {
@@ -16,21 +23,16 @@ def user_context(request):
             context['profile'] = founder
             context['is_founder'] = True
             # Founders see all pending requests (both employee and manager)
-            emp_pending = LeaveRequest.objects.filter(status='Pending', is_cancelled=False).count()
-            mgr_pending = UnifiedLeaveRequest.objects.filter(
-                requested_by_role='manager',
-                is_approved=False,
-                is_rejected=False,
-                is_cancelled=False
-            ).count()
-            context['notification_count'] = emp_pending + mgr_pending
+            context['notification_count'] = pending_leave_count(LeaveBalanceProjection.objects.all())
         except Founder.DoesNotExist:
             try:
                 manager = Manager.objects.get(user=request.user)
                 context['profile'] = manager
                 context['is_manager'] = True
                 employees = Employe.objects.filter(manager=manager)
-                context['notification_count'] = LeaveRequest.objects.filter(employee__in=employees, status='Pending').count()
+                context['notification_count'] = pending_leave_count(LeaveBalanceProjection.objects.filter(
+                    role='employee', requester_user__in=employees.values('user')
+                ))
             except Manager.DoesNotExist:
                 try:
                     employee = Employe.objects.get(user=request.user)
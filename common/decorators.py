@@ -1,9 +1,13 @@
 import json
+from functools import wraps
 
+from asgiref.sync import sync_to_async
 from django.http import HttpResponse
 from django.shortcuts import reverse
 from django.http.response import HttpResponseRedirect
 
+from common.utils import is_founder
+
 
 def allow_manager(fuction):
     def wrapper(request, *args, **kwargs):
@@ -53,10 +57,7 @@ def allow_founder(function):
         current_user = request.user
 
         # Check if user is a founder (has Founder profile)
-        try:
-            from managers.models import Founder
-            founder = Founder.objects.get(user=current_user)
-        except Founder.DoesNotExist:
+        if not is_founder(current_user):
             if request.headers.get("x-requested-with") == "XMLHttpRequest":
                 response_data = {
                     "status": "error",
@@ -107,12 +108,8 @@ def role_required(*allowed_roles):
                 user_roles.append('manager')
 
             # Check if user is founder
-            try:
-                from managers.models import Founder
-                Founder.objects.get(user=current_user)
+            if is_founder(current_user):
                 user_roles.append('founder')
-            except Founder.DoesNotExist:
-                pass
 
             # Check if user has any of the allowed roles
             if not any(role in user_roles for role in allowed_roles):
@@ -134,4 +131,28 @@ def role_required(*allowed_roles):
 
             return function(request, *args, **kwargs)
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
+
+def async_view(*decorators):
+    """
+    Apply sync-only view decorators (login_required, the role checks above)
+    to an async view: the checks run in a worker thread and their redirect or
+    error response is returned, otherwise the view itself is awaited.
+    Usage: @async_view(login_required(login_url='/login'), allow_employee)
+    """
+    def decorator(view):
+        def passed(request, *args, **kwargs):
+            return None
+
+        checks = passed
+        for check in reversed(decorators):
+            checks = check(checks)
+
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            response = await sync_to_async(checks)(request, *args, **kwargs)
+            if response is not None:
+                return response
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -55,6 +55,14 @@ class MethodNotFound(APIException):
     default_detail = "Method not allowed"
     error_code = "METHOD_NOT_ALLOWED"
 
+class LeaveActionConflict(APIException):
+    """
+    Raised when a leave request has already been actioned
+    """
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "This leave request has already been actioned."
+    error_code = "LEAVE_ACTION_CONFLICT"
+
 def custom_exception_handler(exc, context):
     if isinstance(exc, ValidationError):
         exc = InvalidInputError(exc.detail)
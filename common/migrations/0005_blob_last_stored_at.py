@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-19 19:08
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def copy_created_at(apps, schema_editor):
+    apps.get_model('common', 'Blob').objects.update(last_stored_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0004_blob_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blob',
+            name='last_stored_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
 
 from users.models import User
 
@@ -11,7 +14,8 @@ class CommonModel(models.Model):
     """
 
     created_date = models.DateField(auto_now_add=True, blank=True, null=True)
-    updated_datetime = models.DateTimeField(auto_now=True, blank=True, null=True)
+    # Indexed for the delta sync endpoint, which filters on it
+    updated_datetime = models.DateTimeField(auto_now=True, blank=True, null=True, db_index=True)
     is_active = models.BooleanField(default=True)
     created_by = models.ForeignKey(User, related_name='+', 
                                         blank=True, null=True, on_delete=models.SET_NULL)
@@ -53,4 +57,86 @@ class DocumentNumber(models.Model):
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return f'{self.doc_type}{self.number}'
\ No newline at end of file
+        return f'{self.doc_type}{self.number}'
+
+
+class IdSequence(models.Model):
+    """
+    Counter behind the sequential staff IDs (EMP00001, MGR00001). Allocation
+    increments `last_value` in place, so concurrent allocations queue on the
+    row lock instead of guessing free numbers.
+    """
+    name = models.CharField(max_length=30, unique=True)
+    last_value = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'common_id_sequence'
+
+    def __str__(self):
+        return f"{self.name}: {self.last_value}"
+
+
+TOMBSTONE_KIND_CHOICES = (
+    ('leave_request', 'Leave Request'),
+    ('holiday', 'Holiday'),
+    ('balance', 'Balance'),
+)
+
+class Tombstone(models.Model):
+    """
+    Marker left behind when a synced row is deleted, so delta sync clients
+    can drop their copy. `user` is the person the row belonged to, if any.
+    """
+    kind = models.CharField(max_length=30, choices=TOMBSTONE_KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+')
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        db_table = 'common_tombstone'
+        verbose_name = 'tombstone'
+        verbose_name_plural = 'tombstones'
+        ordering = ["-id"]
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id}"
+
+
+@receiver(post_delete, sender='managers.UnifiedLeaveRequest')
+@receiver(post_delete, sender='employe.LeaveRequest')
+@receiver(post_delete, sender='managers.ManagerLeaveRequest')
+def leave_request_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(kind='leave_request', object_id=instance.pk, user_id=instance.requester_user_id)
+
+
+@receiver(post_delete, sender='employe.Holiday')
+def holiday_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(kind='holiday', object_id=instance.pk)
+
+
+@receiver(post_delete, sender='employe.Employe')
+@receiver(post_delete, sender='managers.Manager')
+def balance_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(kind='balance', object_id=instance.user_id, user_id=instance.user_id)
+
+
+class Blob(models.Model):
+    """
+    A file of the content-addressed upload storage (common/storage.py),
+    kept once however many rows point at it. `refcount` counts those rows;
+    blobs nobody references are deleted by collect_unreferenced_blobs().
+    `last_stored_at` is bumped whenever the same content is uploaded again,
+    so the collector's grace period runs from the latest upload.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    digest = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField(default=0)
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_stored_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'common_blob'
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} refs)"
@@ -0,0 +1,70 @@
+"""
+Profile aggregates: an Employe or Manager together with its one-per-person
+detail sections (emergency contact, address, benefits, ...).
+
+Each section is its own table with a foreign key to the profile. Loading an
+aggregate fetches the profile, its user and every section in one
+select_related/prefetch_related pass, instead of a query or get_or_create
+per section. Views that only show a profile never write; a missing section
+reads as None and is only created when an edit saves it.
+"""
+from django.shortcuts import get_object_or_404
+
+# Section name (as the templates call it) -> reverse accessor on Employe
+EMPLOYE_SECTIONS = {
+    'contact': 'emergencycontact_set',
+    'address': 'address_set',
+    'background': 'background_set',
+    'benefits': 'benefits_set',
+    'identification': 'identification_set',
+    'schedule': 'workschedule_set',
+}
+
+# The Employe sections managers/details.html shows, under the names it uses
+EMPLOYE_SUMMARY_SECTIONS = {
+    'contact': 'emergencycontact_set',
+    'address': 'address_set',
+    'benefits': 'benefits_set',
+    'workschedule': 'workschedule_set',
+}
+
+# Section name (as the templates call it) -> reverse accessor on Manager
+MANAGER_SECTIONS = {
+    'contact': 'emergencycontactmanager_set',
+    'address': 'addressmanager_set',
+    'benefits': 'benefitsmanager_set',
+    'workschedule': 'workschedulemanager_set',
+}
+
+
+class ProfileAggregate:
+    """A profile with its detail sections, see load()"""
+
+    def __init__(self, profile, sections):
+        self.profile = profile
+        self._sections = sections
+
+    @classmethod
+    def load(cls, model, sections, **lookup):
+        """Fetch the `model` profile matching `lookup` (404 if none) with its user and `sections`"""
+        queryset = model.objects.select_related('user').prefetch_related(*sections.values())
+        return cls(get_object_or_404(queryset, **lookup), sections)
+
+    def section(self, name):
+        """The profile's `name` section, or None if it has none yet"""
+        # The newest row wins, as with .first() under the sections' "-id" ordering
+        rows = getattr(self.profile, self._sections[name]).all()
+        return rows[0] if rows else None
+
+    def editable_section(self, name):
+        """The profile's `name` section, or a new unsaved one that save() creates"""
+        section = self.section(name)
+        if section is None:
+            related = getattr(self.profile, self._sections[name])
+            section = related.model(**{related.field.name: self.profile})
+        return section
+
+    def sections(self, editable=False):
+        """{section name: section} of every section, for template contexts"""
+        get = self.editable_section if editable else self.section
+        return {name: get(name) for name in self._sections}
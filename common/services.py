@@ -0,0 +1,327 @@
+"""
+Services shared by the employee, manager, founder and admin leave workflows
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from common.exceptions import LeaveActionConflict
+from managers.leave_events import record_leave_events, record_leave_transition, transition_events
+
+# Rows per UPDATE statement when actioning leave requests in bulk
+BULK_UPDATE_BATCH_SIZE = 500
+
+# Balance columns changed by approving or rejecting a leave
+BALANCE_FIELDS = [
+    'leaves_taken', 'available_leaves',
+    'medical_leaves_taken', 'available_medical_leaves',
+    'carryforward_leaves_taken', 'carryforward_available_leaves',
+    'updated_datetime',
+]
+
+# Leave request columns changed by approving or rejecting it
+LEAVE_ACTION_FIELDS = [
+    'status', 'is_approved', 'is_rejected', 'approval_date', 'rejection_date',
+    'approved_by', 'rejected_by', 'leave_duration', 'carryforward_used', 'updated_datetime', 'version',
+]
+
+# Leave request columns changed by cancelling it
+LEAVE_CANCEL_FIELDS = ['status', 'is_cancelled', 'cancellation_date', 'cancelled_by', 'updated_datetime']
+
+
+class LeaveApprovalService:
+    """
+    Approve or reject leave requests of the unified leave table, whether
+    loaded as UnifiedLeaveRequest or through the employe.LeaveRequest and
+    ManagerLeaveRequest proxies.
+
+    Each transition is written as a compare-and-swap on the leave request's
+    version column, so of two approvers acting on the same request only the
+    first wins and the other gets LeaveActionConflict (409) without any side
+    effects. Callers may pass the version their user was shown as
+    `expected_version` to also reject actions taken on a stale page.
+
+    Balance changes hold a row lock on the requester's profile and are
+    applied as a delta instead of recounting every approved leave, so
+    concurrent approvals for the same person cannot double-spend
+    carryforward leaves. The matching LeaveEvent rows are written in the
+    same transaction.
+    """
+
+    def __init__(self, actor=None):
+        self.actor = actor
+
+    def submit(self, leave_request):
+        """Save a new leave request as Pending and log its submission"""
+        with transaction.atomic():
+            leave_request.status = 'Pending'
+            leave_request.save()
+            record_leave_transition(leave_request, 'submitted', actor=self.actor)
+
+        return leave_request
+
+    def approve(self, leave_request, expected_version=None):
+        """Approve a pending leave request and deduct it from the requester's balance"""
+        with transaction.atomic():
+            leave_request, profile = self._lock(leave_request, expected_version)
+            previous_status = leave_request.status
+            self._approve(leave_request, profile, self._holidays([leave_request]))
+            self._save_transition(leave_request, LEAVE_ACTION_FIELDS)
+            profile.save(update_fields=BALANCE_FIELDS)
+            record_leave_transition(leave_request, 'approved', previous_status, self.actor)
+
+        return leave_request
+
+    def reject(self, leave_request, expected_version=None):
+        """Reject a leave request, refunding the balance if it had been approved"""
+        with transaction.atomic():
+            leave_request, profile = self._lock(leave_request, expected_version)
+            previous_status = leave_request.status
+            self._reject(leave_request, profile)
+            self._save_transition(leave_request, LEAVE_ACTION_FIELDS)
+            profile.save(update_fields=BALANCE_FIELDS)
+            record_leave_transition(leave_request, 'rejected', previous_status, self.actor)
+
+        return leave_request
+
+    def cancel(self, leave_request, expected_version=None):
+        """Cancel a pending leave request on behalf of its requester"""
+        with transaction.atomic():
+            leave_request = self._read(leave_request, expected_version)
+            if leave_request.status != 'Pending':
+                raise LeaveActionConflict(f"Cannot cancel a leave request that is already {leave_request.status}.")
+
+            leave_request.status = 'Cancelled'
+            leave_request.is_cancelled = True
+            leave_request.cancellation_date = timezone.now()
+            self._set_actor(leave_request, 'cancelled_by')
+            self._save_transition(leave_request, LEAVE_CANCEL_FIELDS)
+            record_leave_transition(leave_request, 'cancelled', 'Pending', self.actor)
+
+        return leave_request
+
+    def refund_deleted(self, leave_request):
+        """
+        Refund the balance a deleted leave request held if it was approved,
+        as rejecting it would have. Called from the post_delete receiver
+        that records the 'deleted' event (managers/leave_events.py).
+        """
+        if leave_request.status != 'Approved':
+            return
+        field = self._profile_field(leave_request)
+        profile_model = type(leave_request)._meta.get_field(field).related_model
+        with transaction.atomic():
+            profile = profile_model.objects.select_for_update().filter(pk=self._profile_id(leave_request)).first()
+            if profile is None:
+                return
+            self._apply_balance_delta(profile, leave_request, sign=-1)
+            profile.updated_datetime = timezone.now()
+            profile.save(update_fields=BALANCE_FIELDS)
+
+    def bulk_action(self, action, queryset):
+        """
+        Approve or reject every leave request in the queryset in one
+        transaction, writing the requests and the balances with batched
+        UPDATEs. Requests that were already actioned are skipped.
+
+        Returns (actioned, skipped) lists of leave requests.
+        """
+        if action not in ('approve', 'reject'):
+            raise ValueError(f"Unknown leave action: {action}")
+
+        event_type = {'approve': 'approved', 'reject': 'rejected'}[action]
+        with transaction.atomic():
+            # Lock in primary key order so overlapping bulk actions cannot deadlock.
+            # Only the leave rows: the permission filter may join the requester's
+            # profile and manager, which _lock_profiles locks itself
+            leave_requests = list(queryset.select_for_update(of=('self',)).order_by('pk'))
+            profiles = self._lock_profiles(leave_requests)
+            holidays = self._holidays(leave_requests) if action == 'approve' else set()
+
+            actioned, skipped, changed_profiles, events = [], [], {}, []
+            for leave_request in leave_requests:
+                key = (self._profile_field(leave_request), self._profile_id(leave_request))
+                profile = profiles[key]
+                previous_status = leave_request.status
+                try:
+                    if action == 'approve':
+                        self._approve(leave_request, profile, holidays)
+                    else:
+                        self._reject(leave_request, profile)
+                except LeaveActionConflict:
+                    skipped.append(leave_request)
+                    continue
+                actioned.append(leave_request)
+                changed_profiles[key] = profile
+                events += transition_events(leave_request, event_type, previous_status, self.actor)
+
+            if actioned:
+                # The rows are locked, so the version can be bumped in place
+                now = timezone.now()
+                for leave_request in actioned:
+                    leave_request.updated_datetime = now
+                    leave_request.version += 1
+                queryset.model.objects.bulk_update(
+                    actioned, LEAVE_ACTION_FIELDS, batch_size=BULK_UPDATE_BATCH_SIZE
+                )
+
+            by_model = defaultdict(list)
+            for profile in changed_profiles.values():
+                profile.updated_datetime = timezone.now()
+                by_model[type(profile)].append(profile)
+            for profile_model, model_profiles in by_model.items():
+                profile_model.objects.bulk_update(
+                    model_profiles, BALANCE_FIELDS, batch_size=BULK_UPDATE_BATCH_SIZE
+                )
+
+            record_leave_events(events)
+
+        return actioned, skipped
+
+    def _approve(self, leave_request, profile, holidays):
+        if leave_request.status != 'Pending':
+            raise LeaveActionConflict(f"Leave request is already {leave_request.status.lower()}.")
+
+        # Same weekday count the leave models store in save()
+        leave_request.leave_duration = leave_request.calculate_working_days()
+        leave_request.carryforward_used = 0
+        if leave_request.leave_type == 'AL':
+            carryforward_left = max(0, profile.carryforward_granted - profile.carryforward_leaves_taken)
+            leave_request.carryforward_used = min(
+                self._carryforward_eligible_days(leave_request, holidays), carryforward_left
+            )
+
+        leave_request.is_approved = True
+        leave_request.is_rejected = False
+        leave_request.approval_date = timezone.now()
+        self._set_actor(leave_request, 'approved_by')
+        leave_request.status = 'Approved'
+
+        self._apply_balance_delta(profile, leave_request, sign=1)
+
+    def _reject(self, leave_request, profile):
+        status = leave_request.status
+        if status in ('Rejected', 'Cancelled'):
+            raise LeaveActionConflict(f"Leave request is already {status.lower()}.")
+
+        leave_request.is_rejected = True
+        leave_request.is_approved = False
+        leave_request.rejection_date = timezone.now()
+        self._set_actor(leave_request, 'rejected_by')
+        leave_request.status = 'Rejected'
+
+        if status == 'Approved':
+            self._apply_balance_delta(profile, leave_request, sign=-1)
+
+    @staticmethod
+    def _profile_field(leave_request):
+        """Name of the requester FK: 'manager' for manager requests, else 'employee'"""
+        if getattr(leave_request, 'requested_by_role', 'employee') == 'manager':
+            return 'manager'
+        return 'employee'
+
+    def _profile_id(self, leave_request):
+        return getattr(leave_request, f'{self._profile_field(leave_request)}_id')
+
+    @staticmethod
+    def _read(leave_request, expected_version=None):
+        """Re-read the leave request, failing fast if it moved past the version the caller saw"""
+        leave_request = type(leave_request).objects.get(pk=leave_request.pk)
+        if expected_version is not None and int(expected_version) != leave_request.version:
+            raise LeaveActionConflict("This leave request was changed by someone else. Reload it and try again.")
+        return leave_request
+
+    def _lock(self, leave_request, expected_version=None):
+        """Re-read the leave request, and its requester's profile under a row lock"""
+        leave_request = self._read(leave_request, expected_version)
+        field = self._profile_field(leave_request)
+        profile_model = type(leave_request)._meta.get_field(field).related_model
+        profile = profile_model.objects.select_for_update().get(pk=self._profile_id(leave_request))
+        setattr(leave_request, field, profile)
+        return leave_request, profile
+
+    @staticmethod
+    def _save_transition(leave_request, fields):
+        """
+        Write the transition only if the row still has the version that was
+        read; otherwise another transition won the race.
+        """
+        leave_request.updated_datetime = timezone.now()
+        values = {field: getattr(leave_request, leave_request._meta.get_field(field).attname)
+                  for field in fields if field != 'version'}
+        updated = type(leave_request).objects.filter(
+            pk=leave_request.pk, version=leave_request.version
+        ).update(**values, version=F('version') + 1)
+        if not updated:
+            raise LeaveActionConflict("This leave request was just actioned by someone else.")
+        leave_request.version += 1
+
+    def _lock_profiles(self, leave_requests):
+        """Lock every requester profile of the given leave requests, keyed by (field, id)"""
+        ids_by_field = defaultdict(set)
+        for leave_request in leave_requests:
+            ids_by_field[self._profile_field(leave_request)].add(self._profile_id(leave_request))
+
+        profiles = {}
+        for field, ids in ids_by_field.items():
+            profile_model = type(leave_requests[0])._meta.get_field(field).related_model
+            for profile in profile_model.objects.select_for_update().filter(pk__in=ids).order_by('pk'):
+                profiles[(field, profile.pk)] = profile
+
+        for leave_request in leave_requests:
+            field = self._profile_field(leave_request)
+            setattr(leave_request, field, profiles[(field, self._profile_id(leave_request))])
+        return profiles
+
+    def _set_actor(self, leave_request, field):
+        if self.actor is not None:
+            setattr(leave_request, field, self.actor)
+
+    @staticmethod
+    def _holidays(leave_requests):
+        """Holiday dates covering the annual leaves among the given requests, in one query"""
+        from employe.models import Holiday
+
+        annual = [leave for leave in leave_requests if leave.leave_type == 'AL']
+        if not annual:
+            return set()
+        return set(
+            Holiday.objects.filter(
+                date__range=[min(leave.start_date for leave in annual), max(leave.end_date for leave in annual)]
+            ).values_list('date', flat=True)
+        )
+
+    @staticmethod
+    def _carryforward_eligible_days(leave_request, holidays):
+        """Working days of the leave that fall in the Jan 1 - Mar 31 carryforward window"""
+        eligible_days = 0
+        current_date = leave_request.start_date
+        while current_date <= leave_request.end_date:
+            if current_date.weekday() < 5 and current_date not in holidays and current_date.month <= 3:
+                eligible_days += 1
+            current_date += timedelta(days=1)
+        return eligible_days
+
+    @staticmethod
+    def _apply_balance_delta(profile, leave_request, sign):
+        """Add (sign=1) or refund (sign=-1) one leave on the locked profile"""
+        duration = leave_request.leave_duration * sign
+        carryforward_used = leave_request.carryforward_used * sign
+
+        if leave_request.leave_type == 'ML':
+            profile.medical_leaves_taken += duration
+            profile.available_medical_leaves -= duration
+        elif leave_request.leave_type == 'AL':
+            profile.carryforward_leaves_taken += carryforward_used
+            profile.leaves_taken += duration - carryforward_used
+            profile.available_leaves -= duration - carryforward_used
+            # Carryforward leaves are only usable until March 31st
+            if timezone.now().date().month <= 3:
+                profile.carryforward_available_leaves = max(
+                    0, profile.carryforward_granted - profile.carryforward_leaves_taken
+                )
+            else:
+                profile.carryforward_available_leaves = 0
@@ -0,0 +1,188 @@
+"""
+Content-addressed storage for leave attachments and PAN card files.
+
+An upload is hashed while it is copied to disk and kept once, under its
+SHA-256 digest, so the same medical certificate uploaded five times is
+stored once. A Blob row per file counts the rows pointing at it: the
+receivers below keep the count as those rows are saved and deleted, and
+collect_unreferenced_blobs() (run by Celery beat) removes the files nobody
+references any more.
+
+Files are served by common.views.serve_upload, which hands the transfer to
+the web server (see UPLOAD_SENDFILE_BACKEND in the settings).
+"""
+import hashlib
+import os
+import re
+import tempfile
+from datetime import timedelta
+from functools import lru_cache
+
+from django.core.files.storage import FileSystemStorage
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+from .models import Blob
+
+# Storage directory of the blobs, relative to MEDIA_ROOT
+BLOB_DIR = 'blobs'
+
+# URL prefix of common.views.serve_upload
+UPLOAD_URL = '/files/'
+
+# Unreferenced blobs stored more recently than this are kept: an upload is
+# stored before the row that points at it is saved
+BLOB_GRACE_PERIOD = timedelta(days=1)
+
+# Models with fields in blob storage, proxies included since their saves
+# signal under the proxy
+BLOB_MODELS = (
+    'managers.UnifiedLeaveRequest',
+    'employe.LeaveRequest',
+    'managers.ManagerLeaveRequest',
+    'employe.Benefits',
+    'managers.BenefitsManager',
+)
+
+
+def blob_name(digest, extension):
+    """Storage name of the blob with the given SHA-256 hex digest"""
+    return f"{BLOB_DIR}/{digest[:2]}/{digest}{extension}"
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage that names every file after the SHA-256 of its
+    content; upload_to only contributes the file extension.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('base_url', UPLOAD_URL)
+        super().__init__(**kwargs)
+
+    def get_available_name(self, name, max_length=None):
+        # The name is replaced by the digest in _save, and equal names hold equal content
+        return name
+
+    def _save(self, name, content):
+        extension = re.sub(r'[^a-z0-9.]', '', os.path.splitext(name)[1].lower())[:10]
+        directory = self.path(BLOB_DIR)
+        os.makedirs(directory, exist_ok=True)
+
+        # Hash while streaming into a temporary file next to the blobs, so
+        # the upload is read once and moved into place with a rename
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+                    size += len(chunk)
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+
+            name = blob_name(digest.hexdigest(), extension)
+            path = self.path(name)
+            with transaction.atomic():
+                # The row lock keeps collect_unreferenced_blobs() from deleting
+                # the file between the existence check and the rename
+                blob, created = Blob.objects.select_for_update().get_or_create(
+                    name=name, defaults={'digest': digest.hexdigest(), 'size': size}
+                )
+                if not created:
+                    # Restart the grace period, or an old unreferenced blob
+                    # could be collected before the new row acquires it
+                    blob.last_stored_at = timezone.now()
+                    blob.save(update_fields=['last_stored_at'])
+                if os.path.exists(path):
+                    os.remove(temp_path)
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+
+blob_storage = ContentAddressedStorage()
+
+
+@lru_cache(maxsize=None)
+def _blob_fields(model):
+    """Names of the model's FileFields kept in blob storage"""
+    return tuple(
+        field.attname for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField) and isinstance(field.storage, ContentAddressedStorage)
+    )
+
+
+def _acquire(name):
+    if name:
+        Blob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+
+
+def _release(name):
+    # Files stored before the blob storage have no Blob row and are left alone
+    if name:
+        Blob.objects.filter(name=name, refcount__gt=0).update(refcount=F('refcount') - 1)
+
+
+def _receivers(signal):
+    def decorator(function):
+        for sender in BLOB_MODELS:
+            function = receiver(signal, sender=sender)(function)
+        return function
+    return decorator
+
+
+@_receivers(pre_save)
+def remember_stored_blobs(sender, instance, update_fields=None, **kwargs):
+    fields = [
+        field for field in _blob_fields(sender._meta.concrete_model)
+        if update_fields is None or field in update_fields
+    ]
+    stored = {field: '' for field in fields}
+    if fields and not instance._state.adding:
+        stored.update(sender._base_manager.filter(pk=instance.pk).values(*fields).first() or {})
+    instance._stored_blobs = stored
+
+
+@_receivers(post_save)
+def count_blob_references(sender, instance, **kwargs):
+    stored = instance.__dict__.pop('_stored_blobs', {})
+    for field, old_name in stored.items():
+        new_name = getattr(instance, field).name or ''
+        if new_name != (old_name or ''):
+            _acquire(new_name)
+            _release(old_name)
+
+
+@_receivers(post_delete)
+def release_blob_references(sender, instance, **kwargs):
+    for field in _blob_fields(sender._meta.concrete_model):
+        _release(getattr(instance, field).name)
+
+
+def collect_unreferenced_blobs(grace_period=BLOB_GRACE_PERIOD):
+    """Delete the blobs no row has referenced for grace_period and return how many were removed"""
+    cutoff = timezone.now() - grace_period
+    candidates = Blob.objects.filter(refcount=0, last_stored_at__lt=cutoff)
+    deleted = 0
+    for pk in candidates.values_list('pk', flat=True).iterator():
+        with transaction.atomic():
+            # Re-read under the lock in case a save has stored or referenced it meanwhile
+            blob = Blob.objects.select_for_update().filter(pk=pk, refcount=0, last_stored_at__lt=cutoff).first()
+            if blob is None:
+                continue
+            blob_storage.delete(blob.name)
+            blob.delete()
+            deleted += 1
+    return deleted
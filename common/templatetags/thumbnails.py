@@ -0,0 +1,24 @@
+from django import template
+from django.core.files.storage import default_storage
+
+register = template.Library()
+
+
+@register.filter
+def thumbnail(profile, rendition='small'):
+    """
+    URL of a profile photo thumbnail: {{ employee|thumbnail:'small' }} for
+    the WebP rendition, {{ employee|thumbnail:'small.jpeg' }} for JPEG.
+    Falls back to the original upload until the thumbnails are generated,
+    and to "" when there is no photo.
+    """
+    image = getattr(profile, 'image', None)
+    if not image:
+        return ''
+    size, _, image_format = rendition.partition('.')
+    thumbnails = getattr(profile, 'image_thumbnails', None) or {}
+    if thumbnails.get('source') == image.name:
+        name = thumbnails.get(size, {}).get(image_format or 'webp')
+        if name:
+            return default_storage.url(name)
+    return image.url
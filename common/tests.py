@@ -1,3 +1,352 @@
-from django.test import TestCase
+import tempfile
+import threading
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from common.models import Blob, IdSequence
+from common.services import LeaveApprovalService
+from common.storage import blob_storage, collect_unreferenced_blobs
+from common.utils import reserve_staff_ids
+from employe.models import Employe, LeaveRequest
+from managers.models import LeaveBalanceProjection, Manager
+from managers.tasks import send_leave_submission_notifications
+from project.celery import app
+from users.models import User
+
+# Times each race is run, since a single run may happen not to interleave
+RACE_ROUNDS = 5
+
+
+class LeaveApprovalRaceTests(TransactionTestCase):
+    """
+    Conflicting leave transitions sent at the same moment through the API:
+    exactly one wins, the other gets 409, and the balance moves once.
+    """
+
+    def setUp(self):
+        # Queued tasks (push, thumbnails) run inline instead of waiting on a broker
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', False)
+
+        self.manager_user = User.objects.create_user(
+            username='manager', email='manager@example.com', password='x', is_manager=True, is_employee=False
+        )
+        self.manager = Manager.objects.create(user=self.manager_user)
+        self.employee_user = User.objects.create_user(
+            username='employee', email='employee@example.com', password='x'
+        )
+        self.employee = Employe.objects.create(user=self.employee_user, manager=self.manager)
+
+        patcher = mock.patch('api.v1.views.send_leave_notifications_batch')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _leave(self):
+        # A working week outside the Jan-Mar carryforward window
+        return LeaveRequest.objects.create(
+            employee=self.employee, requested_by_role='employee', subject='Race', leave_type='AL',
+            start_date=date(2030, 6, 3), end_date=date(2030, 6, 7), status='Pending',
+        )
+
+    def _race(self, calls):
+        """POST every (user, url) at once and return the status codes in call order"""
+        barrier = threading.Barrier(len(calls))
+        codes = [None] * len(calls)
+
+        def post(index, user, url):
+            client = APIClient()
+            client.force_authenticate(user)
+            try:
+                barrier.wait()
+                codes[index] = client.post(url).status_code
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=post, args=(i, *call)) for i, call in enumerate(calls)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return codes
+
+    def test_approve_and_cancel_race(self):
+        for _ in range(RACE_ROUNDS):
+            leave = self._leave()
+            self.employee.refresh_from_db()
+            balance = self.employee.available_leaves
+
+            approve, cancel = self._race([
+                (self.manager_user, f'/api/v1/leave-requests/{leave.pk}/approve/'),
+                (self.employee_user, f'/api/v1/leave-requests/{leave.pk}/cancel/'),
+            ])
+
+            self.assertEqual(sorted([approve, cancel]), [200, 409])
+            leave.refresh_from_db()
+            self.employee.refresh_from_db()
+            if approve == 200:
+                self.assertEqual(leave.status, 'Approved')
+                self.assertEqual(self.employee.available_leaves, balance - leave.leave_duration)
+            else:
+                self.assertEqual(leave.status, 'Cancelled')
+                self.assertEqual(self.employee.available_leaves, balance)
+            self.assertEqual(leave.version, 1)
+
+    def test_double_approve_race(self):
+        founder_user = User.objects.create_superuser(username='founder', email='founder@example.com', password='x')
+        for _ in range(RACE_ROUNDS):
+            leave = self._leave()
+            self.employee.refresh_from_db()
+            balance = self.employee.available_leaves
+
+            codes = self._race([
+                (self.manager_user, f'/api/v1/leave-requests/{leave.pk}/approve/'),
+                (founder_user, f'/api/v1/leave-requests/{leave.pk}/approve/'),
+            ])
+
+            self.assertEqual(sorted(codes), [200, 409])
+            leave.refresh_from_db()
+            self.employee.refresh_from_db()
+            self.assertEqual(leave.status, 'Approved')
+            self.assertEqual(leave.version, 1)
+            self.assertEqual(self.employee.available_leaves, balance - leave.leave_duration)
+
+    def test_approve_and_reject_race(self):
+        for _ in range(RACE_ROUNDS):
+            leave = self._leave()
+            self.employee.refresh_from_db()
+            balance = self.employee.available_leaves
+
+            approve, reject = self._race([
+                (self.manager_user, f'/api/v1/leave-requests/{leave.pk}/approve/'),
+                (self.manager_user, f'/api/v1/leave-requests/{leave.pk}/reject/'),
+            ])
+
+            leave.refresh_from_db()
+            self.employee.refresh_from_db()
+            if approve == 409:
+                # Rejected first; approving a rejected request conflicts
+                self.assertEqual(reject, 200)
+                self.assertEqual(leave.status, 'Rejected')
+                self.assertEqual(self.employee.available_leaves, balance)
+            else:
+                # Approved first; the reject either lost the race or refunded it afterwards
+                self.assertEqual(approve, 200)
+                self.assertIn(reject, (200, 409))
+                expected = ('Rejected', balance) if reject == 200 else ('Approved', balance - leave.leave_duration)
+                self.assertEqual((leave.status, self.employee.available_leaves), expected)
+
+
+class LeaveDeletionRefundTests(TestCase):
+    """Deleting an approved leave refunds the profile and the projection alike"""
+
+    def setUp(self):
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', False)
+        manager_user = User.objects.create_user(
+            username='manager', email='manager@example.com', password='x', is_manager=True, is_employee=False
+        )
+        manager = Manager.objects.create(user=manager_user)
+        self.employee_user = User.objects.create_user(username='employee', email='employee@example.com', password='x')
+        self.employee = Employe.objects.create(user=self.employee_user, manager=manager)
+
+    def test_deleted_approved_leave_is_refunded(self):
+        available, taken = self.employee.available_leaves, self.employee.leaves_taken
+        leave = LeaveApprovalService().submit(LeaveRequest(
+            employee=self.employee, requested_by_role='employee', subject='Holiday', leave_type='AL',
+            start_date=date(2030, 6, 3), end_date=date(2030, 6, 7),
+        ))
+        LeaveApprovalService().approve(leave)
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.available_leaves, available - 5)
+
+        LeaveRequest.objects.get(pk=leave.pk).delete()
+
+        self.employee.refresh_from_db()
+        self.assertEqual((self.employee.available_leaves, self.employee.leaves_taken), (available, taken))
+        projection = LeaveBalanceProjection.objects.get(requester_user=self.employee_user, year=2030)
+        self.assertEqual((projection.annual_taken, projection.pending_requests), (0, 0))
+
+
+class ServeUploadAccessTests(TestCase):
+    """Stored files are served to the owner, their manager and founders only"""
+
+    def setUp(self):
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', False)
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.manager_user = User.objects.create_user(
+            username='manager', email='manager@example.com', password='x', is_manager=True, is_employee=False
+        )
+        manager = Manager.objects.create(user=self.manager_user)
+        self.employee_user = User.objects.create_user(username='employee', email='employee@example.com', password='x')
+        employee = Employe.objects.create(user=self.employee_user, manager=manager)
+        self.leave = LeaveRequest.objects.create(
+            employee=employee, requested_by_role='employee', subject='Doctor', leave_type='ML',
+            start_date=date(2030, 6, 3), end_date=date(2030, 6, 3), status='Pending',
+            file=SimpleUploadedFile('certificate.pdf', b'%PDF-1.4 certificate'),
+        )
+
+    def _get(self, user):
+        self.client.force_login(user)
+        return self.client.get(self.leave.file.url)
+
+    def test_owner_manager_and_founder_get_the_file(self):
+        founder_user = User.objects.create_superuser(username='founder', email='founder@example.com', password='x')
+        for user in (self.employee_user, self.manager_user, founder_user):
+            response = self._get(user)
+            self.assertEqual(response.status_code, 200, user.email)
+            self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4 certificate')
+
+    def test_other_users_get_404(self):
+        other_manager = User.objects.create_user(
+            username='other', email='other@example.com', password='x', is_manager=True, is_employee=False
+        )
+        Manager.objects.create(user=other_manager)
+        colleague = User.objects.create_user(username='colleague', email='colleague@example.com', password='x')
+        for user in (other_manager, colleague):
+            self.assertEqual(self._get(user).status_code, 404, user.email)
+
+
+class BlobCollectionTests(TestCase):
+    """Unreferenced blobs are collected once their grace period has passed"""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _age(self, days):
+        past = timezone.now() - timedelta(days=days)
+        Blob.objects.update(created_at=past, last_stored_at=past)
+
+    def test_reupload_restarts_the_grace_period(self):
+        name = blob_storage.save('certificate.pdf', ContentFile(b'%PDF-1.4 certificate'))
+        self._age(days=3)
+
+        # The same content is uploaded again; its row has not acquired it yet
+        self.assertEqual(blob_storage.save('copy.pdf', ContentFile(b'%PDF-1.4 certificate')), name)
+        self.assertEqual(collect_unreferenced_blobs(), 0)
+        self.assertTrue(blob_storage.exists(name))
+
+        self._age(days=3)
+        self.assertEqual(collect_unreferenced_blobs(), 1)
+        self.assertFalse(blob_storage.exists(name))
+
+
+class PeopleETagTests(TestCase):
+    """The people and leave request ETags change when a person's account details do"""
+
+    def setUp(self):
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', False)
+        self.user = User.objects.create_superuser(username='founder', email='founder@example.com', password='x')
+        manager_user = User.objects.create_user(
+            username='manager', email='manager@example.com', password='x', is_manager=True, is_employee=False
+        )
+        manager = Manager.objects.create(user=manager_user)
+        self.employee_user = User.objects.create_user(username='employee', email='employee@example.com', password='x')
+        self.employee = Employe.objects.create(user=self.employee_user, manager=manager)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_name_change_changes_etag(self):
+        etag = self.client.get('/api/v1/people/')['ETag']
+        self.assertEqual(self.client.get('/api/v1/people/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.employee_user.first_name = 'Renamed'
+        self.employee_user.save()
+
+        response = self.client.get('/api/v1/people/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_requester_name_change_changes_leave_etag(self):
+        LeaveRequest.objects.create(
+            employee=self.employee, requested_by_role='employee', subject='Holiday', leave_type='AL',
+            start_date=date(2030, 6, 3), end_date=date(2030, 6, 7), status='Pending',
+        )
+        etag = self.client.get('/api/v1/leave-requests/')['ETag']
+
+        self.employee_user.first_name = 'Renamed'
+        self.employee_user.save()
+
+        response = self.client.get('/api/v1/leave-requests/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class LeaveSubmissionMailTests(TestCase):
+    """Leave requests created through the API queue their emails instead of sending them inline"""
+
+    def setUp(self):
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', False)
+        manager_user = User.objects.create_user(
+            username='manager', email='manager@example.com', password='x', is_manager=True, is_employee=False
+        )
+        manager = Manager.objects.create(user=manager_user)
+        self.employee_user = User.objects.create_user(username='employee', email='employee@example.com', password='x')
+        Employe.objects.create(user=self.employee_user, manager=manager)
+        self.client = APIClient()
+        self.client.force_authenticate(self.employee_user)
+
+    def test_create_queues_the_submission_emails(self):
+        payload = {
+            'subject': 'Holiday', 'leave_type': 'AL', 'description': 'Trip',
+            'start_date': '2030-06-03', 'end_date': '2030-06-07',
+        }
+        with mock.patch('api.v1.views.send_leave_submission_notifications') as task, \
+                mock.patch('django.core.mail.EmailMessage.send') as send:
+            response = self.client.post('/api/v1/leave-requests/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        send.assert_not_called()
+        task.delay.assert_called_once()
+
+        mail.outbox = []
+        label, leave_id, review_url = task.delay.call_args.args
+        self.assertEqual(send_leave_submission_notifications(label, leave_id, review_url), 2)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox), ['employee@example.com', 'manager@example.com']
+        )
+
+
+class StaffIdSequenceTests(TestCase):
+    """Reserved staff IDs never collide with IDs entered by hand"""
+
+    def setUp(self):
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', False)
+
+    def _employee(self, staff_id):
+        user = User.objects.create_user(username=staff_id, email=f'{staff_id}@example.com', password='x')
+        return Employe.objects.create(user=user, employe_id=staff_id)
+
+    def test_sequence_starts_after_existing_ids(self):
+        self._employee('EMP00007')
+        # IDs that are not the prefix followed by digits are not counted
+        self._employee('EMP00099A')
+        self._employee('EMP-0042')
+        self.assertEqual(reserve_staff_ids('employee', 2), ['EMP00008', 'EMP00009'])
+
+    def test_manual_id_inside_the_range_is_skipped(self):
+        self.assertEqual(reserve_staff_ids('employee'), ['EMP00001'])
+        self._employee('EMP00003')
+
+        self.assertEqual(reserve_staff_ids('employee'), ['EMP00002'])
+        self.assertEqual(reserve_staff_ids('employee', 2), ['EMP00004', 'EMP00005'])
+        self.assertEqual(IdSequence.objects.get(name='employee').last_value, 5)
@@ -12,12 +12,8 @@ def get_user_role(user):
         return None
     
     # Check if user is a founder (highest priority)
-    try:
-        from managers.models import Founder
-        Founder.objects.get(user=user)
+    if is_founder(user):
         return 'founder'
-    except Founder.DoesNotExist:
-        pass
     
     # Check if user is a manager
     if user.is_manager:
@@ -41,12 +37,8 @@ def get_user_roles(user):
     roles = []
     
     # Check if user is a founder
-    try:
-        from managers.models import Founder
-        Founder.objects.get(user=user)
+    if is_founder(user):
         roles.append('founder')
-    except Founder.DoesNotExist:
-        pass
     
     # Check if user is a manager
     if user.is_manager:
@@ -60,13 +52,17 @@ def get_user_roles(user):
 
 
 def is_founder(user):
-    """Check if user is a founder"""
-    try:
+    """
+    Check if user is a founder. Uses the `founder_flag` that the
+    authentication backend annotates on the request user, else queries
+    once and remembers the answer on the user object.
+    """
+    flag = getattr(user, 'founder_flag', None)
+    if flag is None:
         from managers.models import Founder
-        Founder.objects.get(user=user)
-        return True
-    except Founder.DoesNotExist:
-        return False
+        flag = Founder.objects.filter(user=user).exists()
+        user.founder_flag = flag
+    return flag
 
 
 def is_manager(user):
@@ -139,36 +135,71 @@ def get_dashboard_url(user):
         return '/managers/login/'
 
 
+# Zero-padded width of the number in allocated IDs: EMP00001, MGR00001
+STAFF_ID_DIGITS = 5
+
+# Sequence name -> (ID prefix, model label, ID field)
+STAFF_ID_SEQUENCES = {
+    'employee': ('EMP', 'employe.Employe', 'employe_id'),
+    'manager': ('MGR', 'managers.Manager', 'manager_id'),
+}
+
+
+def _highest_staff_id_number(kind):
+    """Largest number among the existing IDs of `kind`, to start a new sequence after"""
+    from django.apps import apps
+    from django.db.models import BigIntegerField, Max
+    from django.db.models.functions import Cast, Substr
+
+    prefix, model_label, field = STAFF_ID_SEQUENCES[kind]
+    # Only digit suffixes short enough for a bigint; the database picks the max
+    highest = apps.get_model(model_label).objects.filter(
+        **{f'{field}__regex': rf'^{prefix}[0-9]{{1,18}}$'}
+    ).aggregate(highest=Max(Cast(Substr(field, len(prefix) + 1), BigIntegerField())))['highest']
+    return highest or 0
+
+
+def reserve_staff_ids(kind, count=1):
+    """
+    Reserve `count` consecutive new IDs of `kind` ('employee' or 'manager')
+    and return them, e.g. ['EMP00042', 'EMP00043']. One counter update
+    however many are reserved; IDs of a rolled back transaction are reused.
+    IDs typed in by hand or imported are not counted, so a reservation that
+    runs into one moves the counter past the highest ID in use.
+    """
+    from django.apps import apps
+    from django.db import transaction
+    from django.db.models import F
+    from common.models import IdSequence
+
+    prefix, model_label, field = STAFF_ID_SEQUENCES[kind]
+
+    def staff_ids(last_value):
+        return [f"{prefix}{number:0{STAFF_ID_DIGITS}d}" for number in range(last_value - count + 1, last_value + 1)]
+
+    sequence = IdSequence.objects.filter(name=kind)
+    with transaction.atomic():
+        if not sequence.update(last_value=F('last_value') + count):
+            # First allocation: continue after the IDs given out before the sequence existed
+            IdSequence.objects.get_or_create(name=kind, defaults={'last_value': _highest_staff_id_number(kind)})
+            sequence.update(last_value=F('last_value') + count)
+        last_value = sequence.values_list('last_value', flat=True).get()
+
+        # The counter row stays locked until commit, so the catch-up cannot race
+        if apps.get_model(model_label).objects.filter(**{f'{field}__in': staff_ids(last_value)}).exists():
+            last_value = max(last_value - count, _highest_staff_id_number(kind)) + count
+            sequence.update(last_value=last_value)
+    return staff_ids(last_value)
+
+
 def generate_manager_id():
-    """Generate a unique manager ID"""
-    import random
-    import string
-    from managers.models import Manager
-    
-    while True:
-        # Generate ID like MGR001, MGR002, etc.
-        number = random.randint(1, 9999)
-        manager_id = f"MGR{number:03d}"
-        
-        # Check if this ID already exists
-        if not Manager.objects.filter(manager_id=manager_id).exists():
-            return manager_id
+    """Allocate the next manager ID, like MGR00001"""
+    return reserve_staff_ids('manager')[0]
 
 
 def generate_employee_id():
-    """Generate a unique employee ID"""
-    import random
-    import string
-    from employe.models import Employe
-    
-    while True:
-        # Generate ID like EMP001, EMP002, etc.
-        number = random.randint(1, 9999)
-        employe_id = f"EMP{number:03d}"
-        
-        # Check if this ID already exists
-        if not Employe.objects.filter(employe_id=employe_id).exists():
-            return employe_id
+    """Allocate the next employee ID, like EMP00001"""
+    return reserve_staff_ids('employee')[0]
 
 
 def get_employees_under_manager(manager):
@@ -233,3 +264,28 @@ def calculate_leave_days(start_date, end_date):
         current_date += timedelta(days=1)
         
     return working_days if working_days > 0 else 1
+
+
+def requested_leave_version(request):
+    """Version of the leave request the user's page showed (`version` form or query field), if sent"""
+    value = request.POST.get('version') or request.GET.get('version') or ''
+    return int(value) if value.isdigit() else None
+
+
+def leave_conflict_response(request, exc, redirect_to):
+    """
+    Answer the loser of a leave action race (LeaveActionConflict): a 409 for
+    AJAX callers, otherwise the error message and a redirect back to the list.
+    """
+    from django.contrib import messages
+    from django.http import JsonResponse
+    from django.shortcuts import redirect
+
+    if request.headers.get("x-requested-with") == "XMLHttpRequest":
+        return JsonResponse({
+            "status": "error",
+            "title": "Conflict",
+            "message": str(exc.detail),
+        }, status=exc.status_code)
+    messages.error(request, str(exc.detail))
+    return redirect(redirect_to)
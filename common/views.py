@@ -1,3 +1,116 @@
-from django.shortcuts import render
+import mimetypes
+import os
+import re
+from urllib.parse import quote
 
-# Create your views here.
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import Q
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+
+from common.storage import BLOB_DIR, blob_storage
+from common.utils import is_founder
+from employe.models import Benefits
+from managers.models import BenefitsManager, UnifiedLeaveRequest
+
+# Chunk size of uploads streamed by Django itself
+UPLOAD_STREAM_CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _file_chunks(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(UPLOAD_STREAM_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _stream_upload(request, path, content_type):
+    """
+    Response streaming the file from Django, for when no web server takes
+    over; honours a single `Range: bytes=start-end`, as the servers do.
+    """
+    size = os.path.getsize(path)
+    match = _RANGE_RE.match(request.headers.get('Range', ''))
+    if not match or match.groups() == ('', ''):
+        return FileResponse(open(path, 'rb'), content_type=content_type)
+
+    first, last = match.groups()
+    if first:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    else:
+        # bytes=-N asks for the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    if start > end or start >= size:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f"bytes */{size}"
+        return response
+
+    response = StreamingHttpResponse(_file_chunks(path, start, end - start + 1), status=206, content_type=content_type)
+    response['Content-Length'] = str(end - start + 1)
+    response['Content-Range'] = f"bytes {start}-{end}/{size}"
+    return response
+
+
+def can_access_upload(user, name):
+    """
+    Whether the user may download the stored file: founders may get any,
+    others only files of a leave request or benefits row that is theirs or
+    belongs to an employee they manage. Blobs are shared by identical
+    uploads, so any one such row is enough.
+    """
+    if user.is_superuser or is_founder(user):
+        return True
+    return (
+        UnifiedLeaveRequest.objects.filter(file=name).filter(
+            Q(requester_user=user) | Q(requested_by_role='employee', employee__manager__user=user)
+        ).exists()
+        or Benefits.objects.filter(pancard_file=name).filter(
+            Q(employe__user=user) | Q(employe__manager__user=user)
+        ).exists()
+        or BenefitsManager.objects.filter(pancard_file=name, manager__user=user).exists()
+    )
+
+
+@login_required(login_url='/')
+def serve_upload(request, name):
+    """
+    Leave attachments and PAN card files. With UPLOAD_SENDFILE_BACKEND set,
+    the web server sends the file (and handles ranges and conditional
+    requests): nginx through X-Accel-Redirect to the internal
+    UPLOAD_SENDFILE_URL location, Apache mod_xsendfile through X-Sendfile.
+    Files the user may not see are answered 404, like missing ones.
+    """
+    if not can_access_upload(request.user, name):
+        raise Http404
+    try:
+        path = blob_storage.path(name)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(path):
+        raise Http404
+
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    backend = getattr(settings, 'UPLOAD_SENDFILE_BACKEND', None)
+    if backend == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.UPLOAD_SENDFILE_URL + quote(name)
+    elif backend == 'apache':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+    else:
+        response = _stream_upload(request, path, content_type)
+
+    response['Accept-Ranges'] = 'bytes'
+    if name.startswith(f"{BLOB_DIR}/"):
+        # A blob's name is its content hash, so it never changes
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -1,6 +1,9 @@
-from django.contrib import admin
-from .models import Employe
-from .forms import EmployeAdminForm
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.shortcuts import render
+from django.urls import path
+from .models import Employe, LeaveRequest
+from .forms import EmployeAdminForm, PeopleImportForm
 from users.models import User
 
 class EmployeAdmin(admin.ModelAdmin):
@@ -33,4 +36,80 @@ class EmployeAdmin(admin.ModelAdmin):
         
         super().save_model(request, obj, form, change)
 
-admin.site.register(Employe, EmployeAdmin)
\ No newline at end of file
+    def get_urls(self):
+        custom_urls = [
+            path('import/', self.admin_site.admin_view(self.import_people_view), name='employe_employe_import'),
+        ]
+        return custom_urls + super().get_urls()
+
+    def import_people_view(self, request):
+        """Upload a CSV/XLSX of employees and managers and onboard them in bulk"""
+        from managers.models import Founder
+        from managers.onboarding import IMPORT_COLUMNS, PeopleImporter, read_people_file
+
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+
+        stats = None
+        form = PeopleImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                stats = PeopleImporter(
+                    founder=Founder.objects.filter(user=request.user).first(),
+                    created_by=request.user,
+                    dry_run=form.cleaned_data['dry_run'],
+                ).run(read_people_file(upload, upload.name))
+            except ValidationError as e:
+                form.add_error('file', e)
+            else:
+                verb = 'Validated' if form.cleaned_data['dry_run'] else 'Imported'
+                self.message_user(
+                    request,
+                    f"{verb} {stats['employees']} employees and {stats['managers']} managers "
+                    f"from {stats['rows']} rows; {len(stats['errors'])} rows had errors.",
+                    messages.WARNING if stats['errors'] else messages.SUCCESS,
+                )
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Import employees and managers',
+            'opts': self.model._meta,
+            'form': form,
+            'stats': stats,
+            'columns': IMPORT_COLUMNS,
+        }
+        return render(request, 'admin/import_people.html', context)
+
+def leave_action(action):
+    """Build an admin action that approves or rejects the selected leave requests"""
+    def run(modeladmin, request, queryset):
+        from common.exceptions import LeaveActionConflict
+        from common.services import LeaveApprovalService
+
+        service = LeaveApprovalService(request.user)
+        done = 0
+        for leave_request in queryset:
+            try:
+                getattr(service, action)(leave_request)
+                done += 1
+            except LeaveActionConflict as e:
+                modeladmin.message_user(request, f"{leave_request}: {e}", messages.WARNING)
+        past_tense = {'approve': 'approved', 'reject': 'rejected'}[action]
+        modeladmin.message_user(request, f"{done} leave request(s) {past_tense}.")
+
+    run.__name__ = f'{action}_leave_requests'
+    run.short_description = f'{action.capitalize()} selected leave requests'
+    return run
+
+
+class LeaveRequestAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'employee', 'leave_type', 'start_date', 'end_date', 'status')
+    list_filter = ('status', 'leave_type')
+    search_fields = ('employee__user__email', 'subject')
+    list_select_related = ('employee__user',)
+    actions = [leave_action('approve'), leave_action('reject')]
+
+
+admin.site.register(Employe, EmployeAdmin)
+admin.site.register(LeaveRequest, LeaveRequestAdmin)
\ No newline at end of file
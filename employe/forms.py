@@ -22,3 +22,8 @@ class EmployeAdminForm(forms.ModelForm):
         else:
             self.fields['password'].required = True
             self.fields['password'].help_text = ""
+
+
+class PeopleImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV or XLSX with a header row; email and first_name are required.")
+    dry_run = forms.BooleanField(required=False, help_text="Only check the rows; nobody is created.")
@@ -0,0 +1,97 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:37
+
+import datetime
+
+from django.core.management.color import no_style
+from django.db import migrations
+from django.utils import timezone
+
+
+def _as_datetime(value):
+    """employe_leave_request stored plain dates; the unified table stores datetimes"""
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    return timezone.make_aware(datetime.datetime.combine(value, datetime.time.min))
+
+
+def copy_employee_leave_requests(apps, schema_editor):
+    """
+    Move rows of employe_leave_request into the unified leave table, keeping
+    each row's id unless the unified table already uses it. Every copy
+    records its old id in legacy_id.
+    """
+    LeaveRequest = apps.get_model('employe', 'LeaveRequest')
+    UnifiedLeaveRequest = apps.get_model('managers', 'UnifiedLeaveRequest')
+
+    taken = set(UnifiedLeaveRequest.objects.values_list('pk', flat=True))
+    copies = []
+    for old in LeaveRequest.objects.select_related('employee').iterator():
+        status = old.status or 'Pending'
+        copies.append(UnifiedLeaveRequest(
+            id=None if old.pk in taken else old.pk,
+            legacy_id=old.pk,
+            subject=old.subject,
+            start_date=old.start_date,
+            end_date=old.end_date,
+            leave_type=old.leave_type,
+            description=old.description,
+            file=old.file.name if old.file else None,
+            requested_by_role='employee',
+            employee_id=old.employee_id,
+            requester_user_id=old.employee.user_id,
+            # The flags follow the status, which is what the employee views showed
+            status=status,
+            is_approved=status == 'Approved',
+            is_rejected=status == 'Rejected',
+            is_cancelled=status == 'Cancelled',
+            approval_date=_as_datetime(old.approval_date),
+            rejection_date=_as_datetime(old.rejection_date),
+            cancellation_date=_as_datetime(old.cancellation_date),
+            leave_duration=old.leave_duration,
+            carryforward_used=old.carryforward_used,
+            created_date=old.created_date,
+            is_active=old.is_active,
+            created_by_id=old.created_by_id,
+            updated_by_id=old.updated_by_id,
+        ))
+
+    field = UnifiedLeaveRequest._meta.get_field('created_date')
+    field.auto_now_add = False
+    try:
+        # Rows keeping their id go first; the sequence is then moved past them
+        # so the renumbered rows cannot draw one of those ids
+        UnifiedLeaveRequest.objects.bulk_create([copy for copy in copies if copy.id], batch_size=500)
+        for sql in schema_editor.connection.ops.sequence_reset_sql(no_style(), [UnifiedLeaveRequest]):
+            schema_editor.execute(sql)
+        UnifiedLeaveRequest.objects.bulk_create([copy for copy in copies if not copy.id], batch_size=500)
+    finally:
+        field.auto_now_add = True
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('managers', '0016_move_manager_leave_requests'),
+        ('employe', '0013_employe_carryforward_granted_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_employee_leave_requests, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='LeaveRequest',
+        ),
+        migrations.CreateModel(
+            name='LeaveRequest',
+            fields=[
+            ],
+            options={
+                'verbose_name': 'leave_request',
+                'verbose_name_plural': 'leave_requests',
+                'ordering': ['-id'],
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('managers.unifiedleaverequest',),
+        ),
+    ]
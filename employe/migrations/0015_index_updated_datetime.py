@@ -0,0 +1,58 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employe', '0014_consolidate_leave_requests'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='address',
+            name='updated_datetime',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='background',
+            name='updated_datetime',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='benefits',
+            name='updated_datetime',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='emergencycontact',
+            name='updated_datetime',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='employe',
+            name='updated_datetime',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='holiday',
+            name='updated_datetime',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='identification',
+            name='updated_datetime',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='skill',
+            name='updated_datetime',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='workschedule',
+            name='updated_datetime',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+    ]
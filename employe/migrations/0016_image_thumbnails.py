@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employe', '0015_index_updated_datetime'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employe',
+            name='image_thumbnails',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -3,9 +3,10 @@ from datetime import datetime, timedelta
 from django.utils import timezone
 
 from common.models import CommonModel
+from common.storage import blob_storage
 
 from users.models import User
-from managers.models import Manager
+from managers.models import Manager, RoleLeaveRequestManager, UnifiedLeaveRequest
 
 EMPLOYE_CHOICES = (
     ('Full-Time', 'Full-Time'),
@@ -46,6 +47,8 @@ class Employe(CommonModel):
     work_location = models.CharField(max_length=100, null=True, blank=True)
     employe_status = models.CharField(max_length=100, choices=STATUS_CHOICES, null=True, blank=True)
     image = models.ImageField(upload_to='images/', null=True , blank=True)
+    # Thumbnail storage names by rendition and format, see managers/thumbnails.py
+    image_thumbnails = models.JSONField(default=dict, blank=True, editable=False)
     available_leaves = models.IntegerField(default=18)  
     leaves_taken = models.IntegerField(default=0)
     medical_leaves_taken = models.IntegerField(default=0)
@@ -133,7 +136,7 @@ class Benefits(CommonModel):
     branch_name = models.CharField(max_length=100, null=True, blank=True)
     ifsc_code = models.CharField(max_length=100, null=True, blank=True)
     pancard = models.CharField(max_length=100, null=True, blank=True)
-    pancard_file = models.FileField(max_length=100, null=True, blank=True, upload_to='pancard')
+    pancard_file = models.FileField(max_length=100, null=True, blank=True, upload_to='pancard', storage=blob_storage)
     pf_fund = models.FloatField(default=0)
     state_insurance_number = models.CharField(max_length=100, null=True, blank=True)
 
@@ -218,72 +221,16 @@ class WorkSchedule(CommonModel):
 
 
 
-# Fixed: Corrected model name from LeaveReaquest to LeaveRequest and added status field
-class LeaveRequest(CommonModel):
-    subject = models.CharField(max_length=100)
-    start_date= models.DateField(null=True, blank=True)
-    end_date= models.DateField(null=True, blank=True)
-    leave_type = models.CharField(max_length=100, choices=LEAVE_CHOICES, null=True, blank=True)
-    description = models.CharField(max_length=200, null=True, blank=True)
-    file = models.FileField(null=True, blank=True, upload_to='file')
-    employee = models.ForeignKey(Employe, on_delete=models.CASCADE)
-    status = models.CharField(max_length=20, default='Pending', choices=[
-        ('Pending', 'Pending'),
-        ('Approved', 'Approved'),
-        ('Rejected', 'Rejected'),
-        ('Cancelled', 'Cancelled')
-    ])  # Fixed: Added status field as required
-    is_approved = models.BooleanField(default=False)
-    approval_date = models.DateField(null=True, blank=True)
-    is_rejected = models.BooleanField(default=False)
-    rejection_date = models.DateField(null=True, blank=True)
-    is_cancelled = models.BooleanField(default=False)
-    cancellation_date = models.DateField(null=True, blank=True)
-    leave_duration = models.IntegerField(default=0)
-    carryforward_used = models.IntegerField(default=0)
+class LeaveRequest(UnifiedLeaveRequest):
+    """Employee leave requests, kept under the old name as a proxy over the unified leave table"""
+    objects = RoleLeaveRequestManager('employee')
 
     class Meta:
-        db_table = 'employe_leave_request'  # Fixed: Corrected table name
-        verbose_name = 'leave_request'  # Fixed: Corrected verbose name
-        verbose_name_plural ='leave_requests'  # Fixed: Corrected plural name
+        proxy = True
+        verbose_name = 'leave_request'
+        verbose_name_plural ='leave_requests'
         ordering = ["-id"]
 
-    def calculate_working_days(self):
-        """Calculate working days between start_date and end_date (excluding weekends)"""
-        if not self.start_date or not self.end_date:
-            return 0
-
-        # Convert string dates to date objects if needed
-        start_date = self.start_date
-        end_date = self.end_date
-
-        if isinstance(start_date, str):
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-        if isinstance(end_date, str):
-            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-
-        # Ensure start_date is not after end_date
-        if start_date > end_date:
-            return 0
-
-        # Count working days (Monday=0, Sunday=6)
-        working_days = 0
-        current_date = start_date
-
-        while current_date <= end_date:
-            # Monday=0, Tuesday=1, ..., Saturday=5, Sunday=6
-            if current_date.weekday() < 5:  # Monday to Friday
-                working_days += 1
-            current_date += timedelta(days=1)
-
-        return working_days
-
-    def save(self, *args, **kwargs):
-        """Override save to automatically calculate leave duration"""
-        # Calculate working days before saving
-        self.leave_duration = self.calculate_working_days()
-        super().save(*args, **kwargs)
-
     def __str__(self):
         return f"{self.employee.user.email} - {self.subject}"
 
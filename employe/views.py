@@ -5,14 +5,21 @@ from django.http.response import HttpResponseRedirect
 from django.contrib.auth import authenticate, login as auth_login, logout as auth_logout
 from django.contrib.auth.decorators import login_required
 
-from common.decorators import allow_employee, role_required
-from common.utils import get_user_profile, get_leave_balance_info
+from asgiref.sync import sync_to_async
+
+from common.decorators import allow_employee, async_view, role_required
+from common.profiles import EMPLOYE_SECTIONS, ProfileAggregate
+from common.utils import get_user_profile, get_leave_balance_info, leave_conflict_response, requested_leave_version
+from common.exceptions import LeaveActionConflict
+from common.services import LeaveApprovalService
 from employe.models import *
 from employe.models import LeaveRequest
 from managers.models import *
 from users.models import *
 from datetime import datetime
-from managers.views import send_leave_notification
+from managers.ics_feeds import calendar_feed_links
+from managers.notifications import asend_mail
+from managers.views import asend_leave_notifications, send_leave_notification
 
 
 from django.contrib.auth.models import User
@@ -37,20 +44,15 @@ from django.core.exceptions import ValidationError
 import secrets
 from django.contrib.auth.hashers import make_password
 
-from users.models import OTP
+from users.otp import OTP_EXPIRED, OTP_INVALID, OTPRateLimitExceeded, check_otp, consume_otp, issue_otp
 
 
 @login_required(login_url='/login')
 @allow_employee
 def details(request):
     user = request.user
-    employe = get_object_or_404(Employe, user=user)
-    contact, _ = EmergencyContact.objects.get_or_create(employe=employe)
-    address, _ = Address.objects.get_or_create(employe=employe)
-    background, _ = Background.objects.get_or_create(employe=employe)
-    benefits, _ = Benefits.objects.get_or_create(employe=employe)
-    identification, _ = Identification.objects.get_or_create(employe=employe)
-    schedule, _ = WorkSchedule.objects.get_or_create(employe=employe)
+    aggregate = ProfileAggregate.load(Employe, EMPLOYE_SECTIONS, user=user)
+    employe = aggregate.profile
     holidays = Holiday.objects.all()
     leave_history = LeaveRequest.objects.filter(employee=employe).order_by('-created_date')
     leave_balance_info = get_leave_balance_info(request.user)
@@ -58,15 +60,11 @@ def details(request):
     context ={
         'employe': employe,
         'user': user,
-        'contact': contact,
-        'address': address,
-        'background': background,
-        'benefits': benefits,
-        'identification': identification,
-        'schedule': schedule,
+        **aggregate.sections(),
         'holidays':holidays,
         'leave_history': leave_history,
-        'leave_balance_info': leave_balance_info
+        'leave_balance_info': leave_balance_info,
+        'calendar_feeds': calendar_feed_links(request, user),
     }
 
     return render(request, "employe/details.html", context=context)
@@ -110,12 +108,18 @@ def employee_dashboard(request):
     return render(request, 'employe/employee_dashboard.html', context)
 
 
-@login_required(login_url='/login')
-@allow_employee
-def apply_leave(request):
+def _render_leaveform(request, employe):
+    return render(request, "employe/leaveform.html", {
+        'employe': employe,
+        'leave_balance_info': get_leave_balance_info(request.user)
+    })
+
+
+@async_view(login_required(login_url='/login'), allow_employee)
+async def apply_leave(request):
     user = request.user
     try:
-        employe = Employe.objects.get(user=user)
+        employe = await Employe.objects.select_related('manager__user').aget(user=user)
     except Employe.DoesNotExist:
         messages.error(request, "Employee profile not found.")
         return redirect('employe:login')
@@ -130,10 +134,7 @@ def apply_leave(request):
 
         if not all([subject, start_date_str, end_date_str, leave_type, description]):
             messages.error(request, "❌ All fields except file are required.")
-            return render(request, "employe/leaveform.html", {
-                'employe': employe,
-                'leave_balance_info': get_leave_balance_info(request.user)
-            })
+            return await sync_to_async(_render_leaveform)(request, employe)
 
         try:
             start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
@@ -141,12 +142,9 @@ def apply_leave(request):
             
             if start_date > end_date:
                 messages.error(request, "❌ Start date cannot be after end date.")
-                return render(request, "employe/leaveform.html", {
-                    'employe': employe,
-                    'leave_balance_info': get_leave_balance_info(request.user)
-                })
+                return await sync_to_async(_render_leaveform)(request, employe)
 
-            leave_request = LeaveRequest.objects.create(
+            leave_request = await sync_to_async(LeaveApprovalService(request.user).submit)(LeaveRequest(
                 subject=subject,
                 leave_type=leave_type,
                 description=description,
@@ -154,43 +152,35 @@ def apply_leave(request):
                 employee=employe,
                 start_date=start_date,
                 end_date=end_date,
-                status='Pending'
-            )
-
-            try:
-                if employe.manager and employe.manager.user.email:
-                    send_leave_notification(request, leave_request, 'new_request', employe.manager.user.email, manager_name=employe.manager.user.get_full_name(), cc_founder=True)
-                else:
-                    # If no manager, notify founder directly
-                    send_leave_notification(request, leave_request, 'new_request', None, cc_founder=True)
-                
-                send_leave_notification(request, leave_request, 'submission_confirmation', user.email)
-                
-                messages.success(request, "✅ Leave request submitted successfully. Notifications have been sent.")
-            except Exception as e:
-                messages.error(request, f"⚠️ Leave request saved, but failed to send email notifications. Error: {str(e)}")
+            ))
 
+            if employe.manager and employe.manager.user.email:
+                manager_user = employe.manager.user
+                new_request = (leave_request, 'new_request', manager_user.email,
+                               {'manager_name': manager_user.get_full_name(), 'cc_founder': True})
+            else:
+                # If no manager, notify founder directly
+                new_request = (leave_request, 'new_request', None, {'cc_founder': True})
+            await asend_leave_notifications(request, [
+                new_request,
+                (leave_request, 'submission_confirmation', user.email, {}),
+            ])
+
+            messages.success(request, "✅ Leave request submitted successfully. Notifications have been sent.")
             return HttpResponseRedirect(reverse("employe:leavelist"))
 
         except ValueError as e:
             messages.error(request, f"❌ Invalid date format: {e}")
-            return render(request, "employe/leaveform.html", {'employe': employe})
+            return await sync_to_async(_render_leaveform)(request, employe)
         except Exception as e:
             messages.error(request, f"❌ Error creating leave request: {e}")
-            return render(request, "employe/leaveform.html", {
-                'employe': employe,
-                'leave_balance_info': get_leave_balance_info(request.user)
-            })
+            return await sync_to_async(_render_leaveform)(request, employe)
 
-    return render(request, "employe/leaveform.html", {
-        'employe': employe,
-        'leave_balance_info': get_leave_balance_info(request.user)
-    })
+    return await sync_to_async(_render_leaveform)(request, employe)
 
-@login_required(login_url='/login')
-@allow_employee
-def leaveform(request):
-    return apply_leave(request)
+@async_view(login_required(login_url='/login'), allow_employee)
+async def leaveform(request):
+    return await apply_leave(request)
 
 
 def logout(request):
@@ -216,19 +206,18 @@ def login(request):
         password = request.POST.get("password")
 
         if email and password and employe_id:
-            user = authenticate(request, email=email, password=password)
+            # The backend reads the user's employee ID in the same query
+            user = authenticate(request, email=email, password=password, role='employee')
             if user is not None:
-                try:
-                    employee_profile = Employe.objects.get(user=user)
-                    if employee_profile.employe_id != employe_id:
-                        messages.error(request, "Invalid Employee ID for this account.")
-                        return render(request, "employe/login.html", {"title": "Login", "messages": messages.get_messages(request)})
-                    
-                    auth_login(request, user)
-                    return HttpResponseRedirect(reverse("employe:details"))
-                except Employe.DoesNotExist:
+                if user.login_profile_id is None:
                     messages.error(request, "Employee profile not found.")
                     return render(request, "employe/login.html", {"title": "Login", "messages": messages.get_messages(request)})
+                if user.login_profile_id != employe_id:
+                    messages.error(request, "Invalid Employee ID for this account.")
+                    return render(request, "employe/login.html", {"title": "Login", "messages": messages.get_messages(request)})
+
+                auth_login(request, user)
+                return HttpResponseRedirect(reverse("employe:details"))
             else:
                 messages.error(request, "Invalid credentials, please check your email and password.")
                 return render(request, "employe/login.html", {"title": "Login", "messages": messages.get_messages(request)})
@@ -307,14 +296,12 @@ def cancel_leave(request, id):
         messages.error(request, "Leave request not found or access denied.")
         return redirect(reverse('employe:leavelist'))
 
-    if leave_request.status != 'Pending':
-        messages.error(request, f"Cannot cancel a leave request that is already {leave_request.status}.")
-        return redirect(reverse('employe:leavelist'))
-
-    leave_request.status = 'Cancelled'
-    leave_request.is_cancelled = True
-    leave_request.cancellation_date = timezone.now().date()
-    leave_request.save()
+    try:
+        leave_request = LeaveApprovalService(request.user).cancel(
+            leave_request, expected_version=requested_leave_version(request)
+        )
+    except LeaveActionConflict as e:
+        return leave_conflict_response(request, e, reverse('employe:leavelist'))
 
     # Send notifications
     try:
@@ -355,14 +342,13 @@ def get_time_or_none(value):
 @login_required(login_url='/login')
 @allow_employee
 def edit_employe(request, id):
-    employe = get_object_or_404(Employe, id=id)
+    aggregate = ProfileAggregate.load(Employe, EMPLOYE_SECTIONS, id=id)
+    employe = aggregate.profile
     user = employe.user
-    contact, _ = EmergencyContact.objects.get_or_create(employe=employe)
-    address, _ = Address.objects.get_or_create(employe=employe)
-    background, _ = Background.objects.get_or_create(employe=employe)
-    benefits, _ = Benefits.objects.get_or_create(employe=employe)
-    identification, _ = Identification.objects.get_or_create(employe=employe)
-    schedule, _ = WorkSchedule.objects.get_or_create(employe=employe)
+    # Sections the employee has not filled in yet are created when the form is saved
+    sections = aggregate.sections(editable=True)
+    contact, address, background = sections['contact'], sections['address'], sections['background']
+    benefits, identification, schedule = sections['benefits'], sections['identification'], sections['schedule']
 
     if request.method == 'POST':
         # User details
@@ -445,12 +431,7 @@ def edit_employe(request, id):
     context = {
         'employe': employe,
         'user': user,
-        'contact': contact,
-        'address': address,
-        'background': background,
-        'benefits': benefits,
-        'identification': identification,
-        'schedule': schedule,
+        **sections,
     }
 
     return render(request, "employe/edit_employe.html", context=context)
@@ -458,56 +439,47 @@ def edit_employe(request, id):
 User = get_user_model()
 
 
-def forget_password(request):
+async def forget_password(request):
     if request.method == "POST":
         email = request.POST.get("email")
+        user = await User.objects.filter(email=email).afirst()
         
-        if User.objects.filter(email=email).exists():
-            user = User.objects.get(email=email)
-            
-            # Rate limiting: Max 3 OTPs per hour
-            one_hour_ago = timezone.now() - timedelta(hours=1)
-            otp_count = OTP.objects.filter(user=user, created_at__gte=one_hour_ago).count()
-            
-            if otp_count >= 3:
+        if user is not None:
+            try:
+                otp = await sync_to_async(issue_otp)(user)
+            except OTPRateLimitExceeded:
                 context = {
                     "title": "Forget Password",
                     "message": "Maximum OTP limit reached (3 per hour). Please try again later.",
                 }
-                return render(request, "employe/forget_password.html", context)
-            
-            otp = secrets.randbelow(899999) + 100000
-            expires_at = timezone.now() + timedelta(minutes=5)
-            
-            OTP.objects.create(user=user, otp=otp, expires_at=expires_at)
+                return await sync_to_async(render)(request, "employe/forget_password.html", context)
             
-            request.session['reset_user_email'] = email
+            await sync_to_async(request.session.__setitem__)('reset_user_email', email)
             
             try:
-                send_mail(
+                await asend_mail(EmailMessage(
                     'Reset Password OTP',
                     f'Your OTP for resetting the password is {otp}. This OTP is valid for 5 minutes.',
                     settings.EMAIL_HOST_USER,
                     [email],
-                    fail_silently=False,
-                )
+                ))
                 return HttpResponseRedirect(reverse('employe:reset_password'))
             except Exception as e:
                 context = {
                     "title": "Forget Password",
                     "message": f"Failed to send OTP. Error: {str(e)}",
                 }
-                return render(request, "employe/forget_password.html", context)
+                return await sync_to_async(render)(request, "employe/forget_password.html", context)
         
         else:
             context = {
                 "title": "Forget Password",
                 "message": "Invalid email address",
             }
-            return render(request, "employe/forget_password.html", context)
+            return await sync_to_async(render)(request, "employe/forget_password.html", context)
     
     context = {"title": "Forget Password"}
-    return render(request, "employe/forget_password.html", context)
+    return await sync_to_async(render)(request, "employe/forget_password.html", context)
 
 
 def resend_otp(request):
@@ -519,18 +491,11 @@ def resend_otp(request):
     try:
         user = User.objects.get(email=email)
         
-        # Rate limiting: Max 3 OTPs per hour
-        one_hour_ago = timezone.now() - timedelta(hours=1)
-        otp_count = OTP.objects.filter(user=user, created_at__gte=one_hour_ago).count()
-        
-        if otp_count >= 3:
+        try:
+            otp = issue_otp(user)
+        except OTPRateLimitExceeded:
             messages.error(request, "Maximum OTP limit reached (3 per hour). Please try again later.")
             return redirect('employe:reset_password')
-
-        otp = secrets.randbelow(899999) + 100000
-        expires_at = timezone.now() + timedelta(minutes=5)
-        
-        OTP.objects.create(user=user, otp=otp, expires_at=expires_at)
         
         try:
             send_mail(
@@ -566,12 +531,12 @@ def reset_password(request):
         try:
             user = User.objects.get(email=email)
             
-            otp_obj = OTP.objects.filter(user=user, otp=otp).first()
-            if not otp_obj:
+            otp_status = check_otp(user, otp)
+            if otp_status == OTP_INVALID:
                 messages.error(request, "Invalid OTP.")
                 return render(request, "employe/reset_password.html", context)
 
-            if otp_obj.is_expired():
+            if otp_status == OTP_EXPIRED:
                 messages.error(request, "OTP has expired.")
                 return render(request, "employe/reset_password.html", context)
             
@@ -588,7 +553,7 @@ def reset_password(request):
             user.set_password(new_password)
             user.save()
             
-            otp_obj.delete()
+            consume_otp(user)
             
             messages.success(request, "Password reset successfully. Please login.")
             return redirect('employe:login')
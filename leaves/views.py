@@ -7,6 +7,8 @@ from django.views.decorators.http import require_POST
 from employe.models import Employe, LeaveRequest
 from .forms import LeaveRequestForm
 from managers.models import Manager, Founder
+from common.exceptions import LeaveActionConflict
+from common.services import LeaveApprovalService
 
 @login_required
 def apply_leave(request):
@@ -34,8 +36,7 @@ def apply_leave(request):
                 return render(request, 'leaves/apply_leave.html', {'form': form})
 
             leave.leave_duration = (leave.end_date - leave.start_date).days + 1
-            leave.status = 'Pending'
-            leave.save()
+            LeaveApprovalService(request.user).submit(leave)
 
             # Send email notification based on the user's role
             from managers.views import send_leave_notification
@@ -87,14 +88,14 @@ def update_leave_status(request, pk, status):
     
     # 2. Update status
     if status in ['approved', 'rejected']:
-        leave.status = status.capitalize()
-        if status == 'approved':
-            leave.is_approved = True
-            leave.approval_date = timezone.now()
-        elif status == 'rejected':
-            leave.is_rejected = True
-            leave.rejection_date = timezone.now()
-        leave.save()
+        service = LeaveApprovalService(request.user)
+        try:
+            if status == 'approved':
+                leave = service.approve(leave)
+            else:
+                leave = service.reject(leave)
+        except LeaveActionConflict as e:
+            return JsonResponse({'error': str(e)}, status=409)
 
         # 3. Email employee
         try:
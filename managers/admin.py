@@ -1,7 +1,8 @@
 from django.contrib import admin
-from .models import Manager, Founder
+from .models import Manager, Founder, ManagerLeaveRequestArchive, UnifiedLeaveRequest
 from .forms import ManagerAdminForm, FounderAdminForm
 from users.models import User
+from employe.admin import leave_action
 
 class ManagerAdmin(admin.ModelAdmin):
     form = ManagerAdminForm
@@ -63,5 +64,26 @@ class FounderAdmin(admin.ModelAdmin):
         
         super().save_model(request, obj, form, change)
 
+class UnifiedLeaveRequestAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'requested_by_role', 'manager', 'employee', 'leave_type', 'start_date', 'end_date', 'status')
+    list_filter = ('requested_by_role', 'is_approved', 'is_rejected', 'leave_type')
+    search_fields = ('manager__user__email', 'employee__user__email', 'subject')
+    list_select_related = ('manager__user', 'employee__user')
+    actions = [leave_action('approve'), leave_action('reject')]
+
+class ManagerLeaveRequestArchiveAdmin(admin.ModelAdmin):
+    """Read-only view of the deprecated manager leave table"""
+    list_display = ('subject', 'manager', 'leave_type', 'start_date', 'end_date', 'is_approved', 'is_rejected', 'is_cancelled')
+    search_fields = ('manager__user__email', 'subject')
+    list_select_related = ('manager__user',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 admin.site.register(Manager, ManagerAdmin)
-admin.site.register(Founder, FounderAdmin)
\ No newline at end of file
+admin.site.register(Founder, FounderAdmin)
+admin.site.register(UnifiedLeaveRequest, UnifiedLeaveRequestAdmin)
+admin.site.register(ManagerLeaveRequestArchive, ManagerLeaveRequestArchiveAdmin)
\ No newline at end of file
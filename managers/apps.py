@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ManagersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'managers'
+
+    def ready(self):
+        # Registers the signal receivers that evict cached calendar feeds,
+        # log deleted leave requests and queue thumbnails of new profile photos
+        from . import ics_feeds, leave_events, thumbnails  # noqa: F401
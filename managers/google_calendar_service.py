@@ -1,69 +1,150 @@
+"""
+Google Calendar integration for approved leaves.
+
+Approving a leave queues one Celery task once the transaction commits. The
+task builds one event per leave and inserts it into the manager's and every
+founder's calendar through the Calendar API's batch endpoint, up to 50
+inserts per HTTP request. Inserts that fail with a rate limit or server
+error are retried by the task; the rest are only logged.
+
+With GOOGLE_CALENDAR_TEAM_CALENDAR_ID set, a single shared "Team Leave"
+calendar is kept instead: every leave owns one event there, with an id
+derived from the leave id. The event is upserted when the leave is approved
+and deleted when it is rejected or cancelled, so each transition costs one
+API call no matter how many founders there are.
+
+Credentials are read from token.json once per process and the API client is
+built once per thread, instead of on every call.
+"""
 import os
-import json
+import threading
 from datetime import datetime, timedelta
 from django.conf import settings
+from django.db import transaction
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import BatchHttpRequest
 import logging
 
+from .models import Founder, UnifiedLeaveRequest
+
 logger = logging.getLogger(__name__)
 
 # If modifying these scopes, delete the file token.json.
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
+# The Calendar API accepts at most 50 calls in one batch request
+CALENDAR_BATCH_SIZE = 50
+
+# Rate limits and server errors are worth retrying; other errors are not
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+_credentials = None
+_credentials_lock = threading.Lock()
+# httplib2 connections are not thread-safe, so each thread gets its own client
+_clients = threading.local()
+
+
+def load_credentials(interactive=False):
+    """
+    OAuth credentials shared by the whole process, read from token.json on
+    first use and refreshed when expired. Only `interactive` callers (the
+    setup_google_calendar command) may open the browser consent flow.
+    """
+    global _credentials
+
+    with _credentials_lock:
+        creds = _credentials
+        # The token.json stores the user's access and refresh tokens.
+        if creds is None and os.path.exists(settings.GOOGLE_CALENDAR_TOKEN_FILE):
+            creds = Credentials.from_authorized_user_file(settings.GOOGLE_CALENDAR_TOKEN_FILE, SCOPES)
+
+        if creds and not creds.valid and creds.expired and creds.refresh_token:
+            try:
+                creds.refresh(Request())
+                _save_token(creds)
+            except Exception as e:
+                logger.error(f"Error refreshing credentials: {e}")
+                # If refresh fails, we need to re-authenticate
+                creds = None
+
+        if not creds or not creds.valid:
+            if not interactive:
+                raise FileNotFoundError(
+                    f"No valid Google Calendar token at {settings.GOOGLE_CALENDAR_TOKEN_FILE}. "
+                    "Run `python manage.py setup_google_calendar`."
+                )
+            if not os.path.exists(settings.GOOGLE_CALENDAR_CREDENTIALS_FILE):
+                raise FileNotFoundError(f"Credentials file not found: {settings.GOOGLE_CALENDAR_CREDENTIALS_FILE}")
+
+            flow = InstalledAppFlow.from_client_secrets_file(settings.GOOGLE_CALENDAR_CREDENTIALS_FILE, SCOPES)
+            creds = flow.run_local_server(port=0)
+            _save_token(creds)
+
+        _credentials = creds
+        return creds
+
+
+def _save_token(creds):
+    # Save the credentials for the next run
+    with open(settings.GOOGLE_CALENDAR_TOKEN_FILE, 'w') as token:
+        token.write(creds.to_json())
+
+
+def calendar_client(interactive=False):
+    """Calendar API client for this thread, built once over the shared credentials"""
+    service = getattr(_clients, 'service', None)
+    if service is None:
+        client_options = None
+        if settings.GOOGLE_CALENDAR_API_ENDPOINT:
+            client_options = {'api_endpoint': settings.GOOGLE_CALENDAR_API_ENDPOINT}
+        service = build(
+            'calendar', 'v3', credentials=load_credentials(interactive),
+            client_options=client_options, cache_discovery=False,
+        )
+        _clients.service = service
+    return service
+
+
+def calendar_batch_uri():
+    """Batch endpoint matching the API endpoint the client talks to"""
+    root = settings.GOOGLE_CALENDAR_API_ENDPOINT or 'https://www.googleapis.com/'
+    return f"{root.rstrip('/')}/batch/calendar/v3"
+
+
+def is_retryable(error):
+    return isinstance(error, HttpError) and error.resp.status in RETRYABLE_STATUSES
+
+
+def http_status(error):
+    return error.resp.status if isinstance(error, HttpError) else None
+
+
+def team_event_id(leave_id):
+    """Stable Team Leave event id; Calendar ids may only use the characters a-v and 0-9"""
+    return f"leave{leave_id}"
+
+
 class GoogleCalendarService:
     def __init__(self):
         self.service = None
-        self.credentials_file = os.path.join(settings.BASE_DIR, 'credentials.json')
-        self.token_file = os.path.join(settings.BASE_DIR, 'token.json')
-        
-    def authenticate(self):
+
+    def authenticate(self, interactive=False):
         """Authenticate and return Google Calendar service."""
-        creds = None
-        
-        # The file token.json stores the user's access and refresh tokens.
-        if os.path.exists(self.token_file):
-            creds = Credentials.from_authorized_user_file(self.token_file, SCOPES)
-        
-        # If there are no (valid) credentials available, let the user log in.
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                try:
-                    creds.refresh(Request())
-                except Exception as e:
-                    logger.error(f"Error refreshing credentials: {e}")
-                    # If refresh fails, we need to re-authenticate
-                    creds = None
-            
-            if not creds:
-                if not os.path.exists(self.credentials_file):
-                    raise FileNotFoundError(f"Credentials file not found: {self.credentials_file}")
-                
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    self.credentials_file, SCOPES)
-                creds = flow.run_local_server(port=0)
-            
-            # Save the credentials for the next run
-            with open(self.token_file, 'w') as token:
-                token.write(creds.to_json())
-        
-        self.service = build('calendar', 'v3', credentials=creds)
+        self.service = calendar_client(interactive)
         return self.service
-    
+
     def create_leave_event(self, employee_name, employee_email, leave_subject, start_date, end_date, leave_type):
         """Create a calendar event for the leave request."""
-        if not self.service:
-            self.authenticate()
-        
         # Convert dates to datetime objects if they're not already
         if isinstance(start_date, str):
             start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
         if isinstance(end_date, str):
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-        
+
         # Create event details
         event_summary = f"{employee_name} - {leave_subject}"
         event_description = f"""
@@ -74,7 +155,7 @@ Duration: {start_date} to {end_date}
 
 This leave has been approved and added to the calendar automatically.
         """.strip()
-        
+
         # For all-day events, we use date format
         event = {
             'summary': event_summary,
@@ -98,84 +179,250 @@ This leave has been approved and added to the calendar automatically.
                 ],
             },
         }
-        
+
         return event
-    
+
     def add_event_to_calendar(self, calendar_email, event):
         """Add an event to a specific calendar."""
+        created_event, error = self.insert_events([(calendar_email, event)])[0]
+        if error is not None:
+            return None
+        return created_event
+
+    def execute_batched(self, requests):
+        """
+        Execute API requests in batch requests of up to 50. Returns a
+        (response, error) pair for every request, in order.
+        """
         if not self.service:
             self.authenticate()
-        
-        try:
-            # First, try to find the calendar by email
-            calendar_id = self.get_calendar_id_by_email(calendar_email)
-            if not calendar_id:
-                logger.warning(f"Calendar not found for email: {calendar_email}")
-                return None
-            
-            created_event = self.service.events().insert(
-                calendarId=calendar_id,
-                body=event
-            ).execute()
-            
-            logger.info(f"Event created successfully in {calendar_email}'s calendar: {created_event.get('htmlLink')}")
-            return created_event
-            
-        except HttpError as error:
-            logger.error(f"An error occurred while adding event to {calendar_email}: {error}")
-            return None
-    
-    def get_calendar_id_by_email(self, email):
-        """Get calendar ID by email address."""
+
+        results = [(None, None)] * len(requests)
+
+        def collect(request_id, response, exception):
+            results[int(request_id)] = (response, exception)
+
+        for start in range(0, len(requests), CALENDAR_BATCH_SIZE):
+            batch = BatchHttpRequest(callback=collect, batch_uri=calendar_batch_uri())
+            for index in range(start, min(start + CALENDAR_BATCH_SIZE, len(requests))):
+                batch.add(requests[index], request_id=str(index))
+            batch.execute()
+
+        return results
+
+    def insert_events(self, inserts):
+        """
+        Insert (calendar_email, event) pairs in batches. Gmail addresses are
+        used directly as calendar ids. Returns a (created_event, error) pair
+        for every insert, in order.
+        """
         if not self.service:
             self.authenticate()
-        
-        try:
-            # For primary calendar, use 'primary' or the email address
-            if email:
-                return email  # Gmail addresses can be used directly as calendar IDs
-            return 'primary'
-            
-        except HttpError as error:
-            logger.error(f"Error getting calendar ID for {email}: {error}")
-            return None
-    
-    def add_leave_to_calendars(self, employee_name, employee_email, leave_subject, start_date, end_date, leave_type, manager_email, founder_emails):
-        """Add leave event to manager's and all founders' calendars."""
+
+        results = self.execute_batched([
+            self.service.events().insert(calendarId=calendar_email, body=event)
+            for calendar_email, event in inserts
+        ])
+        for (calendar_email, _), (response, error) in zip(inserts, results):
+            if error is not None:
+                logger.error(f"An error occurred while adding event to {calendar_email}: {error}")
+            else:
+                logger.info(f"Event created successfully in {calendar_email}'s calendar: {response.get('htmlLink')}")
+        return results
+
+    def upsert_events(self, calendar_id, events):
+        """
+        Create or replace events that carry their own `id`. Inserts run first,
+        and the ones refused because the id exists (409, which also covers
+        previously deleted events) are sent again as updates. Returns an
+        error or None for every event, in order.
+        """
+        if not self.service:
+            self.authenticate()
+
+        errors = [error for _, error in self.execute_batched([
+            self.service.events().insert(calendarId=calendar_id, body=event) for event in events
+        ])]
+        existing = [index for index, error in enumerate(errors) if http_status(error) == 409]
+        if existing:
+            updated = self.execute_batched([
+                self.service.events().update(
+                    calendarId=calendar_id, eventId=events[index]['id'],
+                    body={**events[index], 'status': 'confirmed'},
+                )
+                for index in existing
+            ])
+            for index, (_, error) in zip(existing, updated):
+                errors[index] = error
+        return errors
+
+    def delete_events(self, calendar_id, event_ids):
+        """Delete events by id; already missing events count as deleted. Returns an error or None per id."""
         if not self.service:
             self.authenticate()
-        
+
+        results = self.execute_batched([
+            self.service.events().delete(calendarId=calendar_id, eventId=event_id, sendUpdates='none')
+            for event_id in event_ids
+        ])
+        return [None if http_status(error) in (404, 410) else error for _, error in results]
+
+    def add_leave_to_calendars(self, employee_name, employee_email, leave_subject, start_date, end_date, leave_type, manager_email, founder_emails):
+        """Add leave event to manager's and all founders' calendars."""
         # Create the event
         event = self.create_leave_event(
-            employee_name, employee_email, leave_subject, 
+            employee_name, employee_email, leave_subject,
             start_date, end_date, leave_type
         )
-        
-        results = []
-        
-        # Add to manager's calendar
+
+        recipients = []
         if manager_email:
-            manager_result = self.add_event_to_calendar(manager_email, event)
-            results.append({
-                'email': manager_email,
-                'type': 'manager',
-                'success': manager_result is not None,
-                'event': manager_result
-            })
-        
-        # Add to all founders' calendars
-        for founder_email in founder_emails:
-            if founder_email:
-                founder_result = self.add_event_to_calendar(founder_email, event)
-                results.append({
-                    'email': founder_email,
-                    'type': 'founder',
-                    'success': founder_result is not None,
-                    'event': founder_result
-                })
-        
-        return results
+            recipients.append((manager_email, 'manager'))
+        recipients += [(founder_email, 'founder') for founder_email in founder_emails if founder_email]
+
+        inserted = self.insert_events([(email, event) for email, _ in recipients])
+        return [
+            {
+                'email': email,
+                'type': recipient_type,
+                'success': error is None,
+                'event': created_event,
+                'retryable': is_retryable(error),
+            }
+            for (email, recipient_type), (created_event, error) in zip(recipients, inserted)
+        ]
+
 
 def get_google_calendar_service():
     """Factory function to get Google Calendar service instance."""
     return GoogleCalendarService()
+
+
+def queue_calendar_sync(events):
+    """Queue the calendar task for the leaves the events concern once the transaction commits"""
+    if not settings.GOOGLE_CALENDAR_ENABLED:
+        return
+
+    if settings.GOOGLE_CALENDAR_TEAM_CALENDAR_ID:
+        # Rejecting, cancelling or deleting refunds days only if the leave was
+        # approved, and only those leaves have a Team Leave event to remove
+        leave_ids = [
+            event.leave_id for event in events
+            if event.event_type == 'approved'
+            or (event.event_type in ('rejected', 'cancelled', 'deleted') and event.days < 0)
+        ]
+    else:
+        # Per-recipient events are only ever added
+        leave_ids = [event.leave_id for event in events if event.event_type == 'approved']
+    leave_ids = list(dict.fromkeys(leave_ids))
+    if not leave_ids:
+        return
+
+    def enqueue():
+        from .tasks import add_leaves_to_google_calendars, sync_team_leave_calendar
+
+        try:
+            if settings.GOOGLE_CALENDAR_TEAM_CALENDAR_ID:
+                sync_team_leave_calendar.delay(leave_ids)
+            else:
+                add_leaves_to_google_calendars.delay(leave_ids)
+        except Exception as e:
+            logger.error(f"Failed to queue Google Calendar sync: {e}")
+
+    transaction.on_commit(enqueue)
+
+
+def leave_calendar_event(calendar_service, leave):
+    user = leave.requester.user
+    return calendar_service.create_leave_event(
+        user.get_full_name(), user.email, leave.subject,
+        leave.start_date, leave.end_date, leave.get_leave_type_display(),
+    )
+
+
+def sync_team_calendar(leave_ids):
+    """
+    Bring the Team Leave calendar in line with the current state of the
+    leaves: approved leaves get their event created or replaced, every other
+    leave (rejected, cancelled or deleted) has it removed. Returns (stats,
+    leave ids worth retrying).
+    """
+    calendar_id = settings.GOOGLE_CALENDAR_TEAM_CALENDAR_ID
+    approved = UnifiedLeaveRequest.objects.filter(
+        pk__in=leave_ids, status='Approved'
+    ).select_related('employee__user', 'manager__user')
+
+    calendar_service = get_google_calendar_service()
+    upserts, events = [], []
+    for leave in approved:
+        if leave.requester is None:
+            continue
+        event = leave_calendar_event(calendar_service, leave)
+        # Shared calendar: no invitations or reminders for everyone subscribed
+        event.pop('attendees')
+        event['reminders'] = {'useDefault': False}
+        event['id'] = team_event_id(leave.pk)
+        upserts.append(leave.pk)
+        events.append(event)
+    removals = [leave_id for leave_id in dict.fromkeys(leave_ids) if leave_id not in upserts]
+
+    stats = {'upserted': 0, 'deleted': 0, 'failed': 0}
+    retry = []
+    results = []
+    if events:
+        results += zip(upserts, calendar_service.upsert_events(calendar_id, events), ['upserted'] * len(upserts))
+    if removals:
+        deleted = calendar_service.delete_events(calendar_id, [team_event_id(leave_id) for leave_id in removals])
+        results += zip(removals, deleted, ['deleted'] * len(removals))
+
+    for leave_id, error, outcome in results:
+        if error is None:
+            stats[outcome] += 1
+            continue
+        logger.error(f"Failed to update Team Leave event for leave {leave_id}: {error}")
+        stats['failed'] += 1
+        if is_retryable(error):
+            retry.append(leave_id)
+    return stats, retry
+
+
+def add_leaves_to_calendars(leave_ids, only=None):
+    """
+    Add approved leaves to the calendars of the requester's manager and of
+    every founder, all in shared batch requests. `only` limits the inserts to
+    [leave_id, calendar_email] pairs left over from an earlier attempt.
+    Returns (stats, [leave_id, calendar_email] pairs worth retrying).
+    """
+    leaves = UnifiedLeaveRequest.objects.filter(
+        pk__in=leave_ids, status='Approved'
+    ).select_related('employee__user', 'employee__manager__user', 'manager__user')
+    founder_emails = [email for email in Founder.objects.values_list('user__email', flat=True) if email]
+    wanted = {tuple(pair) for pair in only} if only is not None else None
+
+    calendar_service = get_google_calendar_service()
+    inserts, targets = [], []
+    for leave in leaves:
+        if leave.requester is None:
+            continue
+        event = leave_calendar_event(calendar_service, leave)
+        emails = list(founder_emails)
+        if leave.requested_by_role == 'employee' and leave.employee.manager_id:
+            emails.insert(0, leave.employee.manager.user.email)
+        for email in dict.fromkeys(emails):
+            if wanted is None or (leave.pk, email) in wanted:
+                inserts.append((email, event))
+                targets.append([leave.pk, email])
+
+    stats = {'inserted': 0, 'failed': 0}
+    retry = []
+    if not inserts:
+        return stats, retry
+
+    for target, (_, error) in zip(targets, calendar_service.insert_events(inserts)):
+        if error is None:
+            stats['inserted'] += 1
+        else:
+            stats['failed'] += 1
+            if is_retryable(error):
+                retry.append(target)
+    return stats, retry
@@ -0,0 +1,259 @@
+"""
+iCalendar (webcal://) subscription feeds of approved leaves.
+
+There are three feed scopes: a person's own leaves, a manager's team and the
+whole company. A feed URL carries a token bound to the subscriber, the scope
+and the subscriber's password hash, so calendar apps can poll it without a
+session and a password change revokes every URL handed out before.
+
+Each scope's feed is generated once from the database and cached. Leave
+changes evict the feeds they appear in, and the ETag/Last-Modified of the
+cached copy answer conditional GETs, so polling an unchanged feed costs a
+cache read.
+"""
+import hashlib
+import logging
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from employe.models import Employe
+from .models import Founder, Manager, UnifiedLeaveRequest
+
+logger = logging.getLogger(__name__)
+
+# Feed scopes: a person's own leaves, a manager's team, everyone
+FEED_SCOPES = ('person', 'team', 'company')
+
+# Approved leaves that ended longer ago than this are left out of the feeds
+FEED_PAST_DAYS = 365
+
+# Cached feeds are also dropped after this long, covering renamed users
+FEED_CACHE_SECONDS = 6 * 60 * 60
+
+# Rows fetched per round trip while generating a feed
+FEED_CHUNK_SIZE = 1000
+
+_TOKEN_SALT = 'managers.ics_feeds'
+
+
+def feed_token(user, scope):
+    """URL token letting calendar apps read `scope` as `user`"""
+    digest = salted_hmac(_TOKEN_SALT, f"{user.pk}:{scope}:{user.password}").hexdigest()[:32]
+    return f"{user.pk}-{scope}-{digest}"
+
+
+def feed_user(token):
+    """(user, scope) the token was issued for, or (None, None) if it is invalid or revoked"""
+    from users.models import User
+
+    try:
+        user_id, scope, digest = token.split('-')
+        user = User.objects.get(pk=int(user_id), is_active=True)
+    except (ValueError, User.DoesNotExist):
+        return None, None
+    if scope not in FEED_SCOPES or not constant_time_compare(feed_token(user, scope), token):
+        return None, None
+    return user, scope
+
+
+def feed_key(user, scope):
+    """Cache key part of the feed `user` may read, or None if the scope is not theirs"""
+    if scope == 'person':
+        return str(user.pk)
+    if scope == 'team':
+        manager_id = Manager.objects.filter(user=user).values_list('pk', flat=True).first()
+        return str(manager_id) if manager_id else None
+    if scope == 'company' and Founder.objects.filter(user=user).exists():
+        return 'all'
+    return None
+
+
+def feed_scopes(user):
+    """Feed scopes offered to the user"""
+    if Founder.objects.filter(user=user).exists():
+        return ['company']
+    if Manager.objects.filter(user=user).exists():
+        return ['person', 'team']
+    return ['person']
+
+
+def calendar_feed_links(request, user):
+    """[{'scope', 'label', 'url'}] webcal:// subscription links for the user"""
+    labels = {'person': 'My leave', 'team': 'My team', 'company': 'Company leave'}
+    links = []
+    for scope in feed_scopes(user):
+        url = request.build_absolute_uri(reverse('managers:calendar_feed', args=[feed_token(user, scope)]))
+        links.append({'scope': scope, 'label': labels[scope], 'url': 'webcal' + url[url.index(':'):]})
+    return links
+
+
+def _cache_key(scope, key):
+    return f"leave-feed:{scope}:{key}"
+
+
+def _scope_leaves(scope, key):
+    leaves = UnifiedLeaveRequest.objects.filter(
+        status='Approved',
+        end_date__gte=timezone.now().date() - timedelta(days=FEED_PAST_DAYS),
+    )
+    if scope == 'person':
+        leaves = leaves.filter(requester_user_id=key)
+    elif scope == 'team':
+        team = Employe.objects.filter(manager_id=key).values('user')
+        leaves = leaves.filter(Q(requester_user__in=team) | Q(manager_id=key))
+    return leaves
+
+
+def _scope_name(scope, key):
+    if scope == 'company':
+        return 'Company Leave'
+    if scope == 'team':
+        manager = Manager.objects.select_related('user').get(pk=key)
+        return f"{manager.user.get_full_name()}'s Team Leave"
+    from users.models import User
+    return f"{User.objects.get(pk=key).get_full_name()} Leave"
+
+
+def _escape(text):
+    return (str(text).replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _fold(line):
+    """Content line folded at 75 octets, as RFC 5545 requires, without splitting a character"""
+    data = line.encode()
+    parts, start, limit = [], 0, 75
+    while len(data) - start > limit:
+        end = start + limit
+        while data[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(data[start:end].decode())
+        start, limit = end, 74
+    parts.append(data[start:].decode())
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def generate_feed(scope, key):
+    """Yield the feed's iCalendar text, reading its leaves from the database in chunks"""
+    leave_types = dict(UnifiedLeaveRequest._meta.get_field('leave_type').choices)
+    uid_domain = settings.LEAVE_FEED_UID_DOMAIN
+
+    yield ''.join(_fold(line) for line in (
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Leave Management System//EN',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{_escape(_scope_name(scope, key))}',
+        'REFRESH-INTERVAL;VALUE=DURATION:PT1H',
+        'X-PUBLISHED-TTL:PT1H',
+    ))
+    rows = _scope_leaves(scope, key).order_by('start_date', 'pk').values_list(
+        'pk', 'requester_user__first_name', 'requester_user__last_name', 'leave_type',
+        'subject', 'start_date', 'end_date', 'updated_datetime', 'version',
+    )
+    for pk, first_name, last_name, leave_type, subject, start_date, end_date, updated, version in rows.iterator(
+        chunk_size=FEED_CHUNK_SIZE
+    ):
+        name = f"{first_name} {last_name}".strip()
+        stamp = (updated or timezone.now()).astimezone(dt_timezone.utc)
+        yield ''.join(_fold(line) for line in (
+            'BEGIN:VEVENT',
+            f'UID:leave-{pk}@{uid_domain}',
+            f'DTSTAMP:{stamp:%Y%m%dT%H%M%SZ}',
+            f'DTSTART;VALUE=DATE:{start_date:%Y%m%d}',
+            # All-day events end on the day after the last day of leave
+            f'DTEND;VALUE=DATE:{end_date + timedelta(days=1):%Y%m%d}',
+            f'SEQUENCE:{version}',
+            f'SUMMARY:{_escape(f"{name} - {leave_types.get(leave_type, leave_type)}")}',
+            f'DESCRIPTION:{_escape(subject)}',
+            'STATUS:CONFIRMED',
+            'TRANSP:TRANSPARENT',
+            'END:VEVENT',
+        ))
+    yield 'END:VCALENDAR\r\n'
+
+
+def cached_feed(scope, key):
+    """The feed as {'body', 'etag', 'last_modified'}, generated on a cache miss"""
+    feed = cache.get(_cache_key(scope, key))
+    if feed is None:
+        body = ''.join(generate_feed(scope, key)).encode()
+        feed = {
+            'body': body,
+            'etag': f'"{hashlib.md5(body).hexdigest()}"',
+            'last_modified': timezone.now().replace(microsecond=0),
+        }
+        cache.set(_cache_key(scope, key), feed, FEED_CACHE_SECONDS)
+    return feed
+
+
+def _feed_cache_keys(requester_user_id, team_manager_id):
+    keys = [_cache_key('company', 'all')]
+    if requester_user_id:
+        keys.append(_cache_key('person', requester_user_id))
+    if team_manager_id:
+        keys.append(_cache_key('team', team_manager_id))
+    return keys
+
+
+def _evict(keys):
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_leave_feeds(events):
+    """Evict the cached feeds showing the leaves of recorded LeaveEvents, once the transaction commits"""
+    leave_ids = {event.leave_id for event in events}
+    keys = set()
+    for user_id, team_manager_id, manager_id in UnifiedLeaveRequest.objects.filter(
+        pk__in=leave_ids
+    ).values_list('requester_user_id', 'employee__manager_id', 'manager_id'):
+        keys.update(_feed_cache_keys(user_id, team_manager_id or manager_id))
+    if keys:
+        _evict(list(keys))
+
+
+@receiver(post_save, sender='managers.UnifiedLeaveRequest')
+@receiver(post_save, sender='employe.LeaveRequest')
+@receiver(post_save, sender='managers.ManagerLeaveRequest')
+@receiver(post_delete, sender='managers.UnifiedLeaveRequest')
+@receiver(post_delete, sender='employe.LeaveRequest')
+@receiver(post_delete, sender='managers.ManagerLeaveRequest')
+def leave_request_changed(sender, instance, **kwargs):
+    # Covers edits and deletions that do not go through the leave event log
+    if instance.requested_by_role == 'employee':
+        team_manager_id = Employe.objects.filter(pk=instance.employee_id).values_list('manager_id', flat=True).first()
+    else:
+        team_manager_id = instance.manager_id
+    _evict(_feed_cache_keys(instance.requester_user_id, team_manager_id))
+
+
+@receiver(pre_save, sender='employe.Employe')
+def remember_team_manager(sender, instance, update_fields=None, **kwargs):
+    if instance._state.adding or (update_fields is not None and 'manager' not in update_fields):
+        return
+    instance._stored_manager_id = (
+        Employe.objects.filter(pk=instance.pk).values_list('manager_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender='employe.Employe')
+def employee_team_changed(sender, instance, created, **kwargs):
+    # A new employee has no approved leaves yet; a moved one leaves one team feed for another
+    if created or '_stored_manager_id' not in instance.__dict__:
+        return
+    old_manager_id = instance.__dict__.pop('_stored_manager_id')
+    if old_manager_id != instance.manager_id:
+        _evict([
+            _cache_key('team', manager_id)
+            for manager_id in (old_manager_id, instance.manager_id) if manager_id
+        ])
@@ -0,0 +1,343 @@
+"""
+Append-only leave event log and the projections folded from it.
+
+Every leave state transition writes LeaveEvent rows in the same transaction
+as the transition, and the projection updaters apply those events to:
+- LeaveBalanceProjection: days taken and pending requests per person and year
+- AbsenceRosterEntry: who is away on which working day
+
+Deleting a leave request appends a compensating 'deleted' event, so the
+projections drop whatever the leave still counted for, and refunds the
+requester's balance columns by the same amount.
+
+rebuild_leave_projections() throws the projections away and replays the
+whole log, which is what the replay_leave_events command runs.
+"""
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Case, QuerySet, IntegerField, Max, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, ExtractYear
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from users.models import User
+from .google_calendar_service import queue_calendar_sync
+from .ics_feeds import invalidate_leave_feeds
+from .live import publish_leave_events
+from .push import queue_leave_pushes
+from .models import AbsenceRosterEntry, LeaveBalanceProjection, LeaveEvent, UnifiedLeaveRequest
+
+logger = logging.getLogger(__name__)
+
+# Events that decide whether a leave is currently approved
+STATE_EVENTS = ('approved', 'rejected', 'cancelled', 'deleted')
+
+# Rows per INSERT/UPDATE when writing events and projections
+PROJECTION_BATCH_SIZE = 5000
+
+
+def transition_events(leave, event_type, previous_status=None, actor=None):
+    """
+    Build (unsaved) events for one transition of a leave request.
+
+    `previous_status` is the status before the transition; approving adds the
+    leave's days, and rejecting, cancelling or deleting an approved leave
+    refunds them.
+    """
+    def event(kind, days=0, carryforward_days=0, pending_delta=0):
+        return LeaveEvent(
+            leave_id=leave.pk,
+            requester_user_id=leave.requester_user_id,
+            role=leave.requested_by_role,
+            event_type=kind,
+            leave_type=leave.leave_type,
+            start_date=leave.start_date,
+            end_date=leave.end_date,
+            days=days,
+            carryforward_days=carryforward_days,
+            pending_delta=pending_delta,
+            actor_id=getattr(actor, 'pk', None),
+        )
+
+    if event_type == 'submitted':
+        return [event('submitted', pending_delta=1)]
+
+    pending_delta = -1 if previous_status == 'Pending' else 0
+    if event_type == 'approved':
+        events = [event('approved', days=leave.leave_duration, pending_delta=pending_delta)]
+        if leave.leave_type == 'AL' and leave.carryforward_used:
+            events.append(event('carryforward_applied', carryforward_days=leave.carryforward_used))
+        return events
+
+    if event_type in ('rejected', 'cancelled', 'deleted'):
+        if previous_status == 'Approved':
+            return [event(
+                event_type,
+                days=-leave.leave_duration,
+                carryforward_days=-leave.carryforward_used if leave.leave_type == 'AL' else 0,
+            )]
+        return [event(event_type, pending_delta=pending_delta)]
+
+    raise ValueError(f"Unknown leave event type: {event_type}")
+
+
+def record_leave_events(events):
+    """
+    Append the events and apply them to the projections, atomically with the
+    caller, and queue their device pushes, calendar entries, feed evictions
+    and live dashboard updates for when the transaction commits.
+    """
+    if not events:
+        return []
+    with transaction.atomic():
+        LeaveEvent.objects.bulk_create(events, batch_size=PROJECTION_BATCH_SIZE)
+        apply_leave_events(events)
+        queue_leave_pushes(events)
+        queue_calendar_sync(events)
+        invalidate_leave_feeds(events)
+        publish_leave_events(events)
+    return events
+
+
+def record_leave_transition(leave, event_type, previous_status=None, actor=None):
+    """Shortcut for recording the events of a single transition"""
+    return record_leave_events(transition_events(leave, event_type, previous_status, actor))
+
+
+@receiver(post_delete, sender='managers.UnifiedLeaveRequest')
+@receiver(post_delete, sender='employe.LeaveRequest')
+@receiver(post_delete, sender='managers.ManagerLeaveRequest')
+def record_leave_deletion(sender, instance, origin=None, **kwargs):
+    # Deleting a user removes their projections along with their leaves;
+    # writing to them now would point at the user being deleted
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if issubclass(origin_model, User):
+        return
+
+    from common.services import LeaveApprovalService
+
+    with transaction.atomic():
+        LeaveApprovalService().refund_deleted(instance)
+        record_leave_transition(instance, 'deleted', previous_status=instance.status)
+
+
+def apply_leave_events(events):
+    """Projection updaters: fold newly written events into the projections"""
+    _apply_balance_events(events)
+    _apply_roster_events(events)
+
+
+def _event_year(event):
+    if event.start_date:
+        return event.start_date.year
+    return event.occurred_at.year
+
+
+def _balance_deltas(event):
+    annual = medical = 0
+    if event.leave_type == 'AL':
+        annual = event.days - event.carryforward_days
+    elif event.leave_type == 'ML':
+        medical = event.days
+    return annual, medical, event.carryforward_days, event.pending_delta
+
+
+def _apply_balance_events(events):
+    deltas = defaultdict(lambda: [0, 0, 0, 0])
+    roles = {}
+    for event in events:
+        key = (event.requester_user_id, _event_year(event))
+        roles[key] = event.role
+        for i, value in enumerate(_balance_deltas(event)):
+            deltas[key][i] += value
+
+    deltas = {key: delta for key, delta in deltas.items() if any(delta) and key[0] is not None}
+    if not deltas:
+        return
+
+    LeaveBalanceProjection.objects.bulk_create(
+        [LeaveBalanceProjection(requester_user_id=user_id, year=year, role=roles[(user_id, year)])
+         for user_id, year in deltas],
+        ignore_conflicts=True,
+    )
+    # Lock in a stable order so concurrent transitions cannot deadlock
+    projections = [
+        projection for projection in LeaveBalanceProjection.objects.select_for_update().filter(
+            requester_user_id__in={user_id for user_id, _ in deltas},
+            year__in={year for _, year in deltas},
+        ).order_by('pk')
+        if (projection.requester_user_id, projection.year) in deltas
+    ]
+    for projection in projections:
+        annual, medical, carryforward, pending = deltas[(projection.requester_user_id, projection.year)]
+        projection.annual_taken += annual
+        projection.medical_taken += medical
+        projection.carryforward_taken += carryforward
+        projection.pending_requests += pending
+    LeaveBalanceProjection.objects.bulk_update(
+        projections,
+        ['annual_taken', 'medical_taken', 'carryforward_taken', 'pending_requests'],
+        batch_size=PROJECTION_BATCH_SIZE,
+    )
+
+
+def _apply_roster_events(events):
+    removed = {event.leave_id for event in events if event.event_type in ('rejected', 'cancelled', 'deleted')}
+    if removed:
+        AbsenceRosterEntry.objects.filter(leave_id__in=removed).delete()
+
+    entries = [
+        entry
+        for event in events if event.event_type == 'approved'
+        for entry in _roster_entries(event.leave_id, event.requester_user_id, event.role,
+                                     event.leave_type, event.start_date, event.end_date)
+    ]
+    if entries:
+        AbsenceRosterEntry.objects.bulk_create(entries, batch_size=PROJECTION_BATCH_SIZE, ignore_conflicts=True)
+
+
+def _roster_entries(leave_id, user_id, role, leave_type, start_date, end_date):
+    """Roster rows for the working days of a leave, matching calculate_working_days()"""
+    if not start_date or not end_date:
+        return
+    current_date = start_date
+    while current_date <= end_date:
+        if current_date.weekday() < 5:
+            yield AbsenceRosterEntry(
+                date=current_date, requester_user_id=user_id, role=role,
+                leave_id=leave_id, leave_type=leave_type,
+            )
+        current_date += timedelta(days=1)
+
+
+def absent_user_ids(date, profiles):
+    """Users among the given employee/manager profiles who are on approved leave on `date`"""
+    return set(
+        AbsenceRosterEntry.objects.filter(
+            date=date, requester_user_id__in=[profile.user_id for profile in profiles]
+        ).values_list('requester_user_id', flat=True)
+    )
+
+
+def _days_of_type(leave_type):
+    return Sum(Case(When(leave_type=leave_type, then='days'), default=Value(0), output_field=IntegerField()))
+
+
+def rebuild_leave_projections(batch_size=PROJECTION_BATCH_SIZE):
+    """
+    Rebuild every projection from scratch by replaying the event log.
+
+    Balances are summed by the database in one grouped query. On PostgreSQL
+    the roster is expanded server-side with generate_series() from the latest
+    state event of each leave, so no event row travels through Python.
+    Events of deleted leave requests or users are kept in the log but
+    skipped here. Returns replay stats.
+    """
+    started = time.monotonic()
+    with transaction.atomic():
+        AbsenceRosterEntry.objects.all().delete()
+        LeaveBalanceProjection.objects.all().delete()
+
+        event_count = LeaveEvent.objects.count()
+        balance_count = _rebuild_balances(batch_size)
+        if connection.vendor == 'postgresql':
+            roster_days = _rebuild_roster_postgres()
+        else:
+            roster_days = _rebuild_roster(batch_size)
+
+    elapsed = time.monotonic() - started
+    stats = {
+        'events': event_count,
+        'balances': balance_count,
+        'roster_days': roster_days,
+        'seconds': round(elapsed, 3),
+        'events_per_second': int(event_count / elapsed) if elapsed else event_count,
+    }
+    logger.info(f"Rebuilt leave projections from {event_count} events in {elapsed:.2f}s")
+    return stats
+
+
+def _rebuild_balances(batch_size):
+    rows = (
+        LeaveEvent.objects
+        .filter(requester_user_id__in=User.objects.values('id'))
+        .annotate(year=Coalesce(ExtractYear('start_date'), ExtractYear('occurred_at')))
+        .values('requester_user_id', 'year')
+        .annotate(
+            role=Max('role'),
+            annual_days=_days_of_type('AL'),
+            medical_days=_days_of_type('ML'),
+            carryforward=Sum('carryforward_days'),
+            pending=Sum('pending_delta'),
+        )
+        .order_by()
+    )
+    balances = [
+        LeaveBalanceProjection(
+            requester_user_id=row['requester_user_id'],
+            year=row['year'],
+            role=row['role'],
+            annual_taken=row['annual_days'] - row['carryforward'],
+            medical_taken=row['medical_days'],
+            carryforward_taken=row['carryforward'],
+            pending_requests=row['pending'],
+        )
+        for row in rows.iterator(chunk_size=batch_size)
+    ]
+    LeaveBalanceProjection.objects.bulk_create(balances, batch_size=batch_size)
+    return len(balances)
+
+
+def _rebuild_roster_postgres():
+    roster_table = AbsenceRosterEntry._meta.db_table
+    event_table = LeaveEvent._meta.db_table
+    leave_table = UnifiedLeaveRequest._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {roster_table} (date, requester_user_id, role, leave_id, leave_type)
+            SELECT day::date, latest.requester_user_id, latest.role, latest.leave_id, latest.leave_type
+            FROM (
+                SELECT DISTINCT ON (leave_id)
+                    leave_id, event_type, requester_user_id, role, leave_type, start_date, end_date
+                FROM {event_table}
+                WHERE event_type IN %s
+                ORDER BY leave_id, id DESC
+            ) AS latest
+            JOIN {leave_table} AS leave ON leave.id = latest.leave_id
+            CROSS JOIN LATERAL generate_series(latest.start_date, latest.end_date, interval '1 day') AS day
+            WHERE latest.event_type = 'approved'
+              AND EXTRACT(ISODOW FROM day) < 6
+            """,
+            [STATE_EVENTS],
+        )
+        return cursor.rowcount
+
+
+def _rebuild_roster(batch_size):
+    latest_state = (
+        LeaveEvent.objects
+        .filter(leave_id=OuterRef('leave_id'), event_type__in=STATE_EVENTS)
+        .order_by('-id')
+        .values('id')[:1]
+    )
+    approved = (
+        LeaveEvent.objects
+        .filter(event_type='approved', id=Subquery(latest_state))
+        .filter(leave_id__in=UnifiedLeaveRequest.objects.values('id'))
+        .values_list('leave_id', 'requester_user_id', 'role', 'leave_type', 'start_date', 'end_date')
+    )
+    roster_days = 0
+    entries = []
+    for leave in approved.iterator(chunk_size=batch_size):
+        entries.extend(_roster_entries(*leave))
+        if len(entries) >= batch_size:
+            AbsenceRosterEntry.objects.bulk_create(entries, batch_size=batch_size)
+            roster_days += len(entries)
+            entries = []
+    AbsenceRosterEntry.objects.bulk_create(entries, batch_size=batch_size)
+    return roster_days + len(entries)
@@ -0,0 +1,246 @@
+"""
+Live leave updates for the approver dashboards, streamed as server-sent events.
+
+When leave events commit, the id of the newest one is published on a Redis
+channel. Each ASGI worker process keeps one subscription to that channel and
+wakes the open dashboard streams. Every stream then reads the events past its
+own cursor from the LeaveEvent log, limited to what that approver may see.
+The log is the source of truth, so a reconnecting browser resumes from
+Last-Event-ID without missing anything.
+
+Event ids are allocated before commit, so a transaction can commit after a
+later one whose event was already streamed. Each read therefore also looks
+back over the events written in the last LIVE_OVERLAP_SECONDS and sends the
+ones the stream has not sent yet.
+"""
+import asyncio
+import json
+import logging
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from common.context_processors import pending_leave_count
+from employe.models import Employe
+from .models import Founder, LeaveBalanceProjection, LeaveEvent, Manager
+from .push import PUSH_EVENTS
+
+logger = logging.getLogger(__name__)
+
+# Redis pub/sub channel carrying the newest committed LeaveEvent id
+LIVE_CHANNEL = 'leave-events'
+
+# Seconds between keep-alive comments on an idle stream
+LIVE_HEARTBEAT_SECONDS = 15
+
+# Streams end after this long and the browser reconnects with Last-Event-ID,
+# which bounds streams whose client went away without the server noticing
+LIVE_STREAM_SECONDS = 300
+
+# Events read from the log per wake-up
+LIVE_BATCH_SIZE = 200
+
+# Events written this recently are read again in case they committed after a
+# later event was streamed; the look-back never goes further than
+# LIVE_OVERLAP_EVENTS ids behind the cursor
+LIVE_OVERLAP_SECONDS = 60
+LIVE_OVERLAP_EVENTS = 1000
+
+_redis = None
+
+
+def _redis_client():
+    global _redis
+    if _redis is None:
+        import redis
+        _redis = redis.Redis.from_url(settings.LIVE_UPDATES_REDIS_URL)
+    return _redis
+
+
+def publish_leave_events(events):
+    """Announce recorded LeaveEvents to the live streams once the transaction commits"""
+    latest = max((event.pk for event in events if event.pk), default=None)
+    if latest is None:
+        return
+
+    def publish():
+        try:
+            _redis_client().publish(LIVE_CHANNEL, latest)
+        except Exception as e:
+            logger.error(f"Failed to publish live leave update: {e}")
+
+    transaction.on_commit(publish)
+
+
+def approver_scope(user):
+    """('founder', None), ('manager', Manager) or (None, None) for the dashboard user"""
+    if not user.is_authenticated:
+        return None, None
+    if Founder.objects.filter(user=user).exists():
+        return 'founder', None
+    if user.is_manager:
+        manager = Manager.objects.filter(user=user).first()
+        if manager:
+            return 'manager', manager
+    return None, None
+
+
+def latest_leave_event_id():
+    return LeaveEvent.objects.aggregate(latest=Max('pk'))['latest'] or 0
+
+
+def overlap_events(after_id):
+    """Events up to after_id that may still be committing, or have just committed"""
+    return LeaveEvent.objects.filter(
+        pk__gt=max(after_id - LIVE_OVERLAP_EVENTS, 0),
+        occurred_at__gte=timezone.now() - timedelta(seconds=LIVE_OVERLAP_SECONDS),
+    )
+
+
+def recent_leave_event_ids(after_id):
+    """Ids of the overlap window, for a new stream to treat as already sent"""
+    return set(overlap_events(after_id).filter(pk__lte=after_id).values_list('pk', flat=True))
+
+
+def live_updates_between(scope, manager, after_id, upto_id, seen):
+    """
+    Server-sent event chunks for the events in (after_id, upto_id], and the
+    late-committed ones of the overlap window, that the approver may see and
+    that are not in `seen`, followed by their current pending count.
+    `seen` holds the ids already sent and is updated in place. Returns
+    (chunks, new cursor).
+    """
+    overlap = overlap_events(after_id).values('pk')
+    events = LeaveEvent.objects.filter(
+        Q(pk__gt=after_id) | Q(pk__in=overlap), pk__lte=upto_id, event_type__in=PUSH_EVENTS
+    ).exclude(pk__in=seen).select_related('requester_user')
+    projections = LeaveBalanceProjection.objects.all()
+    if scope == 'manager':
+        team = Employe.objects.filter(manager=manager).values('user')
+        events = events.filter(role='employee', requester_user__in=team)
+        projections = projections.filter(role='employee', requester_user__in=team)
+    events = list(events.order_by('pk')[:LIVE_BATCH_SIZE])
+    if not events:
+        return [], max(after_id, upto_id)
+
+    chunks = []
+    for event in events:
+        chunks.append(sse_chunk('leave', {
+            'event': event.event_type,
+            'leave': event.leave_id,
+            'role': event.role,
+            'requester': event.requester_user_id,
+            'requester_name': event.requester_user.get_full_name() if event.requester_user else '',
+            'leave_type': event.leave_type,
+            'start_date': event.start_date.isoformat() if event.start_date else None,
+            'end_date': event.end_date.isoformat() if event.end_date else None,
+        }, event_id=event.pk))
+
+    # A full batch means more may be left; resume after the last one sent
+    cursor = max(after_id, events[-1].pk if len(events) == LIVE_BATCH_SIZE else upto_id)
+    seen.update(event.pk for event in events)
+    floor = cursor - LIVE_OVERLAP_EVENTS
+    seen.difference_update([pk for pk in seen if pk <= floor])
+    chunks.append(sse_chunk('pending', {'count': pending_leave_count(projections)}, event_id=cursor))
+    return chunks, cursor
+
+
+def sse_chunk(event, data, event_id=None):
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines += [f'event: {event}', f'data: {json.dumps(data)}']
+    return '\n'.join(lines) + '\n\n'
+
+
+class LiveBroker:
+    """
+    One Redis subscription per process, fanned out to an asyncio.Queue per
+    open stream. Each queue only needs the newest id, so it holds at most one.
+    """
+
+    def __init__(self):
+        self.queues = set()
+        self.task = None
+
+    def register(self):
+        queue = asyncio.Queue(maxsize=1)
+        self.queues.add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._listen())
+        return queue
+
+    def unregister(self, queue):
+        self.queues.discard(queue)
+        if not self.queues and self.task is not None:
+            # Nobody is listening in this process any more; drop the subscription
+            self.task.cancel()
+            self.task = None
+
+    def announce(self, latest):
+        for queue in self.queues:
+            self.offer(queue, latest)
+
+    @staticmethod
+    def offer(queue, latest):
+        if queue.full():
+            latest = max(latest, queue.get_nowait())
+        queue.put_nowait(latest)
+
+    async def _listen(self):
+        import redis.asyncio as aioredis
+
+        while self.queues:
+            client = aioredis.Redis.from_url(settings.LIVE_UPDATES_REDIS_URL)
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.subscribe(LIVE_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            self.announce(int(message['data']))
+            except Exception as e:
+                logger.error(f"Live leave update subscription failed: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await client.aclose()
+
+
+broker = LiveBroker()
+
+
+async def live_event_stream(scope, manager, last_id):
+    """Async iterator of server-sent event chunks for one dashboard"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + LIVE_STREAM_SECONDS
+    queue = broker.register()
+    try:
+        yield 'retry: 3000\n\n'
+        if last_id is None:
+            last_id = await sync_to_async(latest_leave_event_id)()
+            # Only late commits of the overlap window are news to a new stream
+            seen = await sync_to_async(recent_leave_event_ids)(last_id)
+        else:
+            # Catch up on whatever was missed while reconnecting; the browser
+            # skips the events of the overlap window it has already shown
+            seen = set()
+            broker.offer(queue, await sync_to_async(latest_leave_event_id)())
+
+        while loop.time() < deadline:
+            try:
+                latest = await asyncio.wait_for(queue.get(), timeout=LIVE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            # Every wake-up reads, since a late commit announces an id below the cursor
+            while True:
+                chunks, last_id = await sync_to_async(live_updates_between)(
+                    scope, manager, last_id, latest, seen
+                )
+                for chunk in chunks:
+                    yield chunk
+                if last_id >= latest:
+                    break
+    finally:
+        broker.unregister(queue)
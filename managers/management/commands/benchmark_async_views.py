@@ -0,0 +1,166 @@
+from django.conf import settings
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
+import time
+
+from managers.notifications import MAIL_CONCURRENCY
+from users.models import User
+
+
+class SlowEmailBackend(BaseEmailBackend):
+    """Mail backend that stands in for a slow SMTP server: every message takes `latency` seconds"""
+    latency = 0.2
+
+    def send_messages(self, email_messages):
+        for _ in email_messages:
+            time.sleep(self.latency)
+        return len(email_messages)
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+# Status of a successful OTP request (redirect to the reset form) and page view
+EXPECTED_STATUS = {'otp': 302, 'page': 200}
+
+
+def _summary(timings, failures, elapsed):
+    stats = {'seconds': round(elapsed, 3), 'failed': failures}
+    for kind, values in timings.items():
+        stats[kind] = {
+            'requests': len(values),
+            'p50_ms': round(_percentile(values, 0.5) * 1000, 1),
+            'p95_ms': round(_percentile(values, 0.95) * 1000, 1),
+        }
+    return stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the async forget-password view against slow SMTP: the same concurrent load served '
+        'by a pool of sync workers (gunicorn sync) and by one event loop (uvicorn worker)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=40,
+            help='OTP requests sent at once; as many page views are sent alongside them'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Sync workers serving the sync run'
+        )
+        parser.add_argument(
+            '--smtp-latency',
+            type=float,
+            default=0.2,
+            help='Seconds the simulated SMTP server takes per message'
+        )
+        parser.add_argument(
+            '--json-summary',
+            action='store_true',
+            help='Print a single JSON summary and nothing else'
+        )
+
+    def handle(self, *args, **options):
+        count = max(options['requests'], 1)
+        workers = max(options['workers'], 1)
+        SlowEmailBackend.latency = max(options['smtp_latency'], 0)
+        url = reverse('employe:forget_password')
+
+        # One account per OTP request, since OTPs are limited to 3 per hour per account
+        prefix = f"benchmark-{get_random_string(12).lower()}"
+        emails = [f"{prefix}-{i}@example.com" for i in range(count * 2)]
+        User.objects.bulk_create([User(username=email, email=email) for email in emails])
+
+        if not options['json_summary']:
+            self.stdout.write(
+                f'⏱️  {count} OTP requests and {count} page views at once, '
+                f'SMTP {SlowEmailBackend.latency:g}s per message...'
+            )
+
+        try:
+            with override_settings(
+                EMAIL_BACKEND=f'{__name__}.SlowEmailBackend',
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            ):
+                stats = {
+                    'sync': self.run_sync(url, emails[:count], workers),
+                    'async': self.run_async(url, emails[count:]),
+                }
+        finally:
+            User.objects.filter(email__startswith=prefix).delete()
+
+        if options['json_summary']:
+            self.stdout.write(json.dumps(stats))
+            return
+
+        for mode, label in (('sync', f'{workers} sync workers'), ('async', '1 event loop')):
+            result = stats[mode]
+            self.stdout.write(self.style.SUCCESS(f"✅ {label}: {result['seconds']}s, {result['failed']} failed"))
+            for kind in ('otp', 'page'):
+                self.stdout.write(
+                    f"   📨 {kind}: p50 {result[kind]['p50_ms']} ms, p95 {result[kind]['p95_ms']} ms"
+                )
+        self.stdout.write(
+            f'   ℹ️  Mail is sent {MAIL_CONCURRENCY} messages at a time (MAIL_CONCURRENCY) in both runs'
+        )
+
+    def run_sync(self, url, emails, workers):
+        """Each request holds one of `workers` threads for its whole duration, as gunicorn sync workers do"""
+        def serve(request):
+            kind, email = request
+            try:
+                if kind == 'otp':
+                    response = Client().post(url, {'email': email})
+                else:
+                    response = Client().get(url)
+            finally:
+                connection.close()
+            # Latency counts from when every request was sent, queueing included
+            return kind, time.perf_counter() - started, response.status_code
+
+        requests = [request for email in emails for request in (('otp', email), ('page', None))]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(serve, requests))
+        return self.summarize(results, time.perf_counter() - started)
+
+    def run_async(self, url, emails):
+        """All requests share one event loop, as in a uvicorn worker"""
+        async def serve(kind, email):
+            if kind == 'otp':
+                response = await AsyncClient().post(url, {'email': email})
+            else:
+                response = await AsyncClient().get(url)
+            return kind, time.perf_counter() - started, response.status_code
+
+        async def run():
+            return await asyncio.gather(*(
+                serve(kind, email) for email in emails for kind in ('otp', 'page')
+            ))
+
+        started = time.perf_counter()
+        results = asyncio.run(run())
+        return self.summarize(results, time.perf_counter() - started)
+
+    def summarize(self, results, elapsed):
+        timings = {'otp': [], 'page': []}
+        failures = 0
+        for kind, seconds, status in results:
+            timings[kind].append(seconds)
+            failures += status != EXPECTED_STATUS[kind]
+        return _summary(timings, failures, elapsed)
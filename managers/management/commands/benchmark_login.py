@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import authenticate
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils.crypto import get_random_string
+import json
+import time
+
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Benchmark employee logins per second on one core through the authentication backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Login attempts timed per case'
+        )
+        parser.add_argument(
+            '--json-summary',
+            action='store_true',
+            help='Print a single JSON summary and nothing else'
+        )
+
+    def handle(self, *args, **options):
+        iterations = max(options['iterations'], 1)
+        email = f"benchmark-{get_random_string(12).lower()}@example.com"
+        password = get_random_string(20)
+        cases = {
+            'valid': (email, password),
+            'wrong_password': (email, password + 'x'),
+            'unknown_email': (f"missing-{email}", password),
+        }
+
+        if not options['json_summary']:
+            self.stdout.write(f'⏱️  Timing {iterations} logins per case on one core...')
+
+        stats = {}
+        # The benchmark user is rolled back with everything else the run wrote
+        with transaction.atomic():
+            User.objects.create_user(username=email, email=email, password=password)
+            for case, (login_email, login_password) in cases.items():
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    for _ in range(iterations):
+                        authenticate(None, email=login_email, password=login_password, role='employee')
+                    elapsed = time.perf_counter() - started
+                stats[case] = {
+                    'ms_per_login': round(elapsed / iterations * 1000, 2),
+                    'logins_per_second': round(iterations / elapsed, 1),
+                    'queries_per_login': len(queries) / iterations,
+                }
+            transaction.set_rollback(True)
+
+        if options['json_summary']:
+            self.stdout.write(json.dumps(stats))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {stats['valid']['logins_per_second']} logins/s per core "
+            f"({stats['valid']['ms_per_login']} ms, {stats['valid']['queries_per_login']:g} queries each)"
+        ))
+        for case in ('wrong_password', 'unknown_email'):
+            self.stdout.write(
+                f"   🔒 {case.replace('_', ' ').capitalize()}: {stats[case]['ms_per_login']} ms, "
+                f"{stats[case]['queries_per_login']:g} queries"
+            )
@@ -0,0 +1,34 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from managers.thumbnails import THUMBNAIL_MODELS, generate_thumbnails, queue_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Queue (or render with --sync) the thumbnails of profile photos uploaded before thumbnails existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sync',
+            action='store_true',
+            help='Render the thumbnails in this process instead of queueing Celery tasks'
+        )
+
+    def handle(self, *args, **options):
+        for label in THUMBNAIL_MODELS:
+            model = apps.get_model(label)
+            pending = [
+                instance for instance in model._default_manager.exclude(Q(image='') | Q(image__isnull=True)).only(
+                    'pk', 'image', 'image_thumbnails'
+                ).iterator()
+                if instance.image_thumbnails.get('source') != instance.image.name
+            ]
+            for instance in pending:
+                if options['sync']:
+                    generate_thumbnails(instance)
+                else:
+                    queue_thumbnails(instance)
+
+            verb = 'Rendered' if options['sync'] else 'Queued'
+            self.stdout.write(self.style.SUCCESS(f'✅ {verb} thumbnails for {len(pending)} {model._meta.verbose_name_plural}'))
@@ -0,0 +1,71 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+import time
+
+from managers.models import Founder
+from managers.onboarding import IMPORT_BATCH_SIZE, IMPORT_COLUMNS, PeopleImporter, read_people_file
+
+
+class Command(BaseCommand):
+    help = (
+        'Onboard employees and managers from a CSV or XLSX file. '
+        f"Columns: {', '.join(IMPORT_COLUMNS)} (email and first_name are required)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file, with a header row')
+        parser.add_argument(
+            '--founder',
+            help='Email of the founder to link the imported people to'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help='Rows created per transaction'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Password hashing processes (default: one per CPU)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate every row without creating anyone'
+        )
+
+    def handle(self, *args, **options):
+        founder = None
+        if options['founder']:
+            founder = Founder.objects.filter(user__email=options['founder']).first()
+            if founder is None:
+                raise CommandError(f"No founder with email {options['founder']}")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('🔍 DRY RUN MODE - nobody will be created'))
+
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as file:
+                rows = read_people_file(file, options['path'])
+                stats = PeopleImporter(
+                    founder=founder,
+                    batch_size=max(options['batch_size'], 1),
+                    workers=options['workers'],
+                    dry_run=options['dry_run'],
+                ).run(rows)
+        except (OSError, ValidationError) as e:
+            raise CommandError(' '.join(e.messages) if isinstance(e, ValidationError) else str(e))
+        elapsed = time.perf_counter() - started
+
+        for number, message in stats['errors']:
+            self.stderr.write(f"   ❌ Row {number}: {message}")
+
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {verb} {stats['employees']} employees and {stats['managers']} managers "
+            f"from {stats['rows']} rows in {elapsed:.1f}s"
+        ))
+        if stats['errors']:
+            self.stdout.write(self.style.WARNING(f"⚠️  {len(stats['errors'])} rows had errors and were skipped"))
@@ -1,15 +1,33 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
+from django.db import connections
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, date
+import json
 import logging
 
 from employe.models import Employe
-from managers.models import Manager, Founder
+from managers.models import Manager, Founder, YearEndRun
+from managers.tasks import leave_count_verification_chunks, recalculate_leave_counts_for_ids
+from managers.year_end import (
+    YEAR_END_PARTITION_SIZE,
+    YearEndPartitionSizeMismatch,
+    cleanup_carryforward_balances,
+    current_fiscal_year,
+    grant_carryforward_balances,
+    run_year_end_job_inline,
+)
 
 logger = logging.getLogger(__name__)
 
+# Parallel threads used by --verify
+VERIFY_WORKERS = 4
+
+# Profiles listed per database round trip, and per UPDATE batch, by default
+DEFAULT_BATCH_SIZE = YEAR_END_PARTITION_SIZE
+
 
 class Command(BaseCommand):
     help = 'Process carryforward leaves for employees on Dec 31st and cleanup on Mar 31st'
@@ -27,24 +45,71 @@ class Command(BaseCommand):
             action='store_true',
             help='Run without making actual changes (for testing)'
         )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Before cleanup, recompute every balance from approved leave history in parallel chunks'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Profiles per UPDATE batch (id range) and per streamed listing chunk; an interrupted run must be resumed with the same size'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Process id-range batches across N worker processes'
+        )
+        output = parser.add_mutually_exclusive_group()
+        output.add_argument(
+            '--quiet',
+            action='store_true',
+            help='Only print the summary lines, not one line per person'
+        )
+        output.add_argument(
+            '--json-summary',
+            action='store_true',
+            help='Print a single JSON summary and nothing else'
+        )
 
     def handle(self, *args, **options):
         action = options['action']
         dry_run = options['dry_run']
-        
+        verify = options['verify']
+        self.batch_size = max(options['batch_size'], 1)
+        self.workers = max(options['workers'], 1)
+        self.quiet = options['quiet'] or options['json_summary']
+        self.json_summary = options['json_summary']
+        self.summary = {'action': action, 'dry_run': dry_run}
+
         if dry_run:
-            self.stdout.write(self.style.WARNING('DRY RUN MODE - No changes will be made'))
+            self.log(self.style.WARNING('DRY RUN MODE - No changes will be made'))
         
         if action == 'grant':
             self.grant_carryforward_leaves(dry_run)
         elif action == 'cleanup':
-            self.cleanup_carryforward_leaves(dry_run)
+            self.cleanup_carryforward_leaves(dry_run, verify)
         elif action == 'test':
             self.test_carryforward_system(dry_run)
 
+        if self.json_summary:
+            self.stdout.write(json.dumps(self.summary, default=str))
+
+    def log(self, message):
+        """Write a summary line unless --json-summary is set"""
+        if not self.json_summary:
+            self.stdout.write(message)
+
+    def log_person(self, message):
+        """Write a per-person line unless --quiet or --json-summary is set"""
+        if not self.quiet:
+            self.stdout.write(message)
+
     def grant_carryforward_leaves(self, dry_run=False):
         """Grant carryforward leaves on December 31st"""
-        self.stdout.write(self.style.SUCCESS('🎄 Processing December 31st carryforward leaves...'))
+        self.log(self.style.SUCCESS('🎄 Processing December 31st carryforward leaves...'))
         
         # Get configuration
         config = getattr(settings, 'LEAVE_MANAGEMENT_CONFIG', {
@@ -54,114 +119,174 @@ class Command(BaseCommand):
         limit = config.get('CARRYFORWARD_LIMIT', 6)
         threshold = config.get('CARRYFORWARD_ELIGIBILITY_THRESHOLD', 10)
 
-        # Process Employees
-        employees = Employe.objects.all()
-        eligible_employees = []
-        
-        for employee in employees:
-            if employee.available_leaves >= threshold:
-                eligible_employees.append(employee)
-                
-                if not dry_run:
-                    employee.carryforward_available_leaves = limit
-                    employee.carryforward_granted = limit
-                    employee.carryforward_leaves_taken = 0
-                    employee.save()
-                
-                self.stdout.write(
-                    f"✅ Employee: {employee.user.first_name} {employee.user.last_name} "
-                    f"(Unused: {employee.available_leaves}) -> {limit} carryforward leaves granted"
-                )
-            else:
-                self.stdout.write(
-                    f"❌ Employee: {employee.user.first_name} {employee.user.last_name} "
-                    f"(Unused: {employee.available_leaves}) -> Not eligible (needs {threshold}+ unused leaves)"
-                )
+        if dry_run:
+            employee_stats = grant_carryforward_balances(Employe.objects.all(), limit, threshold, dry_run=True)
+            manager_stats = grant_carryforward_balances(Manager.objects.all(), limit, threshold, dry_run=True)
+            stats = {
+                'total_employees': employee_stats['total'],
+                'total_managers': manager_stats['total'],
+                'employees_with_carryforward': employee_stats['eligible'],
+                'managers_with_carryforward': manager_stats['eligible'],
+                'total_carryforward_leaves': (employee_stats['eligible'] + manager_stats['eligible']) * limit,
+            }
+        else:
+            # Apply the grant once per fiscal year through the year-end run ledger
+            stats = self.run_year_end_job('carryforward_grant')
+            if stats is None:
+                self.summary['grant'] = {'status': 'skipped'}
+                self.log(self.style.WARNING(
+                    '⏭️ Carryforward grant already applied for this year (or in progress elsewhere) - skipping'
+                ))
+                return
 
-        # Process Managers
-        managers = Manager.objects.all()
-        eligible_managers = []
-        
-        for manager in managers:
-            if manager.available_leaves >= threshold:
-                eligible_managers.append(manager)
-                
-                if not dry_run:
-                    manager.carryforward_available_leaves = limit
-                    manager.carryforward_granted = limit
-                    manager.carryforward_leaves_taken = 0
-                    manager.save()
-                
-                self.stdout.write(
-                    f"✅ Manager: {manager.user.first_name} {manager.user.last_name} "
-                    f"(Unused: {manager.available_leaves}) -> {limit} carryforward leaves granted"
-                )
-            else:
-                self.stdout.write(
-                    f"❌ Manager: {manager.user.first_name} {manager.user.last_name} "
-                    f"(Unused: {manager.available_leaves}) -> Not eligible (needs {threshold}+ unused leaves)"
+        # The grant does not touch available_leaves, so the listing reads the
+        # same unused balances the eligibility check used.
+        if not self.quiet:
+            for label, model in (('Employee', Employe), ('Manager', Manager)):
+                people = (
+                    model.objects.select_related('user')
+                    .only('available_leaves', 'user__first_name', 'user__last_name')
+                    .order_by('id')
+                    .iterator(chunk_size=self.batch_size)
                 )
-        
+                for person in people:
+                    if person.available_leaves >= threshold:
+                        self.log_person(
+                            f"✅ {label}: {person.user.first_name} {person.user.last_name} "
+                            f"(Unused: {person.available_leaves}) -> {limit} carryforward leaves granted"
+                        )
+                    else:
+                        self.log_person(
+                            f"❌ {label}: {person.user.first_name} {person.user.last_name} "
+                            f"(Unused: {person.available_leaves}) -> Not eligible (needs {threshold}+ unused leaves)"
+                        )
+
+        eligible_count = stats['employees_with_carryforward'] + stats['managers_with_carryforward']
+
         # Send email notifications
-        if (eligible_employees or eligible_managers) and not dry_run:
-            self.send_carryforward_notifications(eligible_employees + eligible_managers)
-        
-        self.stdout.write(
+        if eligible_count and not dry_run:
+            self.send_carryforward_notifications(self.eligible_people(threshold))
+
+        self.summary['grant'] = {'status': 'dry_run' if dry_run else 'completed', 'stats': stats}
+        self.log(
             self.style.SUCCESS(
                 f'🎉 Carryforward process completed! '
-                f'{len(eligible_employees) + len(eligible_managers)} persons received carryforward leaves.'
+                f'{eligible_count} persons received carryforward leaves.'
             )
         )
 
-    def cleanup_carryforward_leaves(self, dry_run=False):
+    def run_year_end_job(self, job):
+        """Run a year-end job in --batch-size partitions across --workers processes"""
+        try:
+            return run_year_end_job_inline(job, partition_size=self.batch_size, workers=self.workers)
+        except YearEndPartitionSizeMismatch as e:
+            raise CommandError(str(e))
+
+    def eligible_people(self, threshold):
+        """Name and email of every employee and manager eligible for carryforward"""
+        fields = ('user__first_name', 'user__last_name', 'user__email')
+        people = []
+        for model in (Employe, Manager):
+            people.extend(
+                model.objects.filter(available_leaves__gte=threshold)
+                .order_by('id')
+                .values_list(*fields)
+                .iterator(chunk_size=self.batch_size)
+            )
+        return people
+
+    def cleanup_carryforward_leaves(self, dry_run=False, verify=False):
         """Cleanup carryforward leaves on March 31st"""
-        self.stdout.write(self.style.WARNING('🧹 Processing March 31st carryforward cleanup...'))
-        
-        employees = Employe.objects.all()
-        managers = Manager.objects.all()
-        cleanup_count = 0
-        
-        for employee in employees:
-            if not dry_run:
-                employee.recalculate_leave_counts()
-            cleanup_count += 1
-            self.stdout.write(f"🧹 Employee: {employee.user.first_name} {employee.user.last_name} -> Processed")
-
-        for manager in managers:
-            if not dry_run:
-                manager.recalculate_leave_counts()
-            cleanup_count += 1
-            self.stdout.write(f"🧹 Manager: {manager.user.first_name} {manager.user.last_name} -> Processed")
-        
+        self.log(self.style.WARNING('🧹 Processing March 31st carryforward cleanup...'))
+
+        if dry_run:
+            annual_allocation = getattr(settings, 'LEAVE_MANAGEMENT_CONFIG', {}).get('ANNUAL_LEAVE_ALLOCATION', 18)
+            employee_stats = cleanup_carryforward_balances(Employe.objects.all(), annual_allocation, dry_run=True)
+            manager_stats = cleanup_carryforward_balances(Manager.objects.all(), annual_allocation, dry_run=True)
+            stats = {
+                'total_employees': employee_stats['total'],
+                'total_managers': manager_stats['total'],
+                'employees_cleaned': employee_stats['cleaned'],
+                'managers_cleaned': manager_stats['cleaned'],
+                'total_leaves_forfeited': employee_stats['forfeited'] + manager_stats['forfeited'],
+            }
+        else:
+            already_done = YearEndRun.objects.filter(
+                job='carryforward_cleanup', fiscal_year=current_fiscal_year(), status='completed'
+            ).exists()
+            if not already_done and verify:
+                self.verify_leave_counts()
+
+            # Apply the cleanup once per fiscal year through the year-end run ledger
+            stats = None if already_done else self.run_year_end_job('carryforward_cleanup')
+            if stats is None:
+                self.summary['cleanup'] = {'status': 'skipped'}
+                self.log(self.style.WARNING(
+                    '⏭️ Carryforward cleanup already applied for this year (or in progress elsewhere) - skipping'
+                ))
+                return
+
+        self.log(
+            f"🧹 Employees: {stats['total_employees']} processed, {stats['employees_cleaned']} held carryforward leaves"
+        )
+        self.log(
+            f"🧹 Managers: {stats['total_managers']} processed, {stats['managers_cleaned']} held carryforward leaves"
+        )
+        self.log(f"🧹 {stats['total_leaves_forfeited']} carryforward leaves forfeited")
+
+        cleanup_count = stats['total_employees'] + stats['total_managers']
+
         # Send cleanup notifications
         if cleanup_count > 0 and not dry_run:
-            all_affected = list(employees) + list(managers)
-            self.send_cleanup_notifications(all_affected)
-        
-        self.stdout.write(
+            self.send_cleanup_notifications(cleanup_count)
+
+        self.summary['cleanup'] = {'status': 'dry_run' if dry_run else 'completed', 'stats': stats}
+        self.log(
             self.style.SUCCESS(
                 f'🧹 Cleanup completed! {cleanup_count} persons had carryforward leaves reset.'
             )
         )
 
+    def verify_leave_counts(self, workers=VERIFY_WORKERS):
+        """Recompute every person's leave counts from approved history in parallel chunks"""
+        self.log('🔍 Verifying leave counts against approved leave history...')
+
+        def run_chunk(role, ids):
+            try:
+                return recalculate_leave_counts_for_ids(role, ids)
+            finally:
+                # Each worker thread opens its own connection
+                connections.close_all()
+
+        verified = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(run_chunk, role, ids)
+                for role, ids in leave_count_verification_chunks()
+            ]
+            for future in as_completed(futures):
+                verified += future.result()
+
+        self.log(f"🔍 Verified leave counts for {verified} persons")
+
     def test_carryforward_system(self, dry_run=True):
         """Test the carryforward system with current data"""
-        self.stdout.write(self.style.HTTP_INFO('🧪 Testing carryforward system...'))
+        self.log(self.style.HTTP_INFO('🧪 Testing carryforward system...'))
         
         # Test grant process
-        self.stdout.write('\n--- Testing Grant Process (Dec 31st) ---')
+        self.log('\n--- Testing Grant Process (Dec 31st) ---')
         self.grant_carryforward_leaves(dry_run=True)
         
         # Test cleanup process
-        self.stdout.write('\n--- Testing Cleanup Process (Mar 31st) ---')
+        self.log('\n--- Testing Cleanup Process (Mar 31st) ---')
         self.cleanup_carryforward_leaves(dry_run=True)
 
     def send_carryforward_notifications(self, eligible_employees):
         """Send email notifications to managers and founders about carryforward grants"""
         try:
             # Get all managers and founders
-            managers = Manager.objects.all()
-            founders = Founder.objects.all()
+            managers = Manager.objects.select_related('user')
+            founders = Founder.objects.select_related('user')
             
             # Prepare recipient list
             recipients = []
@@ -181,8 +306,8 @@ class Command(BaseCommand):
             
             # Create employee summary
             employee_summary = ""
-            for emp in eligible_employees:
-                employee_summary += f"• {emp.user.first_name} {emp.user.last_name} ({emp.user.email}) - 6 carryforward leaves\n"
+            for first_name, last_name, email in eligible_employees:
+                employee_summary += f"• {first_name} {last_name} ({email}) - 6 carryforward leaves\n"
             
             plain_message = f"""
 Dear Team,
@@ -219,18 +344,18 @@ HR System
             )
             
             logger.info(f"Carryforward notification sent to {len(recipients)} recipients")
-            self.stdout.write(f"📧 Email notifications sent to {len(recipients)} managers/founders")
+            self.log(f"📧 Email notifications sent to {len(recipients)} managers/founders")
             
         except Exception as e:
             logger.error(f"Failed to send carryforward notifications: {e}")
-            self.stdout.write(self.style.ERROR(f"❌ Failed to send email notifications: {e}"))
+            self.stderr.write(self.style.ERROR(f"❌ Failed to send email notifications: {e}"))
 
-    def send_cleanup_notifications(self, affected_employees):
+    def send_cleanup_notifications(self, affected_count):
         """Send email notifications about carryforward cleanup"""
         try:
             # Get all managers and founders
-            managers = Manager.objects.all()
-            founders = Founder.objects.all()
+            managers = Manager.objects.select_related('user')
+            founders = Founder.objects.select_related('user')
             
             # Prepare recipient list
             recipients = []
@@ -254,7 +379,7 @@ The March 31st carryforward leave cleanup has been completed.
 
 SUMMARY:
 - Date: {timezone.now().strftime('%Y-%m-%d %H:%M')}
-- Affected Employees: {len(affected_employees)}
+- Affected Employees: {affected_count}
 - Action: All unused carryforward leaves have been reset to 0
 
 All carryforward leaves from the previous year have been automatically removed as per policy.
@@ -274,8 +399,8 @@ HR System
             )
             
             logger.info(f"Cleanup notification sent to {len(recipients)} recipients")
-            self.stdout.write(f"📧 Cleanup notifications sent to {len(recipients)} managers/founders")
+            self.log(f"📧 Cleanup notifications sent to {len(recipients)} managers/founders")
             
         except Exception as e:
             logger.error(f"Failed to send cleanup notifications: {e}")
-            self.stdout.write(self.style.ERROR(f"❌ Failed to send cleanup notifications: {e}"))
+            self.stderr.write(self.style.ERROR(f"❌ Failed to send cleanup notifications: {e}"))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+import json
+
+from managers.leave_events import PROJECTION_BATCH_SIZE, rebuild_leave_projections
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the leave balance projection and absence roster by replaying the leave event log'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=PROJECTION_BATCH_SIZE,
+            help='Rows per streamed chunk and per INSERT batch'
+        )
+        parser.add_argument(
+            '--json-summary',
+            action='store_true',
+            help='Print a single JSON summary and nothing else'
+        )
+
+    def handle(self, *args, **options):
+        if not options['json_summary']:
+            self.stdout.write('🔁 Replaying leave events...')
+
+        stats = rebuild_leave_projections(batch_size=max(options['batch_size'], 1))
+
+        if options['json_summary']:
+            self.stdout.write(json.dumps(stats))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Replayed {stats['events']} events in {stats['seconds']}s "
+            f"({stats['events_per_second']} events/s)"
+        ))
+        self.stdout.write(f"   📊 Balance rows: {stats['balances']}")
+        self.stdout.write(f"   📅 Roster days: {stats['roster_days']}")
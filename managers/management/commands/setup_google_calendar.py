@@ -10,7 +10,7 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS('Setting up Google Calendar authentication...'))
         
         # Check if credentials.json exists
-        credentials_file = os.path.join(settings.BASE_DIR, 'credentials.json')
+        credentials_file = settings.GOOGLE_CALENDAR_CREDENTIALS_FILE
         if not os.path.exists(credentials_file):
             self.stdout.write(
                 self.style.ERROR(
@@ -23,7 +23,7 @@ class Command(BaseCommand):
         try:
             # Initialize the service which will trigger authentication
             calendar_service = get_google_calendar_service()
-            service = calendar_service.authenticate()
+            service = calendar_service.authenticate(interactive=True)
             
             if service:
                 self.stdout.write(
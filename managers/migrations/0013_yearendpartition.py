@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('managers', '0012_manager_carryforward_granted_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='YearEndPartition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(choices=[('yearly_reset', 'Yearly Leave Reset'), ('carryforward_cleanup', 'Carryforward Cleanup'), ('carryforward_grant', 'Carryforward Grant')], max_length=50)),
+                ('run_key', models.CharField(max_length=50)),
+                ('role', models.CharField(choices=[('employee', 'Employee'), ('manager', 'Manager')], max_length=20)),
+                ('start_id', models.BigIntegerField()),
+                ('end_id', models.BigIntegerField()),
+                ('stats', models.JSONField(blank=True, default=dict)),
+                ('completed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'year end partition',
+                'verbose_name_plural': 'year end partitions',
+                'db_table': 'manager_year_end_partition',
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='yearendpartition',
+            constraint=models.UniqueConstraint(fields=('job', 'run_key', 'role', 'start_id'), name='unique_year_end_partition'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('managers', '0013_yearendpartition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='YearEndRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(choices=[('yearly_reset', 'Yearly Leave Reset'), ('carryforward_cleanup', 'Carryforward Cleanup'), ('carryforward_grant', 'Carryforward Grant')], max_length=50)),
+                ('fiscal_year', models.IntegerField()),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed')], default='running', max_length=20)),
+                ('stats', models.JSONField(blank=True, default=dict)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_datetime', models.DateTimeField(auto_now=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'year end run',
+                'verbose_name_plural': 'year end runs',
+                'db_table': 'manager_year_end_run',
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='yearendrun',
+            constraint=models.UniqueConstraint(fields=('job', 'fiscal_year'), name='unique_year_end_run'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('managers', '0014_yearendrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='unifiedleaverequest',
+            name='legacy_id',
+            field=models.BigIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='unifiedleaverequest',
+            name='requester_user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='leave_requests', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='unifiedleaverequest',
+            name='status',
+            field=models.CharField(choices=[('Pending', 'Pending'), ('Approved', 'Approved'), ('Rejected', 'Rejected'), ('Cancelled', 'Cancelled')], default='Pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='unifiedleaverequest',
+            index=models.Index(fields=['requested_by_role', 'status', '-created_date'], name='leave_role_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='unifiedleaverequest',
+            index=models.Index(fields=['requester_user', 'status'], name='leave_requester_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='unifiedleaverequest',
+            index=models.Index(fields=['employee', 'status'], name='leave_employee_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='unifiedleaverequest',
+            index=models.Index(fields=['manager', 'status'], name='leave_manager_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='unifiedleaverequest',
+            index=models.Index(fields=['start_date', 'end_date'], name='leave_dates_idx'),
+        ),
+    ]
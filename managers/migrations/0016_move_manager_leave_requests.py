@@ -0,0 +1,87 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:37
+from django.db import migrations
+from django.db.models import F, OuterRef, Subquery
+
+# Leave status -> the is_* flag that goes with it
+LEAVE_STATUS_FLAGS = {
+    'Approved': 'is_approved',
+    'Rejected': 'is_rejected',
+    'Cancelled': 'is_cancelled',
+}
+
+
+def backfill_unified_leave_requests(apps, schema_editor):
+    """Fill status from the is_* flags and requester_user from the requester profile"""
+    UnifiedLeaveRequest = apps.get_model('managers', 'UnifiedLeaveRequest')
+    Employe = apps.get_model('employe', 'Employe')
+    Manager = apps.get_model('managers', 'Manager')
+
+    UnifiedLeaveRequest.objects.filter(is_cancelled=True).update(status='Cancelled')
+    UnifiedLeaveRequest.objects.filter(is_rejected=True).update(status='Rejected')
+    UnifiedLeaveRequest.objects.filter(is_approved=True).update(status='Approved')
+    # Rejected after it had been approved
+    UnifiedLeaveRequest.objects.filter(
+        is_approved=True, is_rejected=True, rejection_date__gt=F('approval_date')
+    ).update(status='Rejected')
+
+    # A row can carry several flags (rejected after approval); keep only the
+    # one matching the status it was given, so the two never disagree
+    for status, flag in LEAVE_STATUS_FLAGS.items():
+        UnifiedLeaveRequest.objects.filter(status=status).update(**{
+            other: other == flag for other in LEAVE_STATUS_FLAGS.values()
+        })
+    UnifiedLeaveRequest.objects.filter(status='Pending').update(
+        **{flag: False for flag in LEAVE_STATUS_FLAGS.values()}
+    )
+
+    UnifiedLeaveRequest.objects.filter(requested_by_role='employee', employee__isnull=False).update(
+        requester_user=Subquery(Employe.objects.filter(pk=OuterRef('employee_id')).values('user_id')[:1])
+    )
+    UnifiedLeaveRequest.objects.filter(requested_by_role='manager', manager__isnull=False).update(
+        requester_user=Subquery(Manager.objects.filter(pk=OuterRef('manager_id')).values('user_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employe', '0013_employe_carryforward_granted_and_more'),
+        ('managers', '0015_consolidate_leave_requests'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_unified_leave_requests, migrations.RunPython.noop),
+        # The deprecated table is kept as an archive rather than copied in:
+        # manager leaves were already written to the unified table, and
+        # balances never counted these rows
+        migrations.RenameModel(
+            old_name='ManagerLeaveRequest',
+            new_name='ManagerLeaveRequestArchive',
+        ),
+        migrations.AlterModelOptions(
+            name='managerleaverequestarchive',
+            options={
+                'ordering': ['-id'],
+                'verbose_name': 'Manager Leave Request (Archived)',
+                'verbose_name_plural': 'Manager Leave Requests (Archived)',
+            },
+        ),
+        migrations.AlterModelTable(
+            name='managerleaverequestarchive',
+            table='manager_leave_request_archive',
+        ),
+        migrations.CreateModel(
+            name='ManagerLeaveRequest',
+            fields=[
+            ],
+            options={
+                'verbose_name': 'Manager Leave Request (Old)',
+                'verbose_name_plural': 'Manager Leave Requests (Old)',
+                'ordering': ['-id'],
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('managers.unifiedleaverequest',),
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('managers', '0016_move_manager_leave_requests'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaveBalanceProjection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('employee', 'Employee'), ('manager', 'Manager')], max_length=20)),
+                ('year', models.IntegerField()),
+                ('annual_taken', models.IntegerField(default=0)),
+                ('medical_taken', models.IntegerField(default=0)),
+                ('carryforward_taken', models.IntegerField(default=0)),
+                ('pending_requests', models.IntegerField(default=0)),
+                ('requester_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leave_balance_projections', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'leave balance projection',
+                'verbose_name_plural': 'leave balance projections',
+                'db_table': 'leave_balance_projection',
+                'ordering': ['-year'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AbsenceRosterEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('role', models.CharField(choices=[('employee', 'Employee'), ('manager', 'Manager')], max_length=20)),
+                ('leave_type', models.CharField(blank=True, choices=[('ML', 'Medical Leave'), ('AL', 'Annual Leave')], max_length=100, null=True)),
+                ('leave', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='absence_roster', to='managers.unifiedleaverequest')),
+                ('requester_user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='absence_roster', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'absence roster entry',
+                'verbose_name_plural': 'absence roster',
+                'db_table': 'absence_roster',
+                'ordering': ['date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaveEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('employee', 'Employee'), ('manager', 'Manager')], max_length=20)),
+                ('event_type', models.CharField(choices=[('submitted', 'Submitted'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('cancelled', 'Cancelled'), ('carryforward_applied', 'Carry-forward Applied')], max_length=30)),
+                ('leave_type', models.CharField(blank=True, choices=[('ML', 'Medical Leave'), ('AL', 'Annual Leave')], max_length=100, null=True)),
+                ('start_date', models.DateField(blank=True, null=True)),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('days', models.IntegerField(default=0)),
+                ('carryforward_days', models.IntegerField(default=0)),
+                ('pending_delta', models.SmallIntegerField(default=0)),
+                ('occurred_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('leave', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='events', to='managers.unifiedleaverequest')),
+                ('requester_user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='leave_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'leave event',
+                'verbose_name_plural': 'leave events',
+                'db_table': 'leave_event',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['leave', 'id'], name='leave_event_leave_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='leavebalanceprojection',
+            constraint=models.UniqueConstraint(fields=('requester_user', 'year'), name='unique_leave_balance_projection'),
+        ),
+        migrations.AddIndex(
+            model_name='absencerosterentry',
+            index=models.Index(fields=['date', 'requester_user'], name='absence_roster_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='absencerosterentry',
+            constraint=models.UniqueConstraint(fields=('leave', 'date'), name='unique_absence_roster_day'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+import datetime
+
+from django.db import migrations
+from django.utils import timezone
+
+
+def _as_datetime(value):
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    return timezone.make_aware(datetime.datetime.combine(value, datetime.time.min))
+
+
+def seed_leave_events(apps, schema_editor):
+    """Start the event log from the current state of every existing leave request"""
+    UnifiedLeaveRequest = apps.get_model('managers', 'UnifiedLeaveRequest')
+    LeaveEvent = apps.get_model('managers', 'LeaveEvent')
+
+    events = []
+    for leave in UnifiedLeaveRequest.objects.filter(requester_user__isnull=False).iterator(chunk_size=2000):
+        def event(kind, occurred_at, days=0, carryforward_days=0, pending_delta=0, actor_id=None):
+            return LeaveEvent(
+                leave_id=leave.pk,
+                requester_user_id=leave.requester_user_id,
+                role=leave.requested_by_role,
+                event_type=kind,
+                leave_type=leave.leave_type,
+                start_date=leave.start_date,
+                end_date=leave.end_date,
+                days=days,
+                carryforward_days=carryforward_days,
+                pending_delta=pending_delta,
+                actor_id=actor_id,
+                occurred_at=occurred_at or _as_datetime(leave.created_date),
+            )
+
+        events.append(event('submitted', _as_datetime(leave.created_date), pending_delta=1))
+        if leave.status == 'Approved':
+            events.append(event('approved', leave.approval_date, days=leave.leave_duration,
+                                pending_delta=-1, actor_id=leave.approved_by_id))
+            if leave.leave_type == 'AL' and leave.carryforward_used:
+                events.append(event('carryforward_applied', leave.approval_date,
+                                    carryforward_days=leave.carryforward_used, actor_id=leave.approved_by_id))
+        elif leave.status == 'Rejected':
+            events.append(event('rejected', leave.rejection_date, pending_delta=-1, actor_id=leave.rejected_by_id))
+        elif leave.status == 'Cancelled':
+            events.append(event('cancelled', leave.cancellation_date, pending_delta=-1, actor_id=leave.cancelled_by_id))
+
+        if len(events) >= 5000:
+            LeaveEvent.objects.bulk_create(events)
+            events = []
+    LeaveEvent.objects.bulk_create(events)
+
+
+def build_leave_projections(apps, schema_editor):
+    """Fold the seeded events into the balance and roster projections"""
+    # The current models are used: the event and projection tables are
+    # unchanged since 0017, and the rebuild only reads ids from the others
+    from managers.leave_events import rebuild_leave_projections
+
+    rebuild_leave_projections()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('managers', '0017_leave_event_log'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_leave_events, migrations.RunPython.noop),
+        migrations.RunPython(build_leave_projections, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('managers', '0018_seed_leave_events'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='addressmanager',
+            name='updated_datetime',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='backgroundmanager',
+            name='updated_datetime',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='benefitsmanager',
+            name='updated_datetime',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='managerleaverequestarchive',
+            name='updated_datetime',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='emergencycontactmanager',
+            name='updated_datetime',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='founder',
+            name='updated_datetime',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='identificationmanager',
+            name='updated_datetime',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='manager',
+            name='updated_datetime',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='skillmanager',
+            name='updated_datetime',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='unifiedleaverequest',
+            name='updated_datetime',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='workschedulemanager',
+            name='updated_datetime',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('managers', '0019_index_updated_datetime'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='unifiedleaverequest',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+def flag_managers(apps, schema_editor):
+    # Manager login used to set is_manager on every login; it no longer writes,
+    # so every user with a manager profile must carry the flag already
+    User = apps.get_model('users', 'User')
+    Manager = apps.get_model('managers', 'Manager')
+    User.objects.filter(pk__in=Manager.objects.values('user'), is_manager=False).update(is_manager=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('managers', '0020_leave_request_version'),
+        ('users', '0011_user_employee_user_manager'),
+    ]
+
+    operations = [
+        migrations.RunPython(flag_managers, migrations.RunPython.noop),
+    ]
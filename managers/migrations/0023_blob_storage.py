@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:31
+
+import common.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('managers', '0022_image_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='benefitsmanager',
+            name='pancard_file',
+            field=models.FileField(blank=True, null=True, storage=common.storage.ContentAddressedStorage(), upload_to=''),
+        ),
+        migrations.AlterField(
+            model_name='unifiedleaverequest',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=common.storage.ContentAddressedStorage(), upload_to='leave_files'),
+        ),
+    ]
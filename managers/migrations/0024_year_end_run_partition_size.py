@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('managers', '0023_blob_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='yearendrun',
+            name='partition_size',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
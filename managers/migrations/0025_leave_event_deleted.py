@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('managers', '0024_year_end_run_partition_size'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='leaveevent',
+            name='event_type',
+            field=models.CharField(choices=[('submitted', 'Submitted'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('cancelled', 'Cancelled'), ('carryforward_applied', 'Carry-forward Applied'), ('deleted', 'Deleted')], max_length=30),
+        ),
+    ]
@@ -1,7 +1,9 @@
 from django.db import models
+from django.utils import timezone
 from datetime import datetime, timedelta
 
 from common.models import CommonModel
+from common.storage import blob_storage
 
 from users.models import User
 
@@ -32,6 +34,8 @@ class Manager(CommonModel):
     reporting_manager = models.CharField(max_length=100 , null=True, blank=True)
     work_location = models.CharField(max_length=100 , null=True, blank=True)
     image = models.ImageField(upload_to='images/', null=True , blank=True)
+    # Thumbnail storage names by rendition and format, see managers/thumbnails.py
+    image_thumbnails = models.JSONField(default=dict, blank=True, editable=False)
 
     # Leave management fields for managers
     available_leaves = models.IntegerField(default=18)
@@ -83,6 +87,8 @@ class Founder(CommonModel):
     reporting_manager = models.CharField(max_length=100 , null=True, blank=True)
     work_location = models.CharField(max_length=100 , null=True, blank=True)
     image = models.ImageField(upload_to='founder_images/', null=True , blank=True)
+    # Thumbnail storage names by rendition and format, see managers/thumbnails.py
+    image_thumbnails = models.JSONField(default=dict, blank=True, editable=False)
 
     class Meta:
         db_table = 'manager_founder'
@@ -105,14 +111,26 @@ ROLE_CHOICES = (
     ('manager', 'Manager'),
 )
 
+LEAVE_STATUS_CHOICES = (
+    ('Pending', 'Pending'),
+    ('Approved', 'Approved'),
+    ('Rejected', 'Rejected'),
+    ('Cancelled', 'Cancelled'),
+)
+
 class UnifiedLeaveRequest(CommonModel):
-    """Unified leave request model for both employees and managers"""
+    """
+    Unified leave request model for both employees and managers.
+
+    This is the single leave table: employe.LeaveRequest and
+    ManagerLeaveRequest are proxies over it filtered by requested_by_role.
+    """
     subject = models.CharField(max_length=100)
     start_date = models.DateField(null=True, blank=True)
     end_date = models.DateField(null=True, blank=True)
     leave_type = models.CharField(max_length=100, choices=LEAVE_CHOICES, null=True, blank=True)
     description = models.CharField(max_length=500, null=True, blank=True)
-    file = models.FileField(null=True, blank=True, upload_to='leave_files')
+    file = models.FileField(null=True, blank=True, upload_to='leave_files', storage=blob_storage)
 
     # Role-based requester
     requested_by_role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='employee')
@@ -120,8 +138,11 @@ class UnifiedLeaveRequest(CommonModel):
     # Foreign keys for different types of requesters
     employee = models.ForeignKey('employe.Employe', on_delete=models.CASCADE, null=True, blank=True, related_name='unified_leave_requests')
     manager = models.ForeignKey(Manager, on_delete=models.CASCADE, null=True, blank=True, related_name='unified_leave_requests')
+    # Common person key across roles, filled from the employee/manager profile on save
+    requester_user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='leave_requests')
 
     # Approval fields
+    status = models.CharField(max_length=20, choices=LEAVE_STATUS_CHOICES, default='Pending')
     is_approved = models.BooleanField(default=False)
     is_rejected = models.BooleanField(default=False)
     is_cancelled = models.BooleanField(default=False)
@@ -136,11 +157,25 @@ class UnifiedLeaveRequest(CommonModel):
     leave_duration = models.IntegerField(default=0)
     carryforward_used = models.IntegerField(default=0)
 
+    # Optimistic concurrency: bumped by every state transition (LeaveApprovalService)
+    version = models.PositiveIntegerField(default=0)
+
+    # Id the request had in employe_leave_request before the tables were merged;
+    # the id is kept where it was free, so this only differs for moved rows
+    legacy_id = models.BigIntegerField(null=True, blank=True, db_index=True)
+
     class Meta:
         db_table = 'unified_leave_request'
         verbose_name = 'Leave Request'
         verbose_name_plural = 'Leave Requests'
         ordering = ["-id"]
+        indexes = [
+            models.Index(fields=['requested_by_role', 'status', '-created_date'], name='leave_role_status_idx'),
+            models.Index(fields=['requester_user', 'status'], name='leave_requester_status_idx'),
+            models.Index(fields=['employee', 'status'], name='leave_employee_status_idx'),
+            models.Index(fields=['manager', 'status'], name='leave_manager_status_idx'),
+            models.Index(fields=['start_date', 'end_date'], name='leave_dates_idx'),
+        ]
 
     def calculate_working_days(self):
         """Calculate working days between start_date and end_date (excluding weekends)"""
@@ -172,10 +207,32 @@ class UnifiedLeaveRequest(CommonModel):
 
         return working_days
 
+    def sync_status(self):
+        """Keep the status column and the is_approved/is_rejected/is_cancelled flags in step"""
+        flagged = [
+            status for status, flag in (
+                ('Approved', self.is_approved),
+                ('Rejected', self.is_rejected),
+                ('Cancelled', self.is_cancelled),
+            ) if flag
+        ]
+        if flagged:
+            if self.status not in flagged:
+                self.status = flagged[0]
+        elif self.status == 'Approved':
+            self.is_approved = True
+        elif self.status == 'Rejected':
+            self.is_rejected = True
+        elif self.status == 'Cancelled':
+            self.is_cancelled = True
+
     def save(self, *args, **kwargs):
         """Override save to automatically calculate leave duration"""
         # Calculate working days before saving
         self.leave_duration = self.calculate_working_days()
+        self.sync_status()
+        if self.requester_user_id is None and self.requester is not None:
+            self.requester_user_id = self.requester.user_id
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -185,17 +242,6 @@ class UnifiedLeaveRequest(CommonModel):
             return f"Employee: {self.employee.user.email} - {self.subject}"
         return f"Leave Request: {self.subject}"
 
-    @property
-    def status(self):
-        if self.is_approved:
-            return "Approved"
-        elif self.is_rejected:
-            return "Rejected"
-        elif self.is_cancelled:
-            return "Cancelled"
-        else:
-            return "Pending"
-
     @property
     def requester(self):
         """Get the actual requester object"""
@@ -226,20 +272,47 @@ class UnifiedLeaveRequest(CommonModel):
         return self.approved_by.manager_profile.first()
 
 
-# Keep the old ManagerLeaveRequest for backward compatibility (will be deprecated)
-class ManagerLeaveRequest(CommonModel):
+class RoleLeaveRequestManager(models.Manager):
+    """Limits the unified leave table to the requests of one role"""
+
+    def __init__(self, role):
+        super().__init__()
+        self.role = role
+
+    def get_queryset(self):
+        return super().get_queryset().filter(requested_by_role=self.role)
+
+
+# Keep the old ManagerLeaveRequest name for backward compatibility (will be deprecated)
+class ManagerLeaveRequest(UnifiedLeaveRequest):
     """DEPRECATED: Use UnifiedLeaveRequest instead"""
+    objects = RoleLeaveRequestManager('manager')
+
+    class Meta:
+        proxy = True
+        verbose_name = 'Manager Leave Request (Old)'
+        verbose_name_plural = 'Manager Leave Requests (Old)'
+        ordering = ["-id"]
+
+    def save(self, *args, **kwargs):
+        self.requested_by_role = 'manager'
+        super().save(*args, **kwargs)
+
+
+class ManagerLeaveRequestArchive(CommonModel):
+    """
+    Rows of the deprecated manager_leave_request table, kept for reference.
+
+    Manager leaves were already written to UnifiedLeaveRequest and balances
+    never counted these rows, so they stay out of the leave table.
+    """
     subject = models.CharField(max_length=100)
     start_date = models.DateField(null=True, blank=True)
     end_date = models.DateField(null=True, blank=True)
     leave_type = models.CharField(max_length=100, choices=LEAVE_CHOICES, null=True, blank=True)
     description = models.CharField(max_length=500, null=True, blank=True)
     file = models.FileField(null=True, blank=True, upload_to='manager_leave_files')
-
-    # Manager who requested the leave
     manager = models.ForeignKey(Manager, on_delete=models.CASCADE, related_name='old_leave_requests')
-
-    # Approval fields
     is_approved = models.BooleanField(default=False)
     is_rejected = models.BooleanField(default=False)
     is_cancelled = models.BooleanField(default=False)
@@ -249,14 +322,12 @@ class ManagerLeaveRequest(CommonModel):
     approved_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='approved_old_manager_leaves')
     rejected_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='rejected_old_manager_leaves')
     cancelled_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='cancelled_old_manager_leaves')
-
-    # Leave calculation
     leave_duration = models.IntegerField(default=0)
 
     class Meta:
-        db_table = 'manager_leave_request'
-        verbose_name = 'Manager Leave Request (Old)'
-        verbose_name_plural = 'Manager Leave Requests (Old)'
+        db_table = 'manager_leave_request_archive'
+        verbose_name = 'Manager Leave Request (Archived)'
+        verbose_name_plural = 'Manager Leave Requests (Archived)'
         ordering = ["-id"]
 
     def __str__(self):
@@ -310,7 +381,7 @@ class BenefitsManager(CommonModel):
     branch_name = models.CharField(max_length=100, null=True, blank=True)
     ifsc_code = models.CharField(max_length=100, null=True, blank=True)
     pancard = models.CharField(max_length=100, null=True, blank=True)
-    pancard_file = models.FileField(max_length=100, null=True, blank=True)
+    pancard_file = models.FileField(max_length=100, null=True, blank=True, storage=blob_storage)
     pf_fund = models.FloatField(default=0)
     state_insurance_number = models.CharField(max_length=100, null=True, blank=True)
 
@@ -392,3 +463,172 @@ class WorkScheduleManager(CommonModel):
 
     def __str__(self):
         return self.manager.user.email
+
+
+YEAR_END_JOB_CHOICES = (
+    ('yearly_reset', 'Yearly Leave Reset'),
+    ('carryforward_cleanup', 'Carryforward Cleanup'),
+    ('carryforward_grant', 'Carryforward Grant'),
+)
+
+class YearEndPartition(models.Model):
+    """Idempotency marker for one id-range partition of a parallel year-end job"""
+    job = models.CharField(max_length=50, choices=YEAR_END_JOB_CHOICES)
+    run_key = models.CharField(max_length=50)
+    role = models.CharField(max_length=20, choices=ROLE_CHOICES)
+    start_id = models.BigIntegerField()
+    end_id = models.BigIntegerField()
+    stats = models.JSONField(default=dict, blank=True)
+    completed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'manager_year_end_partition'
+        verbose_name = 'year end partition'
+        verbose_name_plural = 'year end partitions'
+        ordering = ["-id"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['job', 'run_key', 'role', 'start_id'],
+                name='unique_year_end_partition',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.job} {self.run_key} {self.role} {self.start_id}-{self.end_id}"
+
+
+YEAR_END_RUN_STATUS_CHOICES = (
+    ('running', 'Running'),
+    ('completed', 'Completed'),
+)
+
+class YearEndRun(models.Model):
+    """Ledger row for one year-end job per fiscal year; makes repeated triggers a no-op"""
+    job = models.CharField(max_length=50, choices=YEAR_END_JOB_CHOICES)
+    fiscal_year = models.IntegerField()
+    status = models.CharField(max_length=20, choices=YEAR_END_RUN_STATUS_CHOICES, default='running')
+    # Width of the id ranges the run is partitioned into; a resumed run must keep it
+    partition_size = models.PositiveIntegerField(null=True, blank=True)
+    stats = models.JSONField(default=dict, blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_datetime = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'manager_year_end_run'
+        verbose_name = 'year end run'
+        verbose_name_plural = 'year end runs'
+        ordering = ["-id"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['job', 'fiscal_year'],
+                name='unique_year_end_run',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.job} {self.fiscal_year} ({self.status})"
+
+
+LEAVE_EVENT_CHOICES = (
+    ('submitted', 'Submitted'),
+    ('approved', 'Approved'),
+    ('rejected', 'Rejected'),
+    ('cancelled', 'Cancelled'),
+    ('carryforward_applied', 'Carry-forward Applied'),
+    ('deleted', 'Deleted'),
+)
+
+class LeaveEvent(models.Model):
+    """
+    Append-only log of leave state transitions, written in the same
+    transaction as the transition itself.
+
+    Each event carries the deltas it applies to the projections, so balances
+    and pending counters are plain sums over the log. Events are never
+    updated or deleted, and outlive the leave request they describe.
+    """
+    leave = models.ForeignKey(UnifiedLeaveRequest, on_delete=models.DO_NOTHING, db_constraint=False, related_name='events')
+    requester_user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='leave_events')
+    role = models.CharField(max_length=20, choices=ROLE_CHOICES)
+    event_type = models.CharField(max_length=30, choices=LEAVE_EVENT_CHOICES)
+    leave_type = models.CharField(max_length=100, choices=LEAVE_CHOICES, null=True, blank=True)
+    start_date = models.DateField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)
+    # Signed change to the days taken (approvals add, rejections of approved leaves refund)
+    days = models.IntegerField(default=0)
+    # Signed change to the carryforward days taken, part of `days` for annual leave
+    carryforward_days = models.IntegerField(default=0)
+    # +1 when a request enters Pending, -1 when it leaves it
+    pending_delta = models.SmallIntegerField(default=0)
+    actor = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+')
+    occurred_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'leave_event'
+        verbose_name = 'leave event'
+        verbose_name_plural = 'leave events'
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=['leave', 'id'], name='leave_event_leave_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} leave #{self.leave_id}"
+
+
+class LeaveBalanceProjection(models.Model):
+    """Days taken and pending requests per person and leave year, folded from LeaveEvent"""
+    requester_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leave_balance_projections')
+    role = models.CharField(max_length=20, choices=ROLE_CHOICES)
+    year = models.IntegerField()
+    annual_taken = models.IntegerField(default=0)
+    medical_taken = models.IntegerField(default=0)
+    carryforward_taken = models.IntegerField(default=0)
+    pending_requests = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'leave_balance_projection'
+        verbose_name = 'leave balance projection'
+        verbose_name_plural = 'leave balance projections'
+        ordering = ["-year"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['requester_user', 'year'],
+                name='unique_leave_balance_projection',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.requester_user_id} {self.year}"
+
+
+class AbsenceRosterEntry(models.Model):
+    """
+    One row per person and working day covered by an approved leave, folded
+    from LeaveEvent. Being derived data, the foreign keys are not enforced by
+    the database, which keeps replays fast; deletes still cascade in Django.
+    """
+    date = models.DateField()
+    requester_user = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False, related_name='absence_roster')
+    role = models.CharField(max_length=20, choices=ROLE_CHOICES)
+    leave = models.ForeignKey(UnifiedLeaveRequest, on_delete=models.CASCADE, db_constraint=False, related_name='absence_roster')
+    leave_type = models.CharField(max_length=100, choices=LEAVE_CHOICES, null=True, blank=True)
+
+    class Meta:
+        db_table = 'absence_roster'
+        verbose_name = 'absence roster entry'
+        verbose_name_plural = 'absence roster'
+        ordering = ["date"]
+        indexes = [
+            models.Index(fields=['date', 'requester_user'], name='absence_roster_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['leave', 'date'],
+                name='unique_absence_roster_day',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.requester_user_id} {self.date}"
@@ -0,0 +1,135 @@
+"""
+Leave notification emails shared by the views and the Celery tasks
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.template.loader import render_to_string
+
+from .models import Founder, UnifiedLeaveRequest
+
+logger = logging.getLogger(__name__)
+
+# SMTP sends from async views run on this pool, bounding concurrent connections
+MAIL_CONCURRENCY = 4
+_mail_executor = ThreadPoolExecutor(max_workers=MAIL_CONCURRENCY, thread_name_prefix='mail')
+
+
+def founder_emails():
+    """Email addresses of every founder, without duplicates"""
+    emails = []
+    for email in Founder.objects.values_list('user__email', flat=True):
+        if email not in emails:
+            emails.append(email)
+    return emails
+
+
+def build_leave_notification(leave, email_type, recipient_email, manager_name=None, cc_founder=False,
+                             review_url=None, cc_emails=None):
+    """
+    Build the notification email for a leave request, or return None when
+    nobody can receive it.
+    - `leave`: The leave request object (UnifiedLeaveRequest or one of its proxies).
+    - `email_type`: 'new_request', 'approved', 'rejected', or 'submission_confirmation'.
+    - `recipient_email`: The email address of the recipient.
+    - `manager_name`: The name of the manager (for notifications to managers).
+    - `cc_founder`: If True, CC the founder on the email.
+    - `review_url`: Absolute link to the review queue for new requests.
+    - `cc_emails`: Founder emails already looked up by the caller.
+    """
+    if isinstance(leave, UnifiedLeaveRequest) and leave.requester is not None:
+        requester_profile = leave.requester
+        requester_name = requester_profile.user.get_full_name()
+    else:
+        logger.error(f"Unknown leave model type: {type(leave)}")
+        return None
+
+    if email_type in ['new_request', 'new_manager_request']:
+        subject = f"New Leave Request from {requester_name}"
+    elif email_type == 'approved':
+        subject = "Your Leave Request has been Approved"
+    elif email_type == 'rejected':
+        subject = "Your Leave Request has been Rejected"
+    elif email_type == 'cancelled':
+        subject = f"Leave Request Cancelled by {requester_name}"
+    elif email_type == 'submission_confirmation':
+        subject = "Leave Request Submitted Successfully"
+    else:
+        subject = "Leave Request Update"
+
+    html_content = render_to_string('emails/leave_notification.html', {
+        'leave': leave,
+        'employee': requester_profile,
+        'email_type': email_type,
+        'status': leave.status,
+        'manager_name': manager_name,
+        'review_url': review_url,
+    })
+
+    cc_list = []
+    if cc_founder:
+        # CC all founders to ensure every founder account receives the notification
+        cc_list = list(cc_emails) if cc_emails is not None else founder_emails()
+
+    # If it's a new request or a cancellation and the requester has a founder,
+    # that founder should be the primary recipient if no manager is assigned
+    actual_recipient = recipient_email
+    if email_type in ['new_request', 'new_manager_request', 'cancelled']:
+        requester_founder = requester_profile.founder
+
+        if requester_founder:
+            # If we don't have a recipient email (like manager email), or if it's already set to founder
+            # or if recipient_email is a list (like for new_manager_request)
+            if not actual_recipient or actual_recipient == requester_founder.user.email:
+                actual_recipient = requester_founder.user.email
+
+            # If founder is the recipient, we don't need to CC them
+            if isinstance(actual_recipient, str) and actual_recipient == requester_founder.user.email:
+                if actual_recipient in cc_list:
+                    cc_list.remove(actual_recipient)
+            elif isinstance(actual_recipient, (list, tuple)) and requester_founder.user.email in actual_recipient:
+                if requester_founder.user.email in cc_list:
+                    cc_list.remove(requester_founder.user.email)
+
+    # Final check: if we still don't have a recipient but have CCs, use first CC as recipient
+    if not actual_recipient and cc_list:
+        actual_recipient = cc_list.pop(0)
+
+    if not actual_recipient:
+        logger.warning(f"No recipient found for leave notification '{email_type}'")
+        return None
+
+    # Ensure actual_recipient is a list for EmailMessage 'to' field
+    if isinstance(actual_recipient, str):
+        recipient_list = [actual_recipient]
+    elif isinstance(actual_recipient, (list, tuple)):
+        recipient_list = list(actual_recipient)
+    else:
+        recipient_list = [str(actual_recipient)]
+
+    email = EmailMessage(
+        subject,
+        body=html_content,
+        from_email=settings.EMAIL_HOST_USER,
+        to=recipient_list,
+        cc=cc_list
+    )
+    email.content_subtype = 'html'
+    return email
+
+
+async def asend_mail(email):
+    """Send one EmailMessage on the mail pool without blocking the event loop; raises like send()"""
+    return await asyncio.get_running_loop().run_in_executor(_mail_executor, email.send)
+
+
+async def asend_emails(emails):
+    """Send EmailMessages concurrently on the mail pool, logging failures; returns the number sent"""
+    results = await asyncio.gather(*(asend_mail(email) for email in emails), return_exceptions=True)
+    for email, result in zip(emails, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to send email to {email.to}: {result}")
+    return sum(1 for result in results if not isinstance(result, Exception))
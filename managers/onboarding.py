@@ -0,0 +1,360 @@
+"""
+Bulk onboarding of employees and managers from a CSV or XLSX file.
+
+Rows are read and validated one at a time and created in batches: per
+batch, the users, their profiles and the Employe/Manager rows each take one
+bulk_create, and the staff IDs left blank are reserved in one counter
+update. Passwords are hashed in a process pool; people imported without a
+password get an unusable one and set theirs through the reset flow.
+
+bulk_create does not send post_save, so profiles are created here rather
+than by users.models.create_or_update_user_profile.
+"""
+import codecs
+import csv
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from common.utils import reserve_staff_ids
+from employe.models import Employe
+from users.models import Profile, User
+from .models import EMPLOYE_CHOICES, Manager
+
+logger = logging.getLogger(__name__)
+
+# Columns understood in an import file; the header row names them in any order
+IMPORT_COLUMNS = (
+    'role', 'email', 'first_name', 'last_name', 'password', 'phone_number', 'staff_id', 'manager',
+    'department', 'designation', 'date_of_joining', 'employment_type', 'work_location', 'carryforward_granted',
+)
+REQUIRED_COLUMNS = ('email', 'first_name')
+
+# Rows created per transaction
+IMPORT_BATCH_SIZE = 1000
+
+_ROLES = ('employee', 'manager')
+_EMPLOYMENT_TYPES = {key.lower(): key for key, _ in EMPLOYE_CHOICES}
+_EMPLOYMENT_TYPES.update({label.lower(): key for key, label in EMPLOYE_CHOICES})
+
+
+def _column(name):
+    return str(name or '').strip().lower().replace(' ', '_')
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value).strip()
+
+
+def read_people_file(file, name):
+    """
+    Check the header of an import file and return a generator of
+    (row_number, {column: value}) for its non-empty rows. Raises
+    ValidationError for unsupported files and missing columns.
+    """
+    if name.lower().endswith('.csv'):
+        rows = csv.reader(codecs.iterdecode(file, 'utf-8-sig'))
+    elif name.lower().endswith('.xlsx'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValidationError("Reading .xlsx files needs openpyxl (pip install openpyxl).")
+        rows = load_workbook(file, read_only=True, data_only=True).active.iter_rows(values_only=True)
+    else:
+        raise ValidationError("Upload a .csv or .xlsx file.")
+
+    header = [_column(name) for name in next(rows, ())]
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise ValidationError(f"Missing columns: {', '.join(missing)}")
+    return _row_dicts(header, rows)
+
+
+def _row_dicts(header, rows):
+    for number, values in enumerate(rows, start=2):
+        values = [_cell(value) for value in values]
+        if any(values):
+            yield number, dict(zip(header, values))
+
+
+def clean_row(raw):
+    """Validated, typed values of one import row; raises ValidationError listing every problem"""
+    errors = []
+    row = {column: raw.get(column, '') for column in IMPORT_COLUMNS}
+
+    row['role'] = row['role'].lower() or 'employee'
+    if row['role'] not in _ROLES:
+        errors.append(f"Role must be 'employee' or 'manager', not '{row['role']}'.")
+
+    row['email'] = User.objects.normalize_email(row['email'])
+    try:
+        validate_email(row['email'])
+    except ValidationError:
+        errors.append(f"'{row['email']}' is not a valid email address.")
+
+    if not row['first_name']:
+        errors.append("First name is required.")
+
+    if row['password']:
+        try:
+            validate_password(row['password'])
+        except ValidationError as e:
+            errors.extend(e.messages)
+
+    if row['date_of_joining']:
+        try:
+            joined = parse_date(row['date_of_joining'])
+        except ValueError:
+            joined = None
+        if joined is None:
+            errors.append(f"Date of joining '{row['date_of_joining']}' is not a YYYY-MM-DD date.")
+        row['date_of_joining'] = joined
+    else:
+        row['date_of_joining'] = None
+
+    if row['employment_type']:
+        employment_type = _EMPLOYMENT_TYPES.get(row['employment_type'].lower())
+        if employment_type is None:
+            errors.append(f"Unknown employment type '{row['employment_type']}'.")
+        row['employment_type'] = employment_type
+
+    try:
+        row['carryforward_granted'] = int(row['carryforward_granted'] or 0)
+        if row['carryforward_granted'] < 0:
+            raise ValueError
+    except ValueError:
+        errors.append("Carryforward granted must be a whole number of days.")
+
+    if row['role'] == 'manager' and row['manager']:
+        errors.append("Only employees can have a manager.")
+
+    max_lengths = {
+        'first_name': 150, 'last_name': 150, 'phone_number': 15, 'department': 100, 'designation': 100,
+        'work_location': 100, 'staff_id': 20 if row['role'] == 'manager' else 100,
+    }
+    for column, max_length in max_lengths.items():
+        if len(row[column]) > max_length:
+            errors.append(f"{column.replace('_', ' ').capitalize()} is longer than {max_length} characters.")
+
+    if errors:
+        raise ValidationError(errors)
+    return row
+
+
+def _init_hash_worker():
+    # Spawned workers start without Django configured
+    import django
+    django.setup()
+
+
+class PeopleImporter:
+    """
+    Create the people of an import file in batches, collecting per-row errors.
+    - `founder`: Founder the new people are linked to, if any
+    - `created_by`: user recorded as creating the profiles
+    - `workers`: password hashing processes (default: one per CPU)
+    - `dry_run`: validate, including against the database, but create nothing
+    """
+
+    def __init__(self, founder=None, created_by=None, batch_size=IMPORT_BATCH_SIZE, workers=None, dry_run=False):
+        self.founder = founder
+        self.created_by = created_by
+        self.batch_size = batch_size
+        self.workers = workers
+        self.dry_run = dry_run
+        self.stats = {'rows': 0, 'employees': 0, 'managers': 0, 'errors': []}
+        self._seen = set()
+        self._pool = None
+        # Manager ID / lowercased email -> (manager pk, founder pk), for the `manager` column
+        self._managers = {}
+        for pk, manager_id, email, founder_id in Manager.objects.values_list(
+            'pk', 'manager_id', 'user__email', 'founder_id'
+        ).iterator():
+            if manager_id:
+                self._managers[manager_id.lower()] = (pk, founder_id)
+            self._managers[email.lower()] = (pk, founder_id)
+
+    def run(self, rows):
+        """Import (row_number, {column: value}) rows and return the stats"""
+        batch = []
+        try:
+            for number, raw in rows:
+                self.stats['rows'] += 1
+                try:
+                    batch.append((number, self._clean(raw)))
+                except ValidationError as e:
+                    self._error(number, e.messages)
+                if len(batch) >= self.batch_size:
+                    self._flush(batch)
+                    batch = []
+            if batch:
+                self._flush(batch)
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+        self.stats['errors'].sort()
+        return self.stats
+
+    def _error(self, number, messages):
+        self.stats['errors'].append((number, ' '.join(messages)))
+
+    def _clean(self, raw):
+        row = clean_row(raw)
+        keys = [('email', row['email'].lower())]
+        if row['staff_id']:
+            keys.append(('staff_id', row['staff_id'].lower()))
+        for kind, key in keys:
+            if key in self._seen:
+                raise ValidationError(f"Duplicate {kind.replace('_', ' ')} '{key}' earlier in the file.")
+        self._seen.update(key for _, key in keys)
+        return row
+
+    def _flush(self, batch):
+        batch = self._drop_existing(batch)
+        batch = self._resolve_managers(batch)
+        if not batch:
+            return
+        if self.dry_run:
+            for _, row in batch:
+                self.stats[f"{row['role']}s"] += 1
+                if row['role'] == 'manager':
+                    self._managers[row['email'].lower()] = (None, None)
+                    if row['staff_id']:
+                        self._managers[row['staff_id'].lower()] = (None, None)
+            return
+        try:
+            self._create(batch)
+        except DatabaseError as e:
+            logger.error(f"People import batch failed: {e}")
+            for number, _ in batch:
+                self._error(number, [f"Not imported, the batch failed: {e}"])
+
+    def _drop_existing(self, batch):
+        """Rows whose email or staff ID is not taken yet"""
+        emails = set(User.objects.filter(email__in=[row['email'] for _, row in batch]).values_list('email', flat=True))
+        staff_ids = [row['staff_id'] for _, row in batch if row['staff_id']]
+        taken_ids = set(Employe.objects.filter(employe_id__in=staff_ids).values_list('employe_id', flat=True))
+        taken_ids.update(Manager.objects.filter(manager_id__in=staff_ids).values_list('manager_id', flat=True))
+
+        kept = []
+        for number, row in batch:
+            if row['email'] in emails:
+                self._error(number, [f"A user with email '{row['email']}' already exists."])
+            elif row['staff_id'] in taken_ids:
+                self._error(number, [f"Staff ID '{row['staff_id']}' is already in use."])
+            else:
+                kept.append((number, row))
+        return kept
+
+    def _resolve_managers(self, batch):
+        """Rows whose `manager` is an existing manager or a manager row of this or an earlier batch"""
+        batch_managers = set()
+        for _, row in batch:
+            if row['role'] == 'manager':
+                batch_managers.add(row['email'].lower())
+                if row['staff_id']:
+                    batch_managers.add(row['staff_id'].lower())
+
+        kept = []
+        for number, row in batch:
+            reference = row['manager'].lower()
+            if reference and reference not in self._managers and reference not in batch_managers:
+                self._error(number, [f"No manager with ID or email '{row['manager']}'."])
+            else:
+                kept.append((number, row))
+        return kept
+
+    def _hash_passwords(self, passwords):
+        if not passwords:
+            return []
+        workers = self.workers or os.cpu_count() or 1
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_hash_worker)
+        chunksize = max(1, len(passwords) // (workers * 4))
+        return list(self._pool.map(make_password, passwords, chunksize=chunksize))
+
+    def _create(self, batch):
+        rows = [row for _, row in batch]
+        hashes = iter(self._hash_passwords([row['password'] for row in rows if row['password']]))
+        today = timezone.now().date()
+
+        with transaction.atomic():
+            for role, kind in (('employee', 'employee'), ('manager', 'manager')):
+                blank = [row for row in rows if row['role'] == role and not row['staff_id']]
+                for row, staff_id in zip(blank, reserve_staff_ids(kind, len(blank)) if blank else []):
+                    row['staff_id'] = staff_id
+
+            users = User.objects.bulk_create([
+                User(
+                    username=row['email'],
+                    email=row['email'],
+                    first_name=row['first_name'],
+                    last_name=row['last_name'],
+                    phone_number=row['phone_number'] or None,
+                    password=next(hashes) if row['password'] else make_password(None),
+                    is_manager=row['role'] == 'manager',
+                    is_employee=row['role'] == 'employee',
+                )
+                for row in rows
+            ], batch_size=self.batch_size)
+            Profile.objects.bulk_create([
+                Profile(user=user, designation=row['designation'] or None, department=row['department'] or None)
+                for user, row in zip(users, rows)
+            ], batch_size=self.batch_size)
+
+            def profile_fields(user, row):
+                # Carryforward granted now can still be used if the import runs within Jan-Mar
+                return dict(
+                    user=user,
+                    department=row['department'] or None,
+                    designation=row['designation'] or None,
+                    date_of_joining=row['date_of_joining'],
+                    employment_Type=row['employment_type'] or None,
+                    work_location=row['work_location'] or None,
+                    carryforward_granted=row['carryforward_granted'],
+                    carryforward_available_leaves=row['carryforward_granted'] if today.month <= 3 else 0,
+                    created_by=self.created_by,
+                )
+
+            founder_id = self.founder.pk if self.founder else None
+            managers = Manager.objects.bulk_create([
+                Manager(manager_id=row['staff_id'], founder_id=founder_id, **profile_fields(user, row))
+                for user, row in zip(users, rows) if row['role'] == 'manager'
+            ], batch_size=self.batch_size)
+            batch_managers = {}
+            for manager in managers:
+                batch_managers[manager.manager_id.lower()] = (manager.pk, founder_id)
+                batch_managers[manager.user.email.lower()] = (manager.pk, founder_id)
+
+            employees = []
+            for user, row in zip(users, rows):
+                if row['role'] != 'employee':
+                    continue
+                reference = row['manager'].lower()
+                manager_pk, manager_founder_id = batch_managers.get(reference) or self._managers.get(reference, (None, None))
+                employees.append(Employe(
+                    employe_id=row['staff_id'],
+                    manager_id=manager_pk,
+                    founder_id=manager_founder_id or founder_id,
+                    **profile_fields(user, row),
+                ))
+            Employe.objects.bulk_create(employees, batch_size=self.batch_size)
+
+        self._managers.update(batch_managers)
+        self.stats['managers'] += len(managers)
+        self.stats['employees'] += len(employees)
@@ -0,0 +1,135 @@
+"""
+Device push notifications for leave events, sent through fcm_django.
+
+Every leave transition recorded in the event log queues one Celery task
+after the transaction commits. The task builds one message per recipient
+device and sends them through FCM in batches of up to 500 messages per
+call. Tokens that FCM reports as unregistered or invalid are pruned from
+FCMDevice.
+"""
+import logging
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from fcm_django.models import MAX_MESSAGES_PER_BATCH, FCMDevice
+from firebase_admin import messaging
+
+from .models import Founder, UnifiedLeaveRequest
+
+logger = logging.getLogger(__name__)
+
+# Messages per FCM batch call; 500 is the limit set by Firebase
+PUSH_BATCH_SIZE = MAX_MESSAGES_PER_BATCH
+
+# Leave events that are pushed to devices
+PUSH_EVENTS = ('submitted', 'approved', 'rejected', 'cancelled')
+
+
+@lru_cache(maxsize=1)
+def firebase_app():
+    """Firebase app used for FCM, initialised once per worker process"""
+    import firebase_admin
+    from firebase_admin import credentials
+
+    try:
+        return firebase_admin.get_app()
+    except ValueError:
+        certificate = None
+        if settings.FIREBASE_CREDENTIALS_FILE:
+            certificate = credentials.Certificate(settings.FIREBASE_CREDENTIALS_FILE)
+        return firebase_admin.initialize_app(certificate)
+
+
+def queue_leave_pushes(events):
+    """Queue the push task for recorded LeaveEvents once the transaction commits"""
+    if not settings.PUSH_NOTIFICATIONS_ENABLED:
+        return
+    transitions = [[event.leave_id, event.event_type] for event in events if event.event_type in PUSH_EVENTS]
+    if not transitions:
+        return
+
+    def enqueue():
+        from .tasks import send_leave_push_notifications
+
+        try:
+            send_leave_push_notifications.delay(transitions)
+        except Exception as e:
+            logger.error(f"Failed to queue leave push notifications: {e}")
+
+    transaction.on_commit(enqueue)
+
+
+def leave_push_recipients(leave, event_type, founder_user_ids):
+    """User ids to notify: the requester for decisions, otherwise the approvers"""
+    if event_type in ('approved', 'rejected'):
+        return {leave.requester_user_id}
+    if leave.requested_by_role == 'employee' and leave.employee.manager_id:
+        return {leave.employee.manager.user_id} | founder_user_ids
+    return set(founder_user_ids)
+
+
+def build_leave_push(leave, event_type):
+    """(title, body, data) of the push for one leave event"""
+    requester_name = leave.requester.user.get_full_name()
+    if event_type == 'submitted':
+        title = f"New Leave Request from {requester_name}"
+    elif event_type == 'approved':
+        title = "Your Leave Request has been Approved"
+    elif event_type == 'rejected':
+        title = "Your Leave Request has been Rejected"
+    else:
+        title = f"Leave Request Cancelled by {requester_name}"
+
+    body = f"{leave.get_leave_type_display()}: {leave.start_date:%d %b %Y} - {leave.end_date:%d %b %Y}"
+    data = {'leave_request': str(leave.pk), 'event': event_type, 'status': leave.status}
+    return title, body, data
+
+
+def send_leave_pushes(transitions):
+    """
+    Push [leave_id, event_type] transitions to every active device of their
+    recipients. Returns counts of sent, failed and pruned messages.
+    """
+    leaves = UnifiedLeaveRequest.objects.select_related(
+        'employee__user', 'employee__manager', 'manager__user'
+    ).in_bulk([leave_id for leave_id, _ in transitions])
+    founder_user_ids = set(Founder.objects.values_list('user_id', flat=True))
+
+    pushes = []
+    for leave_id, event_type in transitions:
+        leave = leaves.get(leave_id)
+        if leave is None or leave.requester is None:
+            continue
+        recipients = leave_push_recipients(leave, event_type, founder_user_ids) - {None}
+        pushes.append((build_leave_push(leave, event_type), recipients))
+
+    user_ids = set().union(*(recipients for _, recipients in pushes))
+    devices = FCMDevice.objects.filter(user_id__in=user_ids)
+    tokens = defaultdict(list)
+    for user_id, registration_id in devices.filter(active=True).values_list('user_id', 'registration_id'):
+        tokens[user_id].append(registration_id)
+
+    messages = []
+    for (title, body, data), recipients in pushes:
+        for user_id in recipients:
+            for token in tokens[user_id]:
+                messages.append(messaging.Message(
+                    token=token,
+                    notification=messaging.Notification(title=title, body=body),
+                    data=data,
+                ))
+
+    stats = {'sent': 0, 'failed': 0, 'pruned': 0}
+    for i in range(0, len(messages), PUSH_BATCH_SIZE):
+        batch = messages[i:i + PUSH_BATCH_SIZE]
+        response = messaging.send_all(batch, app=firebase_app())
+        # Deactivates, and with DELETE_INACTIVE_DEVICES deletes, the rejected tokens
+        pruned = devices.deactivate_devices_with_error_results(
+            [message.token for message in batch], response.responses
+        )
+        stats['sent'] += response.success_count
+        stats['failed'] += response.failure_count
+        stats['pruned'] += len(pruned)
+    return stats
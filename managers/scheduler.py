@@ -8,6 +8,11 @@ Usage:
 1. Install APScheduler: pip install apscheduler
 2. Add this to your Django app startup (apps.py or management command)
 3. Run your Django server normally
+
+Without a broker the year-end jobs run inline through the
+process_carryforward_leaves command. Where a Celery worker is running, pass
+dispatch_to_celery=True to fan them out over partitions with run_year_end_job
+instead.
 """
 
 import logging
@@ -32,7 +37,7 @@ class LeaveManagementScheduler:
     APScheduler-based scheduler for leave management tasks
     """
     
-    def __init__(self):
+    def __init__(self, dispatch_to_celery=False):
         if not APSCHEDULER_AVAILABLE:
             raise ImportError("APScheduler is not installed. Run: pip install apscheduler")
         
@@ -47,6 +52,7 @@ class LeaveManagementScheduler:
             'misfire_grace_time': 3600  # 1 hour grace time
         }
         
+        self.dispatch_to_celery = dispatch_to_celery
         self.scheduler = BackgroundScheduler(
             executors=executors,
             job_defaults=job_defaults,
@@ -98,7 +104,11 @@ class LeaveManagementScheduler:
         """Grant carryforward leaves on December 31st"""
         try:
             logger.info("Starting scheduled carryforward grant process...")
-            call_command('process_carryforward_leaves', action='grant')
+            if self.dispatch_to_celery:
+                from managers.tasks import run_year_end_job
+                run_year_end_job.delay('carryforward_grant')
+            else:
+                call_command('process_carryforward_leaves', action='grant')
             logger.info("Scheduled carryforward grant completed successfully")
         except Exception as e:
             logger.error(f"Scheduled carryforward grant failed: {e}")
@@ -107,7 +117,11 @@ class LeaveManagementScheduler:
         """Cleanup carryforward leaves on March 31st"""
         try:
             logger.info("Starting scheduled carryforward cleanup process...")
-            call_command('process_carryforward_leaves', action='cleanup')
+            if self.dispatch_to_celery:
+                from managers.tasks import run_year_end_job
+                run_year_end_job.delay('carryforward_cleanup')
+            else:
+                call_command('process_carryforward_leaves', action='cleanup')
             logger.info("Scheduled carryforward cleanup completed successfully")
         except Exception as e:
             logger.error(f"Scheduled carryforward cleanup failed: {e}")
@@ -173,17 +187,17 @@ class LeaveManagementScheduler:
 _scheduler = None
 
 
-def get_scheduler():
+def get_scheduler(dispatch_to_celery=False):
     """Get the global scheduler instance"""
     global _scheduler
     if _scheduler is None:
-        _scheduler = LeaveManagementScheduler()
+        _scheduler = LeaveManagementScheduler(dispatch_to_celery=dispatch_to_celery)
     return _scheduler
 
 
-def start_scheduler():
+def start_scheduler(dispatch_to_celery=False):
     """Start the leave management scheduler"""
-    scheduler = get_scheduler()
+    scheduler = get_scheduler(dispatch_to_celery)
     scheduler.start()
     return scheduler
 
@@ -8,17 +8,33 @@ from django.core.mail import send_mail
 from django.core.management import call_command
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
-from celery import shared_task
-from django.db import transaction
-
-from .models import Manager, Founder
+from django.utils import timezone
+from celery import chord, shared_task
+
+from .models import Manager, Founder, YearEndPartition, YearEndRun
+from .year_end import (
+    PROFILE_MODELS,
+    YEAR_END_PARTITION_SIZE,
+    YearEndPartitionSizeMismatch,
+    apply_year_end_partition,
+    claim_year_end_run,
+    complete_year_end_run,
+    current_fiscal_year,
+    merge_partition_stats,
+    run_year_end_job_inline,
+    year_end_lock,
+    year_end_partitions,
+)
 from employe.models import Employe
 
 logger = logging.getLogger(__name__)
 
+# Number of people recalculated per chunk when verifying leave counts
+VERIFY_CHUNK_SIZE = 500
+
 
 @shared_task(bind=True, max_retries=3)
-def yearly_leave_reset(self):
+def yearly_leave_reset(self, fiscal_year=None, inline=False):
     """
     Automated yearly leave reset task - runs on December 31st
     
@@ -27,92 +43,81 @@ def yearly_leave_reset(self):
     - Reset available_leaves = 18
     - Reset leaves_taken = 0
     - Reset available_medical_leaves = 14
+
+    Each profile table is reset with set-based UPDATEs over id-range
+    partitions, fanned out as a chord by run_year_end_job whose callback
+    merges the partition stats and sends the notification. With inline=True
+    the partitions are applied one after another inside this task instead,
+    for workers that cannot fan out.
+
+    The run is recorded in the YearEndRun ledger, so a retried or duplicate
+    trigger for the same year is a no-op. The fiscal year is fixed by the
+    first attempt and passed on to retries, which may run after midnight on
+    January 1st.
     """
+    fiscal_year = fiscal_year or current_fiscal_year()
     try:
-        with transaction.atomic():
-            # Get configuration
-            config = settings.LEAVE_MANAGEMENT_CONFIG
-            annual_allocation = config['ANNUAL_LEAVE_ALLOCATION']
-            medical_allocation = config['MEDICAL_LEAVE_ALLOCATION']
-            carryforward_limit = config['CARRYFORWARD_LIMIT']
-            eligibility_threshold = config['CARRYFORWARD_ELIGIBILITY_THRESHOLD']
-            
-            # Process all employees
-            employees = Employe.objects.all()
-            managers = Manager.objects.all()
-            
-            stats = {
-                'total_employees': 0,
-                'total_managers': 0,
-                'employees_with_carryforward': 0,
-                'managers_with_carryforward': 0,
-                'total_carryforward_leaves': 0,
-            }
-            
-            # Process employees
-            for employee in employees:
-                stats['total_employees'] += 1
-                
-                # Check carryforward eligibility
-                if employee.available_leaves >= eligibility_threshold:
-                    employee.carryforward_available_leaves = carryforward_limit
-                    employee.carryforward_granted = carryforward_limit
-                    stats['employees_with_carryforward'] += 1
-                    stats['total_carryforward_leaves'] += carryforward_limit
-                else:
-                    employee.carryforward_available_leaves = 0
-                    employee.carryforward_granted = 0
-                
-                # Reset yearly allocations
-                employee.available_leaves = annual_allocation
-                employee.leaves_taken = 0
-                employee.available_medical_leaves = medical_allocation
-                employee.medical_leaves_taken = 0
-                employee.carryforward_leaves_taken = 0
-                
-                employee.save()
-            
-            # Process managers
-            for manager in managers:
-                stats['total_managers'] += 1
-                
-                # Check carryforward eligibility
-                if manager.available_leaves >= eligibility_threshold:
-                    manager.carryforward_available_leaves = carryforward_limit
-                    manager.carryforward_granted = carryforward_limit
-                    stats['managers_with_carryforward'] += 1
-                    stats['total_carryforward_leaves'] += carryforward_limit
-                else:
-                    manager.carryforward_available_leaves = 0
-                    manager.carryforward_granted = 0
-                
-                # Reset yearly allocations
-                manager.available_leaves = annual_allocation
-                manager.leaves_taken = 0
-                manager.available_medical_leaves = medical_allocation
-                manager.medical_leaves_taken = 0
-                manager.carryforward_leaves_taken = 0
-                
-                manager.save()
-            
-            # Send notification emails
-            send_yearly_reset_notification.delay(stats)
-            
-            logger.info(f"Yearly leave reset completed successfully. Stats: {stats}")
+        if not inline:
+            return run_year_end_job('yearly_reset', fiscal_year=fiscal_year)
+
+        stats = run_year_end_job_inline('yearly_reset', fiscal_year=fiscal_year)
+        if stats is None:
             return {
-                'status': 'success',
-                'message': 'Yearly leave reset completed successfully',
-                'stats': stats
+                'status': 'skipped',
+                'message': 'Yearly leave reset already completed or in progress for this year',
             }
-            
+
+        # Send notification emails
+        send_yearly_reset_notification.delay(stats)
+
+        logger.info(f"Yearly leave reset completed successfully. Stats: {stats}")
+        return {
+            'status': 'success',
+            'message': 'Yearly leave reset completed successfully',
+            'stats': stats
+        }
+
     except Exception as exc:
         logger.error(f"Yearly leave reset failed: {exc}")
-        # Retry the task
-        raise self.retry(exc=exc, countdown=60)
+        # Retry the task for the same fiscal year
+        raise self.retry(exc=exc, countdown=60, kwargs={'fiscal_year': fiscal_year, 'inline': inline})
+
+
+def leave_count_verification_chunks(chunk_size=VERIFY_CHUNK_SIZE):
+    """
+    Yield (role, [ids]) chunks covering every employee and manager, used to
+    fan the per-person recalculate_leave_counts() out in parallel.
+    """
+    for role, model in PROFILE_MODELS:
+        ids = model.objects.order_by('id').values_list('id', flat=True)
+        chunk = []
+        for profile_id in ids.iterator(chunk_size=chunk_size):
+            chunk.append(profile_id)
+            if len(chunk) >= chunk_size:
+                yield role, chunk
+                chunk = []
+        if chunk:
+            yield role, chunk
+
+
+def recalculate_leave_counts_for_ids(role, ids):
+    """Run the full per-person recalculate_leave_counts() for one chunk of ids."""
+    model = dict(PROFILE_MODELS)[role]
+    processed = 0
+    for profile in model.objects.filter(id__in=ids).iterator():
+        profile.recalculate_leave_counts()
+        processed += 1
+    return processed
+
+
+@shared_task
+def recalculate_leave_counts_chunk(role, ids):
+    """Celery wrapper around recalculate_leave_counts_for_ids()"""
+    return recalculate_leave_counts_for_ids(role, ids)
 
 
 @shared_task(bind=True, max_retries=3)
-def carryforward_cleanup(self):
+def carryforward_cleanup(self, verify=False, fiscal_year=None, inline=False):
     """
     Carryforward cleanup task - runs on March 31st
     
@@ -120,63 +125,60 @@ def carryforward_cleanup(self):
     - Set carryforward_available_leaves = 0
     - Set carryforward_leaves_taken = 0
     - If available_leaves > 18, reset to 18
+
+    With verify=True every person's balance is first recomputed from their
+    approved leave history (in parallel chunks), and the set-based cleanup
+    runs once all chunks have finished. As with yearly_leave_reset, the
+    cleanup is fanned out over partitions by run_year_end_job unless
+    inline=True, and the fiscal year of the first attempt is passed on to the
+    retries.
     """
-    try:
-        with transaction.atomic():
-            config = settings.LEAVE_MANAGEMENT_CONFIG
-            annual_allocation = config['ANNUAL_LEAVE_ALLOCATION']
-            
-            # Process all employees
-            employees = Employe.objects.all()
-            managers = Manager.objects.all()
-            
-            stats = {
-                'total_employees': 0,
-                'total_managers': 0,
-                'employees_cleaned': 0,
-                'managers_cleaned': 0,
-                'total_leaves_forfeited': 0,
+    fiscal_year = fiscal_year or current_fiscal_year()
+    if verify and YearEndRun.objects.filter(
+        job='carryforward_cleanup', fiscal_year=fiscal_year, status='completed'
+    ).exists():
+        logger.info("Carryforward cleanup already completed this year, skipping verification")
+        verify = False
+
+    if verify:
+        chunks = [
+            recalculate_leave_counts_chunk.s(role, ids)
+            for role, ids in leave_count_verification_chunks()
+        ]
+        if chunks:
+            chord(chunks)(carryforward_cleanup.si(fiscal_year=fiscal_year, inline=inline))
+            logger.info(f"Carryforward cleanup scheduled after {len(chunks)} verification chunks")
+            return {
+                'status': 'scheduled',
+                'message': 'Carryforward cleanup will run after leave count verification',
+                'chunks': len(chunks),
             }
-            
-            # Process employees
-            for employee in employees:
-                stats['total_employees'] += 1
-                
-                # Track forfeited leaves
-                if employee.carryforward_available_leaves > 0:
-                    stats['total_leaves_forfeited'] += employee.carryforward_available_leaves
-                    stats['employees_cleaned'] += 1
-                
-                # Cleanup carryforward using recalculate_leave_counts
-                # This will set carryforward_available_leaves to 0 because current date is March 31st
-                employee.recalculate_leave_counts()
-            
-            # Process managers
-            for manager in managers:
-                stats['total_managers'] += 1
-                
-                # Track forfeited leaves
-                if manager.carryforward_available_leaves > 0:
-                    stats['total_leaves_forfeited'] += manager.carryforward_available_leaves
-                    stats['managers_cleaned'] += 1
-                
-                # Cleanup carryforward using recalculate_leave_counts
-                manager.recalculate_leave_counts()
-            
-            # Send notification emails
-            send_carryforward_cleanup_notification.delay(stats)
-            
-            logger.info(f"Carryforward cleanup completed successfully. Stats: {stats}")
+
+    try:
+        if not inline:
+            return run_year_end_job('carryforward_cleanup', fiscal_year=fiscal_year)
+
+        stats = run_year_end_job_inline('carryforward_cleanup', fiscal_year=fiscal_year)
+        if stats is None:
             return {
-                'status': 'success',
-                'message': 'Carryforward cleanup completed successfully',
-                'stats': stats
+                'status': 'skipped',
+                'message': 'Carryforward cleanup already completed or in progress for this year',
             }
-            
+
+        # Send notification emails
+        send_carryforward_cleanup_notification.delay(stats)
+
+        logger.info(f"Carryforward cleanup completed successfully. Stats: {stats}")
+        return {
+            'status': 'success',
+            'message': 'Carryforward cleanup completed successfully',
+            'stats': stats
+        }
+
     except Exception as exc:
         logger.error(f"Carryforward cleanup failed: {exc}")
-        # Retry the task
-        raise self.retry(exc=exc, countdown=60)
+        # Retry the task for the same fiscal year
+        raise self.retry(exc=exc, countdown=60, kwargs={'verify': False, 'fiscal_year': fiscal_year, 'inline': inline})
 
 
 @shared_task
@@ -353,6 +355,245 @@ def send_carryforward_reminder_notification(stats):
         logger.error(f"Failed to send carryforward reminder notification: {exc}")
 
 
+@shared_task
+def send_leave_notifications_batch(model_label, leave_ids, email_type):
+    """
+    Send the approved/rejected emails for a bulk leave action as one batch,
+    over a single SMTP connection.
+    """
+    from django.apps import apps
+    from django.core.mail import get_connection
+    from .notifications import build_leave_notification, founder_emails
+
+    model = apps.get_model(model_label)
+    leaves = model.objects.filter(id__in=leave_ids).select_related('employee__user', 'manager__user')
+
+    cc_emails = founder_emails()
+    emails = []
+    for leave in leaves:
+        email = build_leave_notification(
+            leave, email_type, leave.requester.user.email,
+            cc_founder=True, cc_emails=cc_emails,
+        )
+        if email is not None:
+            emails.append(email)
+
+    try:
+        sent = get_connection().send_messages(emails) if emails else 0
+        logger.info(f"Sent {sent} '{email_type}' leave notifications")
+        return sent
+    except Exception as exc:
+        logger.error(f"Failed to send '{email_type}' leave notifications: {exc}")
+
+
+@shared_task
+def send_leave_submission_notifications(model_label, leave_id, review_url=None):
+    """
+    Send the 'new_request' email to the requester's manager (or founder) and
+    the submission confirmation to the requester, over a single SMTP
+    connection.
+    """
+    from django.apps import apps
+    from django.core.mail import get_connection
+    from .notifications import build_leave_notification
+
+    model = apps.get_model(model_label)
+    leave = model.objects.filter(pk=leave_id).select_related(
+        'employee__user', 'employee__manager__user', 'manager__user'
+    ).first()
+    if leave is None:
+        return 0
+
+    manager_user = None
+    if leave.requested_by_role == 'employee' and leave.employee.manager and leave.employee.manager.user.email:
+        manager_user = leave.employee.manager.user
+
+    emails = [
+        build_leave_notification(
+            leave, 'new_request', manager_user.email if manager_user else None,
+            manager_name=manager_user.get_full_name() if manager_user else None,
+            cc_founder=True, review_url=review_url,
+        ),
+        build_leave_notification(leave, 'submission_confirmation', leave.requester.user.email),
+    ]
+    emails = [email for email in emails if email is not None]
+
+    try:
+        sent = get_connection().send_messages(emails) if emails else 0
+        logger.info(f"Sent {sent} submission notifications for leave {leave_id}")
+        return sent
+    except Exception as exc:
+        logger.error(f"Failed to send submission notifications for leave {leave_id}: {exc}")
+
+
+@shared_task(bind=True, max_retries=3)
+def send_leave_push_notifications(self, transitions):
+    """
+    Push leave events to the devices of the people they concern, in FCM
+    batches of up to 500 messages, pruning tokens FCM rejects.
+    - `transitions`: [leave_id, event_type] pairs
+    """
+    from firebase_admin.exceptions import FirebaseError
+    from .push import send_leave_pushes
+
+    try:
+        stats = send_leave_pushes(transitions)
+        logger.info(f"Leave push notifications: {stats}")
+        return stats
+    except FirebaseError as exc:
+        logger.error(f"Failed to send leave push notifications: {exc}")
+        raise self.retry(exc=exc, countdown=30)
+
+
+
+@shared_task(bind=True, max_retries=3)
+def add_leaves_to_google_calendars(self, leave_ids, only=None):
+    """
+    Add approved leaves to their approvers' Google Calendars through batched
+    API requests. Inserts that hit a rate limit or server error are retried
+    with backoff; the calendars that already have the event are not touched.
+    - `only`: [leave_id, calendar_email] pairs left over from the last attempt
+    """
+    from httplib2 import HttpLib2Error
+    from .google_calendar_service import add_leaves_to_calendars
+
+    try:
+        stats, retry = add_leaves_to_calendars(leave_ids, only)
+    except (HttpLib2Error, OSError) as exc:
+        logger.error(f"Google Calendar sync failed: {exc}")
+        raise self.retry(exc=exc, countdown=60 * 2 ** self.request.retries)
+
+    logger.info(f"Google Calendar sync: {stats}")
+    if retry:
+        logger.warning(f"Retrying {len(retry)} Google Calendar inserts")
+        raise self.retry(args=[leave_ids], kwargs={'only': retry}, countdown=60 * 2 ** self.request.retries)
+    return stats
+
+
+@shared_task(bind=True, max_retries=3)
+def sync_team_leave_calendar(self, leave_ids):
+    """
+    Upsert or delete the Team Leave calendar events of the given leaves to
+    match their current status, in batched API requests. Leaves whose call
+    hit a rate limit or server error are retried with backoff.
+    """
+    from httplib2 import HttpLib2Error
+    from .google_calendar_service import sync_team_calendar
+
+    try:
+        stats, retry = sync_team_calendar(leave_ids)
+    except (HttpLib2Error, OSError) as exc:
+        logger.error(f"Team Leave calendar sync failed: {exc}")
+        raise self.retry(exc=exc, countdown=60 * 2 ** self.request.retries)
+
+    logger.info(f"Team Leave calendar sync: {stats}")
+    if retry:
+        logger.warning(f"Retrying {len(retry)} Team Leave calendar updates")
+        raise self.retry(args=[retry], countdown=60 * 2 ** self.request.retries)
+    return stats
+
+# ==================== PARALLEL YEAR-END TASKS ====================
+
+@shared_task(bind=True, max_retries=3)
+def process_year_end_partition(self, job, role, start_id, end_id, fiscal_year, total_partitions):
+    """
+    Apply a year-end job to one id range of employees or managers.
+
+    The partition checkpoint makes a retried or duplicated partition return
+    the stats it recorded the first time instead of applying the job again.
+    """
+    try:
+        result = apply_year_end_partition(job, role, start_id, end_id, fiscal_year)
+
+        # Heartbeat so a run that is still making progress is not treated as stale
+        YearEndRun.objects.filter(job=job, fiscal_year=fiscal_year, status='running').update(
+            updated_datetime=timezone.now()
+        )
+
+        completed = YearEndPartition.objects.filter(job=job, run_key=str(fiscal_year)).count()
+        logger.info(
+            f"Year-end {job} partition {role} {start_id}-{end_id} done "
+            f"({completed}/{total_partitions} partitions for {fiscal_year})"
+        )
+        return result
+
+    except Exception as exc:
+        logger.error(f"Year-end {job} partition {role} {start_id}-{end_id} failed: {exc}")
+        raise self.retry(exc=exc, countdown=60)
+
+
+@shared_task
+def merge_year_end_stats(results, job, fiscal_year):
+    """Chord callback: merge partition stats, close the run and send the job's notification"""
+    stats = merge_partition_stats(job, results)
+
+    run = YearEndRun.objects.get(job=job, fiscal_year=fiscal_year)
+    if not complete_year_end_run(run, stats):
+        logger.info(f"Year-end {job} for {fiscal_year} was already completed, not notifying again")
+        return {
+            'status': 'skipped',
+            'message': f'Year-end {job} for {fiscal_year} was already completed',
+            'fiscal_year': fiscal_year,
+        }
+
+    if job == 'carryforward_cleanup':
+        send_carryforward_cleanup_notification.delay(stats)
+    else:
+        send_yearly_reset_notification.delay(stats)
+
+    logger.info(f"Parallel year-end {job} for {fiscal_year} completed. Stats: {stats}")
+    return {
+        'status': 'success',
+        'message': f'Parallel year-end {job} completed successfully',
+        'fiscal_year': fiscal_year,
+        'stats': stats,
+    }
+
+
+@shared_task
+def run_year_end_job(job, fiscal_year=None, partition_size=YEAR_END_PARTITION_SIZE):
+    """
+    Fan a year-end job ('yearly_reset', 'carryforward_cleanup' or
+    'carryforward_grant') out over id-range partitions of employees and
+    managers, and merge the partition stats in merge_year_end_stats.
+
+    The run is claimed in the YearEndRun ledger under an advisory lock, so a
+    trigger for a job that already completed this fiscal year, or that is
+    still running, is a no-op. A run that stopped making progress is
+    dispatched again and resumes from its partition checkpoints.
+    """
+    fiscal_year = fiscal_year or current_fiscal_year()
+
+    with year_end_lock(job, fiscal_year) as acquired:
+        if not acquired:
+            logger.info(f"Year-end {job} for {fiscal_year} is being dispatched by another process")
+            return {'status': 'skipped', 'job': job, 'fiscal_year': fiscal_year}
+
+        try:
+            run = claim_year_end_run(job, fiscal_year, partition_size, allow_in_progress=False)
+        except YearEndPartitionSizeMismatch as e:
+            logger.error(str(e))
+            return {'status': 'error', 'job': job, 'fiscal_year': fiscal_year, 'message': str(e)}
+        if run is None:
+            return {'status': 'skipped', 'job': job, 'fiscal_year': fiscal_year}
+
+        partitions = year_end_partitions(partition_size)
+        header = [
+            process_year_end_partition.s(job, role, start_id, end_id, fiscal_year, len(partitions))
+            for role, start_id, end_id in partitions
+        ]
+        result = chord(header)(merge_year_end_stats.s(job, fiscal_year))
+
+    logger.info(f"Scheduled year-end {job} for {fiscal_year} across {len(partitions)} partitions")
+    return {
+        'status': 'scheduled',
+        'job': job,
+        'fiscal_year': fiscal_year,
+        'partitions': len(partitions),
+        'result_id': result.id,
+    }
+
+
 # ==================== MANUAL TRIGGER TASKS ====================
 
 @shared_task
@@ -372,41 +613,27 @@ def manual_carryforward_cleanup():
 @shared_task
 def process_yearly_carryforward_grant():
     """
-    Celery task to grant carryforward leaves on December 31st using management command
+    Celery task to grant carryforward leaves on December 31st
     This task should be scheduled to run on December 31st at midnight
-    """
-    try:
-        logger.info("Starting yearly carryforward grant process via management command...")
 
-        # Call the management command
-        call_command('process_carryforward_leaves', action='grant')
-
-        logger.info("Yearly carryforward grant process completed successfully")
-        return "Carryforward leaves granted successfully via management command"
-
-    except Exception as e:
-        logger.error(f"Error in yearly carryforward grant process: {e}")
-        raise
+    The grant is fanned out over id-range partitions by run_year_end_job.
+    The process_carryforward_leaves command is the inline alternative.
+    """
+    logger.info("Starting yearly carryforward grant process...")
+    return run_year_end_job('carryforward_grant')
 
 
 @shared_task
 def process_yearly_carryforward_cleanup():
     """
-    Celery task to cleanup carryforward leaves on March 31st using management command
+    Celery task to cleanup carryforward leaves on March 31st
     This task should be scheduled to run on March 31st at midnight
-    """
-    try:
-        logger.info("Starting yearly carryforward cleanup process via management command...")
-
-        # Call the management command
-        call_command('process_carryforward_leaves', action='cleanup')
 
-        logger.info("Yearly carryforward cleanup process completed successfully")
-        return "Carryforward leaves cleanup completed successfully via management command"
-
-    except Exception as e:
-        logger.error(f"Error in yearly carryforward cleanup process: {e}")
-        raise
+    The cleanup is fanned out over id-range partitions by run_year_end_job.
+    The process_carryforward_leaves command is the inline alternative.
+    """
+    logger.info("Starting yearly carryforward cleanup process...")
+    return run_year_end_job('carryforward_cleanup')
 
 
 @shared_task
@@ -427,3 +654,37 @@ def test_carryforward_system():
     except Exception as e:
         logger.error(f"Error in carryforward system test: {e}")
         raise
+
+
+@shared_task
+def purge_expired_otps():
+    """Delete the rows of expired password reset OTPs"""
+    from users.otp import purge_expired_otps as purge
+
+    deleted = purge()
+    logger.info(f"Purged {deleted} expired OTPs")
+    return deleted
+
+
+@shared_task
+def generate_image_thumbnails(model_label, pk):
+    """Render the WebP/JPEG thumbnails of a profile photo, see managers/thumbnails.py"""
+    from django.apps import apps
+    from .thumbnails import generate_thumbnails
+
+    instance = apps.get_model(model_label)._default_manager.filter(pk=pk).first()
+    if instance is None:
+        return None
+    thumbnails = generate_thumbnails(instance)
+    logger.info(f"Thumbnails for {model_label} {pk}: {len(thumbnails) - 1} renditions")
+    return thumbnails
+
+
+@shared_task
+def collect_unreferenced_blobs():
+    """Delete the stored uploads no leave request or benefits row references any more"""
+    from common.storage import collect_unreferenced_blobs as collect
+
+    deleted = collect()
+    logger.info(f"Collected {deleted} unreferenced blobs")
+    return deleted
@@ -1,3 +1,623 @@
-from django.test import TestCase
+import asyncio
+from collections import defaultdict
+from datetime import date, datetime, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+import httplib2
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.loader import MigrationLoader
+from django.test import TestCase, TransactionTestCase, override_settings
+from fcm_django.models import FCMDevice
+from firebase_admin import exceptions, messaging
+from googleapiclient.errors import HttpError
+
+from employe.models import Employe, LeaveRequest
+from project.celery import app
+from users.models import User
+from .ics_feeds import _cache_key, cached_feed
+from .live import LiveBroker, live_updates_between
+from .google_calendar_service import add_leaves_to_calendars, sync_team_calendar, team_event_id
+from .models import Founder, LeaveEvent, Manager, YearEndPartition, YearEndRun
+from .push import send_leave_pushes
+from .tasks import (
+    add_leaves_to_google_calendars, run_year_end_job, sync_team_leave_calendar, yearly_leave_reset,
+)
+from .year_end import (
+    apply_year_end_partition, cleanup_carryforward_balances, reset_profiles_for_new_year,
+    run_year_end_job_inline, year_end_partitions,
+)
+
+
+class FakeFCM:
+    """
+    Stands in for messaging.send_all: every message succeeds unless its
+    token is listed in `errors`, which maps tokens to the exception FCM
+    reports for them.
+    """
+
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.batches = []
+
+    def send_all(self, messages, app=None):
+        self.batches.append([message.token for message in messages])
+        return messaging.BatchResponse([
+            messaging.SendResponse(None, self.errors[message.token]) if message.token in self.errors
+            else messaging.SendResponse({'name': f'projects/hr/messages/{message.token}'}, None)
+            for message in messages
+        ])
+
+
+class LeavePushTests(TestCase):
+    """send_leave_pushes against a stubbed FCM client"""
+
+    def setUp(self):
+        # Thumbnails of the new profiles are generated inline instead of waiting on a broker
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', False)
+
+        self.manager_user = User.objects.create_user(
+            username='manager', email='manager@example.com', password='x', is_manager=True, is_employee=False
+        )
+        manager = Manager.objects.create(user=self.manager_user)
+        self.employee_user = User.objects.create_user(username='employee', email='employee@example.com', password='x')
+        employee = Employe.objects.create(user=self.employee_user, manager=manager)
+        self.leave = LeaveRequest.objects.create(
+            employee=employee, requested_by_role='employee', subject='Holiday', leave_type='AL',
+            start_date=date(2030, 6, 3), end_date=date(2030, 6, 7), status='Approved',
+        )
+        patcher = mock.patch('managers.push.firebase_app')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _devices(self, user, *tokens):
+        for token in tokens:
+            FCMDevice.objects.create(user=user, registration_id=token, type='android', active=True)
+
+    def _send(self, transitions, fcm):
+        with mock.patch('managers.push.messaging.send_all', side_effect=fcm.send_all):
+            return send_leave_pushes(transitions)
+
+    def test_stale_tokens_are_pruned(self):
+        self._devices(self.employee_user, 'phone', 'old-phone', 'tablet')
+        fcm = FakeFCM({
+            'old-phone': messaging.UnregisteredError('Requested entity was not found.'),
+            'tablet': exceptions.InvalidArgumentError('The registration token is not valid.'),
+        })
+
+        stats = self._send([[self.leave.pk, 'approved']], fcm)
+
+        self.assertEqual(stats, {'sent': 1, 'failed': 2, 'pruned': 2})
+        # DELETE_INACTIVE_DEVICES removes the rejected tokens outright
+        self.assertEqual(list(FCMDevice.objects.values_list('registration_id', flat=True)), ['phone'])
+
+    def test_transient_failures_keep_the_token(self):
+        self._devices(self.employee_user, 'phone', 'tablet')
+        fcm = FakeFCM({'tablet': exceptions.UnavailableError('FCM is overloaded.')})
+
+        stats = self._send([[self.leave.pk, 'approved']], fcm)
+
+        self.assertEqual(stats, {'sent': 1, 'failed': 1, 'pruned': 0})
+        self.assertEqual(
+            set(FCMDevice.objects.filter(active=True).values_list('registration_id', flat=True)),
+            {'phone', 'tablet'},
+        )
+
+    def test_partial_failure_in_one_batch_does_not_stop_the_others(self):
+        founder_user = User.objects.create_user(
+            username='founder', email='founder@example.com', password='x', is_manager=True, is_employee=False
+        )
+        Founder.objects.create(user=founder_user)
+        self._devices(self.manager_user, 'manager-phone', 'manager-old-phone')
+        self._devices(founder_user, 'founder-phone', 'founder-tablet', 'founder-laptop')
+        fcm = FakeFCM({'manager-old-phone': messaging.UnregisteredError('Requested entity was not found.')})
+
+        with mock.patch('managers.push.PUSH_BATCH_SIZE', 2):
+            stats = self._send([[self.leave.pk, 'submitted']], fcm)
+
+        self.assertEqual([len(batch) for batch in fcm.batches], [2, 2, 1])
+        self.assertEqual(stats, {'sent': 4, 'failed': 1, 'pruned': 1})
+        self.assertFalse(FCMDevice.objects.filter(registration_id='manager-old-phone').exists())
+        self.assertEqual(FCMDevice.objects.count(), 4)
+
+    def test_users_without_devices_are_skipped(self):
+        fcm = FakeFCM()
+
+        stats = self._send([[self.leave.pk, 'approved'], [self.leave.pk + 1000, 'approved']], fcm)
+
+        self.assertEqual(stats, {'sent': 0, 'failed': 0, 'pruned': 0})
+        self.assertEqual(fcm.batches, [])
+
+
+class FakeCalendarAPI:
+    """
+    In-memory stand-in for the Calendar API client: keeps the events of
+    every calendar and answers like the API does (409 when inserting an id
+    that exists, 404 when deleting a missing one). `failures` maps
+    (method, calendar id) to HTTP statuses returned by the next calls, one
+    per call.
+    """
+
+    def __init__(self, failures=None):
+        self.calendars = defaultdict(dict)
+        self.failures = {key: list(statuses) for key, statuses in (failures or {}).items()}
+        self.calls = []
+        self.batch_sizes = []
+
+    def events(self):
+        return self
+
+    def insert(self, calendarId, body):
+        return ('insert', calendarId, body.get('id'), body)
+
+    def update(self, calendarId, eventId, body):
+        return ('update', calendarId, eventId, body)
+
+    def delete(self, calendarId, eventId, sendUpdates=None):
+        return ('delete', calendarId, eventId, None)
+
+    def batch(self, callback, batch_uri=None):
+        return FakeBatch(self, callback)
+
+    def execute(self, request):
+        method, calendar_id, event_id, body = request
+        self.calls.append((method, calendar_id, event_id))
+        pending = self.failures.get((method, calendar_id))
+        if pending:
+            return None, self._error(pending.pop(0))
+
+        events = self.calendars[calendar_id]
+        if method == 'insert':
+            event_id = event_id or f'event{len(self.calls)}'
+            if event_id in events:
+                return None, self._error(409)
+            events[event_id] = body
+            return {'id': event_id, 'htmlLink': f'https://calendar/{event_id}'}, None
+        if method == 'update':
+            events[event_id] = body
+            return {'id': event_id}, None
+        if events.pop(event_id, None) is None:
+            return None, self._error(404)
+        return '', None
+
+    def _error(self, status):
+        return HttpError(httplib2.Response({'status': status}), b'{}')
+
+
+class FakeBatch:
+    """BatchHttpRequest over FakeCalendarAPI, answering every request through the callback"""
+
+    def __init__(self, api, callback):
+        self.api = api
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.api.batch_sizes.append(len(self.requests))
+        for request_id, request in self.requests:
+            self.callback(request_id, *self.api.execute(request))
+
+
+class GoogleCalendarSyncTests(TestCase):
+    """Calendar sync and its retries against a stubbed Calendar API"""
+
+    def setUp(self):
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', False)
+
+        manager_user = User.objects.create_user(
+            username='manager', email='manager@example.com', password='x', is_manager=True, is_employee=False
+        )
+        manager = Manager.objects.create(user=manager_user)
+        founder_user = User.objects.create_user(
+            username='founder', email='founder@example.com', password='x', is_manager=True, is_employee=False
+        )
+        Founder.objects.create(user=founder_user)
+        self.employee = Employe.objects.create(
+            user=User.objects.create_user(username='employee', email='employee@example.com', password='x'),
+            manager=manager,
+        )
+
+        self.api = FakeCalendarAPI()
+        for target, replacement in (
+            ('managers.google_calendar_service.calendar_client', lambda interactive=False: self.api),
+            ('managers.google_calendar_service.BatchHttpRequest', lambda callback, batch_uri: self.api.batch(callback)),
+        ):
+            patcher = mock.patch(target, replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _leave(self, status='Approved'):
+        return LeaveRequest.objects.create(
+            employee=self.employee, requested_by_role='employee', subject='Holiday', leave_type='AL',
+            start_date=date(2030, 6, 3), end_date=date(2030, 6, 7), status=status,
+        )
+
+    def test_leave_is_added_to_manager_and_founder_calendars(self):
+        leave = self._leave()
+
+        stats, retry = add_leaves_to_calendars([leave.pk])
+
+        self.assertEqual((stats, retry), ({'inserted': 2, 'failed': 0}, []))
+        self.assertEqual(len(self.api.calendars['manager@example.com']), 1)
+        self.assertEqual(len(self.api.calendars['founder@example.com']), 1)
+
+    def test_inserts_are_sent_in_batches(self):
+        leaves = [self._leave() for _ in range(3)]
+
+        with mock.patch('managers.google_calendar_service.CALENDAR_BATCH_SIZE', 4):
+            stats, _ = add_leaves_to_calendars([leave.pk for leave in leaves])
+
+        self.assertEqual(stats['inserted'], 6)
+        self.assertEqual(self.api.batch_sizes, [4, 2])
+
+    def test_only_retryable_failures_are_retried(self):
+        leave = self._leave()
+        self.api.failures = {('insert', 'manager@example.com'): [403], ('insert', 'founder@example.com'): [429]}
+
+        stats, retry = add_leaves_to_calendars([leave.pk])
+
+        self.assertEqual(stats, {'inserted': 0, 'failed': 2})
+        self.assertEqual(retry, [[leave.pk, 'founder@example.com']])
+
+    def test_task_retries_only_the_failed_calendars(self):
+        leave = self._leave()
+        self.api.failures = {('insert', 'founder@example.com'): [503]}
+
+        result = add_leaves_to_google_calendars.apply(args=[[leave.pk]], throw=False)
+
+        self.assertEqual(result.get(), {'inserted': 1, 'failed': 0})
+        self.assertEqual(self.api.calls, [
+            ('insert', 'manager@example.com', None),
+            ('insert', 'founder@example.com', None),
+            ('insert', 'founder@example.com', None),
+        ])
+        self.assertEqual(len(self.api.calendars['manager@example.com']), 1)
+        self.assertEqual(len(self.api.calendars['founder@example.com']), 1)
+
+    @override_settings(GOOGLE_CALENDAR_TEAM_CALENDAR_ID='team')
+    def test_team_calendar_follows_leave_status(self):
+        approved, cancelled = self._leave(), self._leave('Cancelled')
+        deleted_leave_id = cancelled.pk + 1000
+        self.api.calendars['team'][team_event_id(cancelled.pk)] = {'summary': 'stale'}
+
+        stats, retry = sync_team_calendar([approved.pk, cancelled.pk, deleted_leave_id])
+
+        # The never-created event of the deleted leave answers 404, which counts as deleted
+        self.assertEqual((stats, retry), ({'upserted': 1, 'deleted': 2, 'failed': 0}, []))
+        self.assertEqual(list(self.api.calendars['team']), [team_event_id(approved.pk)])
+
+    @override_settings(GOOGLE_CALENDAR_TEAM_CALENDAR_ID='team')
+    def test_team_calendar_replaces_an_existing_event(self):
+        leave = self._leave()
+        self.api.calendars['team'][team_event_id(leave.pk)] = {'summary': 'old', 'status': 'cancelled'}
+
+        stats, _ = sync_team_calendar([leave.pk])
+
+        self.assertEqual(stats['upserted'], 1)
+        self.assertEqual([call[0] for call in self.api.calls], ['insert', 'update'])
+        self.assertEqual(self.api.calendars['team'][team_event_id(leave.pk)]['status'], 'confirmed')
+
+    @override_settings(GOOGLE_CALENDAR_TEAM_CALENDAR_ID='team')
+    def test_team_sync_task_retries_rate_limited_leaves(self):
+        first, second = self._leave(), self._leave()
+        self.api.failures = {('insert', 'team'): [429]}
+
+        result = sync_team_leave_calendar.apply(args=[[first.pk, second.pk]], throw=False)
+
+        self.assertEqual(result.get(), {'upserted': 1, 'deleted': 0, 'failed': 0})
+        # Only the leave whose insert was rate limited is sent again
+        self.assertEqual(
+            {call[2] for call in self.api.calls[:2]}, {team_event_id(first.pk), team_event_id(second.pk)}
+        )
+        self.assertEqual(self.api.calls[2:], self.api.calls[:1])
+        self.assertEqual(set(self.api.calendars['team']), {team_event_id(first.pk), team_event_id(second.pk)})
+
+
+class LiveUpdatesTests(TestCase):
+    """Dashboard streams read from the event log"""
+
+    def setUp(self):
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', False)
+        self.user = User.objects.create_user(username='employee', email='employee@example.com', password='x')
+
+    def _event(self, pk):
+        return LeaveEvent.objects.create(
+            pk=pk, leave_id=1, requester_user=self.user, role='employee', event_type='submitted', pending_delta=1,
+        )
+
+    def _sent_ids(self, chunks):
+        return [int(chunk.split('\n')[0][4:]) for chunk in chunks if 'event: leave' in chunk]
+
+    def test_event_committed_after_a_later_one_is_still_sent(self):
+        seen = set()
+        self._event(11)
+        chunks, cursor = live_updates_between('founder', None, 9, 11, seen)
+        self.assertEqual((self._sent_ids(chunks), cursor), ([11], 11))
+
+        # Event 10's transaction commits last and announces its own id
+        self._event(10)
+        chunks, cursor = live_updates_between('founder', None, cursor, 10, seen)
+        self.assertEqual((self._sent_ids(chunks), cursor), ([10], 11))
+
+        chunks, cursor = live_updates_between('founder', None, cursor, 11, seen)
+        self.assertEqual((chunks, cursor), ([], 11))
+
+    def test_subscription_ends_with_the_last_stream(self):
+        async def run():
+            broker = LiveBroker()
+            listening = asyncio.Event()
+
+            async def listen():
+                listening.set()
+                await asyncio.Event().wait()
+
+            broker._listen = listen
+            first, second = broker.register(), broker.register()
+            task = broker.task
+            await listening.wait()
+            broker.unregister(first)
+            self.assertFalse(task.cancelled())
+            broker.unregister(second)
+            await asyncio.sleep(0)
+            return task, broker.task
+
+        task, current = asyncio.run(run())
+        self.assertTrue(task.cancelled())
+        self.assertIsNone(current)
+
+
+class YearEndChordTests(TestCase):
+    """Scheduled year-end jobs fanned out over partitions and merged in the chord callback"""
+
+    def setUp(self):
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', False)
+
+        manager_user = User.objects.create_user(
+            username='manager', email='manager@example.com', password='x', is_manager=True, is_employee=False
+        )
+        self.manager = Manager.objects.create(user=manager_user, available_leaves=12)
+        self.employees = []
+        for i, available in enumerate((15, 4, 10)):
+            user = User.objects.create_user(username=f'employee{i}', email=f'employee{i}@example.com', password='x')
+            self.employees.append(Employe.objects.create(user=user, manager=self.manager, available_leaves=available))
+
+    def test_chord_merges_partition_stats(self):
+        result = run_year_end_job.apply(args=['yearly_reset', 2030], kwargs={'partition_size': 1}).get()
+
+        self.assertEqual(result['status'], 'scheduled')
+        self.assertEqual(result['partitions'], len(year_end_partitions(1)))
+        self.assertGreater(result['partitions'], 2)
+
+        run = YearEndRun.objects.get(job='yearly_reset', fiscal_year=2030)
+        self.assertEqual(run.status, 'completed')
+        self.assertEqual(run.stats, {
+            'total_employees': 3,
+            'total_managers': 1,
+            'employees_with_carryforward': 2,
+            'managers_with_carryforward': 1,
+            'total_carryforward_leaves': 18,
+        })
+        self.assertEqual(
+            [employee.carryforward_available_leaves for employee in Employe.objects.order_by('id')], [6, 0, 6]
+        )
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_scheduled_task_dispatches_the_chord(self):
+        with mock.patch('managers.tasks.run_year_end_job_inline') as inline:
+            result = yearly_leave_reset.apply(kwargs={'fiscal_year': 2030}).get()
+            inline.assert_not_called()
+
+        self.assertEqual(result['status'], 'scheduled')
+        self.assertEqual(YearEndRun.objects.get(job='yearly_reset', fiscal_year=2030).status, 'completed')
+
+        # A second trigger for the same year is a no-op
+        result = yearly_leave_reset.apply(kwargs={'fiscal_year': 2030}).get()
+        self.assertEqual(result['status'], 'skipped')
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class LeaveFeedInvalidationTests(TestCase):
+    """Cached webcal feeds are evicted when what they show changes"""
+
+    def setUp(self):
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', False)
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        self.managers = []
+        for name in ('first', 'second'):
+            user = User.objects.create_user(
+                username=name, email=f'{name}@example.com', password='x', is_manager=True, is_employee=False
+            )
+            self.managers.append(Manager.objects.create(user=user))
+        user = User.objects.create_user(username='employee', email='employee@example.com', password='x')
+        self.employee = Employe.objects.create(user=user, manager=self.managers[0])
+
+    def _cached(self, scope, key):
+        return cache.get(_cache_key(scope, key)) is not None
+
+    def test_proxy_leave_save_evicts_the_feeds(self):
+        cached_feed('team', self.managers[0].pk)
+        cached_feed('person', self.employee.user_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            LeaveRequest.objects.create(
+                employee=self.employee, requested_by_role='employee', subject='Holiday', leave_type='AL',
+                start_date=date(2030, 6, 3), end_date=date(2030, 6, 7), status='Approved',
+            )
+        self.assertFalse(self._cached('team', self.managers[0].pk))
+        self.assertFalse(self._cached('person', self.employee.user_id))
+
+    def test_moving_an_employee_evicts_both_team_feeds(self):
+        for manager in self.managers:
+            cached_feed('team', manager.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.employee.manager = self.managers[1]
+            self.employee.save()
+        for manager in self.managers:
+            self.assertFalse(self._cached('team', manager.pk))
+
+
+class YearEndBalanceTests(TestCase):
+    """Set-based year-end updates and the run ledger on a mix of profiles"""
+
+    def setUp(self):
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', False)
+
+        manager_user = User.objects.create_user(
+            username='manager', email='manager@example.com', password='x', is_manager=True, is_employee=False
+        )
+        self.manager = Manager.objects.create(user=manager_user, available_leaves=12)
+        for i, available in enumerate((15, 4, 10, 9)):
+            user = User.objects.create_user(username=f'employee{i}', email=f'employee{i}@example.com', password='x')
+            Employe.objects.create(
+                user=user, manager=self.manager, available_leaves=available, leaves_taken=18 - available,
+                available_medical_leaves=3, medical_leaves_taken=11,
+            )
+
+    def _employees(self, *fields):
+        return list(Employe.objects.order_by('id').values_list(*fields))
+
+    def test_reset_on_mixed_profiles(self):
+        self.assertEqual(reset_profiles_for_new_year(Employe.objects.all(), 18, 14, 6, 10), (4, 2))
+        self.assertEqual(
+            self._employees('available_leaves', 'leaves_taken', 'available_medical_leaves', 'medical_leaves_taken',
+                            'carryforward_available_leaves', 'carryforward_granted'),
+            [(18, 0, 14, 0, 6, 6), (18, 0, 14, 0, 0, 0), (18, 0, 14, 0, 6, 6), (18, 0, 14, 0, 0, 0)],
+        )
+        # Profiles outside the queryset are left alone
+        self.manager.refresh_from_db()
+        self.assertEqual((self.manager.available_leaves, self.manager.carryforward_granted), (12, 0))
+
+    def test_cleanup_on_mixed_profiles(self):
+        for employee, (available, carryforward) in zip(
+            Employe.objects.order_by('id'), ((22, 6), (20, 0), (10, 3), (18, 6))
+        ):
+            employee.available_leaves = available
+            employee.carryforward_available_leaves = carryforward
+            employee.carryforward_leaves_taken = 6 - carryforward
+            employee.save()
+
+        stats = cleanup_carryforward_balances(Employe.objects.all(), 18)
+
+        self.assertEqual(stats, {'total': 4, 'cleaned': 3, 'forfeited': 15})
+        self.assertEqual(
+            self._employees('available_leaves', 'carryforward_available_leaves', 'carryforward_leaves_taken'),
+            [(18, 0, 0), (18, 0, 0), (10, 0, 0), (18, 0, 0)],
+        )
+
+    def test_interrupted_run_resumes_without_applying_a_partition_twice(self):
+        applied = []
+
+        def fail_third(job, role, start_id, end_id, fiscal_year):
+            if len(applied) == 2:
+                applied.append(None)
+                raise RuntimeError('worker lost')
+            applied.append((role, start_id))
+            return apply_year_end_partition(job, role, start_id, end_id, fiscal_year)
+
+        with mock.patch('managers.year_end.apply_year_end_partition', side_effect=fail_third):
+            with self.assertRaises(RuntimeError):
+                run_year_end_job_inline('yearly_reset', fiscal_year=2030, partition_size=1)
+        self.assertEqual(YearEndRun.objects.get(job='yearly_reset', fiscal_year=2030).status, 'running')
+        self.assertEqual(YearEndPartition.objects.filter(job='yearly_reset').count(), 2)
+
+        stats = run_year_end_job_inline('yearly_reset', fiscal_year=2030, partition_size=1)
+
+        # A second reset of the already reset profiles would grant everyone carryforward
+        self.assertEqual(stats['employees_with_carryforward'], 2)
+        self.assertEqual(stats['managers_with_carryforward'], 1)
+        self.assertEqual(self._employees('carryforward_granted'), [(6,), (0,), (6,), (0,)])
+        self.assertEqual(
+            YearEndPartition.objects.filter(job='yearly_reset').count(), len(year_end_partitions(1))
+        )
+        self.assertIsNone(run_year_end_job_inline('yearly_reset', fiscal_year=2030, partition_size=1))
+
+
+class LeaveRequestMergeMigrationTests(TransactionTestCase):
+    """The 0015/0016 leave table merge keeps ids and lines the status flags up with the status"""
+
+    migrate_from = [
+        ('managers', '0015_consolidate_leave_requests'),
+        ('employe', '0013_employe_carryforward_granted_and_more'),
+    ]
+    migrate_to = [
+        ('managers', '0016_move_manager_leave_requests'),
+        ('employe', '0014_consolidate_leave_requests'),
+    ]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        latest = executor.loader.graph.leaf_nodes()
+        executor.migrate(self.migrate_from)
+        self.addCleanup(lambda: MigrationExecutor(connection).migrate(latest))
+
+        apps = self._applied_apps()
+        User = apps.get_model('users', 'User')
+        manager = apps.get_model('managers', 'Manager').objects.create(user=User.objects.create(email='m@t'))
+        employee = apps.get_model('employe', 'Employe').objects.create(
+            user=User.objects.create(email='e@t'), manager=manager,
+        )
+        self.manager_user_id, self.employee_user_id = manager.user_id, employee.user_id
+
+        dates = dict(start_date=date(2025, 6, 2), end_date=date(2025, 6, 3), leave_type='AL', subject='s')
+        unified = apps.get_model('managers', 'UnifiedLeaveRequest').objects
+        self.approved_then_rejected = unified.create(
+            manager=manager, requested_by_role='manager', is_approved=True, is_rejected=True,
+            approval_date=datetime(2025, 5, 1, tzinfo=dt_timezone.utc),
+            rejection_date=datetime(2025, 5, 2, tzinfo=dt_timezone.utc), **dates,
+        ).pk
+        self.pending = unified.create(manager=manager, requested_by_role='manager', **dates).pk
+        apps.get_model('managers', 'ManagerLeaveRequest').objects.create(manager=manager, is_approved=True, **dates)
+
+        self.employee_statuses = {
+            leave.pk: status
+            for status in ('Approved', 'Rejected', 'Pending', 'Cancelled')
+            for leave in [apps.get_model('employe', 'LeaveRequest').objects.create(
+                employee=employee, status=status, is_approved=True, **dates,
+            )]
+        }
+        self.taken_ids = {self.approved_then_rejected, self.pending}
+
+    def _applied_apps(self):
+        """Historical models matching the tables as migrated right now, other apps included"""
+        loader = MigrationLoader(connection)
+        return loader.project_state(list(loader.applied_migrations)).apps
+
+    def test_merge_keeps_ids_and_flags(self):
+        MigrationExecutor(connection).migrate(self.migrate_to)
+        apps = self._applied_apps()
+        unified = apps.get_model('managers', 'UnifiedLeaveRequest').objects
+        flags = ('status', 'is_approved', 'is_rejected', 'is_cancelled', 'requester_user_id')
+
+        self.assertEqual(
+            unified.filter(pk=self.approved_then_rejected).values_list(*flags).get(),
+            ('Rejected', False, True, False, self.manager_user_id),
+        )
+        self.assertEqual(
+            unified.filter(pk=self.pending).values_list(*flags).get(),
+            ('Pending', False, False, False, self.manager_user_id),
+        )
+
+        copies = {leave.legacy_id: leave for leave in unified.filter(legacy_id__isnull=False)}
+        self.assertEqual(set(copies), set(self.employee_statuses))
+        for old_id, status in self.employee_statuses.items():
+            copy = copies[old_id]
+            if old_id not in self.taken_ids:
+                self.assertEqual(copy.pk, old_id)
+            self.assertEqual(
+                (copy.status, copy.is_approved, copy.is_rejected, copy.is_cancelled, copy.requester_user_id),
+                (status, status == 'Approved', status == 'Rejected', status == 'Cancelled', self.employee_user_id),
+            )
+        self.assertEqual(len({leave.pk for leave in unified.all()}), 2 + len(self.employee_statuses))
+        self.assertEqual(apps.get_model('managers', 'ManagerLeaveRequestArchive').objects.count(), 1)
@@ -0,0 +1,121 @@
+"""
+Thumbnails of profile photos: the `image` of Employe, Manager, Founder and
+users.Profile.
+
+Saving a row with a new image queues generate_image_thumbnails, which
+renders square WebP and JPEG thumbnails at THUMBNAIL_SIZES and records
+their storage names in the row's `image_thumbnails`. The names derive from
+the image's content hash, so a file never changes under its URL and can be
+cached indefinitely, and identical uploads share their thumbnails.
+
+Templates pick a rendition with the `thumbnail` filter
+(common/templatetags/thumbnails.py), which falls back to the original
+upload until its thumbnails exist.
+"""
+import hashlib
+import logging
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# Rendition name -> edge in pixels; small covers list avatars up to 48px at 2x
+THUMBNAIL_SIZES = {'small': 96, 'medium': 256}
+
+# Rendition format -> (Pillow format, file extension, save options)
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Storage directory of the rendered thumbnails
+THUMBNAIL_DIR = 'thumbnails'
+
+# Models whose `image` gets thumbnails
+THUMBNAIL_MODELS = ('employe.Employe', 'managers.Manager', 'managers.Founder', 'users.Profile')
+
+
+def thumbnail_name(digest, size, extension):
+    """Storage name of a thumbnail, derived from the source image's SHA-256"""
+    return f"{THUMBNAIL_DIR}/{digest[:2]}/{digest[:24]}-{size}.{extension}"
+
+
+def _rgb(image):
+    # JPEG has no alpha channel; flatten transparent images onto white
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_thumbnails(data):
+    """{rendition: {format: storage name}} for the image bytes, saving the files not stored yet"""
+    digest = hashlib.sha256(data).hexdigest()
+    source = Image.open(BytesIO(data))
+    # Lets JPEG decoding downscale straight away instead of decoding every pixel
+    source.draft('RGB', (max(THUMBNAIL_SIZES.values()) * 2,) * 2)
+    source = _rgb(ImageOps.exif_transpose(source))
+
+    renditions = {}
+    for rendition, size in THUMBNAIL_SIZES.items():
+        thumbnail = ImageOps.fit(source, (size, size), Image.LANCZOS)
+        for format_name, (pil_format, extension, options) in THUMBNAIL_FORMATS.items():
+            name = thumbnail_name(digest, size, extension)
+            if not default_storage.exists(name):
+                buffer = BytesIO()
+                thumbnail.save(buffer, pil_format, **options)
+                name = default_storage.save(name, ContentFile(buffer.getvalue()))
+            renditions.setdefault(rendition, {})[format_name] = name
+    return renditions
+
+
+def generate_thumbnails(instance):
+    """Render and record the thumbnails of the instance's current image"""
+    image = instance.image
+    thumbnails = {'source': image.name or ''}
+    if image:
+        try:
+            with image.open('rb') as file:
+                thumbnails.update(render_thumbnails(file.read()))
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+            # Recording the source anyway keeps later saves from queueing it again
+            logger.warning(f"No thumbnails for {instance._meta.label} {instance.pk} ({image.name}): {e}")
+
+    # Skipped if the image was replaced meanwhile; that save queued its own run
+    rows = type(instance)._default_manager.filter(pk=instance.pk)
+    rows = rows.filter(image=image.name) if image else rows.filter(Q(image='') | Q(image__isnull=True))
+    rows.update(image_thumbnails=thumbnails)
+    return thumbnails
+
+
+def queue_thumbnails(instance):
+    """Queue the thumbnail task for the instance once the transaction commits"""
+    label, pk = instance._meta.label, instance.pk
+
+    def enqueue():
+        from .tasks import generate_image_thumbnails
+
+        try:
+            generate_image_thumbnails.delay(label, pk)
+        except Exception as e:
+            logger.error(f"Failed to queue thumbnails for {label} {pk}: {e}")
+
+    transaction.on_commit(enqueue)
+
+
+@receiver(post_save, sender='employe.Employe')
+@receiver(post_save, sender='managers.Manager')
+@receiver(post_save, sender='managers.Founder')
+@receiver(post_save, sender='users.Profile')
+def profile_image_saved(sender, instance, **kwargs):
+    if (instance.image.name or '') != instance.image_thumbnails.get('source', ''):
+        queue_thumbnails(instance)
@@ -9,6 +9,8 @@ urlpatterns=[
     path("",views.index, name="index"),
     path("founder-dashboard/", views.founder_dashboard, name="founder_dashboard"),
     path("manager-dashboard/", views.manager_dashboard, name="manager_dashboard"),
+    path("live/", views.live_updates, name="live_updates"),
+    path("calendar/<str:token>.ics", views.calendar_feed, name="calendar_feed"),
     path("login/",views.login, name="login"),
     path("founder/login/", views.founder_login, name="founder_login"),
     path("logout/",views.logout, name="logout"),
@@ -25,6 +27,7 @@ urlpatterns=[
     # FIX: Consistent and non-conflicting URL structure for employee leave actions.
     path('leave/<int:pk>/approve/', views.approve_leave, name='approve_leave'),
     path('leave/<int:pk>/reject/', views.reject_leave, name='reject_leave'),
+    path('leave/bulk-action/', views.bulk_leave_action, name='bulk_leave_action'),
 
     # Employee leave actions
     path('employe/leave/approve/<int:leave_id>/', views.approve_employee_leave, name='approve_employee_leave'),
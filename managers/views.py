@@ -1,3 +1,4 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, reverse, get_object_or_404, redirect
 from django.urls import reverse
 from django.contrib import messages 
@@ -10,7 +11,8 @@ import re
 
 from common.decorators import allow_manager
 from employe.models import *
-from users.models import User, OTP
+from users.models import User
+from users.otp import OTP_EXPIRED, OTP_INVALID, OTPRateLimitExceeded, check_otp, consume_otp, issue_otp
 from managers.models import *
 
 from django.utils import timezone
@@ -21,9 +23,8 @@ from django.contrib.auth.hashers import make_password
 from django.core.mail import send_mail, EmailMessage
 from django.core.exceptions import ValidationError
 from django.template.loader import render_to_string
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, HttpResponseForbidden, StreamingHttpResponse
 from django.contrib.auth.password_validation import validate_password
-import random
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.core.validators import validate_email
@@ -31,56 +32,35 @@ import secrets
 import logging
 from django.views.decorators.csrf import csrf_exempt
 from django.db.models import Q, Sum
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET
 
 logger = logging.getLogger(__name__)
 
 # Google Calendar integration
 from .google_calendar_service import get_google_calendar_service
 from .forms import ManagerProfileForm, UnifiedLeaveRequestForm, AddUserForm, AddEmployeModelForm
-from common.decorators import role_required, allow_founder
-from common.utils import get_user_role, is_founder, is_manager, get_user_profile, generate_manager_id, calculate_leave_days
+from .ics_feeds import cached_feed, calendar_feed_links, feed_key, feed_user
+from .leave_events import absent_user_ids
+from .live import approver_scope, live_event_stream
+from .notifications import asend_emails, asend_mail, build_leave_notification
+from .tasks import send_leave_notifications_batch
+from common.decorators import async_view, role_required, allow_founder
+from common.utils import get_user_role, is_founder, is_manager, get_user_profile, generate_employee_id, generate_manager_id, calculate_leave_days, get_leave_balance_info
+from common.utils import leave_conflict_response, requested_leave_version
+from common.exceptions import LeaveActionConflict
+from common.services import LeaveApprovalService
+from common.profiles import EMPLOYE_SUMMARY_SECTIONS, MANAGER_SECTIONS, ProfileAggregate
 
 logger = logging.getLogger(__name__)
 
 # ==================== EMAIL FUNCTIONS ====================
 
-def send_leave_notification(request, leave, email_type, recipient_email, manager_name=None, cc_founder=False):
-    """
-    Generic function to send leave notifications.
-    - `leave`: The leave request object (LeaveRequest or UnifiedLeaveRequest).
-    - `email_type`: 'new_request', 'approved', 'rejected', or 'submission_confirmation'.
-    - `recipient_email`: The email address of the recipient.
-    - `manager_name`: The name of the manager (for notifications to managers).
-    - `cc_founder`: If True, CC the founder on the email.
-    """
-    
-    if isinstance(leave, LeaveRequest):
-        requester_profile = leave.employee
-        requester_name = leave.employee.user.get_full_name()
-        leave_model_name = 'LeaveRequest'
-    elif isinstance(leave, UnifiedLeaveRequest):
-        requester_profile = leave.manager
-        requester_name = leave.manager.user.get_full_name()
-        leave_model_name = 'UnifiedLeaveRequest'
-    else:
-        logger.error(f"Unknown leave model type: {type(leave)}")
-        return
-
+def _leave_notification_email(request, leave, email_type, recipient_email, manager_name=None, cc_founder=False):
+    """Build the email for send_leave_notification, linking new requests to the review queue"""
     if email_type in ['new_request', 'new_manager_request']:
-        subject = f"New Leave Request from {requester_name}"
-    elif email_type == 'approved':
-        subject = "Your Leave Request has been Approved"
-    elif email_type == 'rejected':
-        subject = "Your Leave Request has been Rejected"
-    elif email_type == 'cancelled':
-        subject = f"Leave Request Cancelled by {requester_name}"
-    elif email_type == 'submission_confirmation':
-        subject = "Leave Request Submitted Successfully"
-    else:
-        subject = "Leave Request Update"
-
-    if email_type in ['new_request', 'new_manager_request']:
-        if leave_model_name == 'LeaveRequest':
+        if isinstance(leave, LeaveRequest):
             # FIX: Corrected reverse lookup from 'leave_requests' to 'leavelist'
             review_path = reverse('managers:leavelist')
         else:
@@ -89,81 +69,53 @@ def send_leave_notification(request, leave, email_type, recipient_email, manager
     else:
         review_url = None
 
-    html_content = render_to_string('emails/leave_notification.html', {
-        'leave': leave,
-        'employee': requester_profile,
-        'email_type': email_type,
-        'status': leave.status,
-        'manager_name': manager_name,
-        'review_url': review_url,
-    })
+    return build_leave_notification(
+        leave, email_type, recipient_email,
+        manager_name=manager_name, cc_founder=cc_founder, review_url=review_url,
+    )
 
+
+def send_leave_notification(request, leave, email_type, recipient_email, manager_name=None, cc_founder=False):
+    """
+    Generic function to send leave notifications.
+    - `leave`: The leave request object (LeaveRequest or UnifiedLeaveRequest).
+    - `email_type`: 'new_request', 'approved', 'rejected', or 'submission_confirmation'.
+    - `recipient_email`: The email address of the recipient.
+    - `manager_name`: The name of the manager (for notifications to managers).
+    - `cc_founder`: If True, CC the founder on the email.
+    """
     try:
-        cc_list = []
-        if cc_founder:
-            # CC all founders to ensure every founder account receives the notification
-            founders = Founder.objects.all()
-            for founder in founders:
-                if founder.user.email not in cc_list:
-                    cc_list.append(founder.user.email)
-
-        # If it's a new request or a cancellation and the requester has a founder, 
-        # that founder should be the primary recipient if no manager is assigned
-        actual_recipient = recipient_email
-        if email_type in ['new_request', 'new_manager_request', 'cancelled']:
-            requester_founder = None
-            if isinstance(leave, LeaveRequest):
-                requester_founder = leave.employee.founder
-            elif isinstance(leave, UnifiedLeaveRequest):
-                if leave.employee:
-                    requester_founder = leave.employee.founder
-                elif leave.manager:
-                    requester_founder = leave.manager.founder
-            
-            if requester_founder:
-                # If we don't have a recipient email (like manager email), or if it's already set to founder
-                # or if recipient_email is a list (like for new_manager_request)
-                if not actual_recipient or actual_recipient == requester_founder.user.email:
-                    actual_recipient = requester_founder.user.email
-                
-                # If founder is the recipient, we don't need to CC them
-                if isinstance(actual_recipient, str) and actual_recipient == requester_founder.user.email:
-                    if actual_recipient in cc_list:
-                        cc_list.remove(actual_recipient)
-                elif isinstance(actual_recipient, (list, tuple)) and requester_founder.user.email in actual_recipient:
-                    if requester_founder.user.email in cc_list:
-                        cc_list.remove(requester_founder.user.email)
-
-        # Final check: if we still don't have a recipient but have CCs, use first CC as recipient
-        if not actual_recipient and cc_list:
-            actual_recipient = cc_list.pop(0)
-
-        if not actual_recipient:
-            logger.warning(f"No recipient found for leave notification '{email_type}'")
+        email = _leave_notification_email(request, leave, email_type, recipient_email, manager_name, cc_founder)
+        if email is None:
             return
-
-        # Ensure actual_recipient is a list for EmailMessage 'to' field
-        if isinstance(actual_recipient, str):
-            recipient_list = [actual_recipient]
-        elif isinstance(actual_recipient, (list, tuple)):
-            recipient_list = list(actual_recipient)
-        else:
-            recipient_list = [str(actual_recipient)]
-
-        email = EmailMessage(
-            subject,
-            body=html_content,
-            from_email=settings.EMAIL_HOST_USER,
-            to=recipient_list,
-            cc=cc_list
-        )
-        email.content_subtype = 'html'
         email.send()
         logger.info(f"Leave notification '{email_type}' sent to {recipient_email}")
     except Exception as e:
         logger.error(f"Failed to send email to {recipient_email}: {e}")
 
 
+async def asend_leave_notifications(request, notifications):
+    """
+    Async counterpart of send_leave_notification for async views: builds every
+    (leave, email_type, recipient_email, options) notification, then sends
+    them concurrently on the mail pool.
+    """
+    def build():
+        emails = []
+        for leave, email_type, recipient_email, options in notifications:
+            try:
+                email = _leave_notification_email(request, leave, email_type, recipient_email, **options)
+            except Exception as e:
+                logger.error(f"Failed to build leave notification '{email_type}': {e}")
+                continue
+            if email is not None:
+                emails.append(email)
+        return emails
+
+    sent = await asend_emails(await sync_to_async(build)())
+    logger.info(f"Sent {sent} leave notifications")
+
+
 @login_required(login_url='/managers/login')
 @role_required('manager', 'founder')
 def index(request):
@@ -267,6 +219,7 @@ def founder_dashboard(request):
         'pending_employee_leaves': pending_employee_leaves_count,
         'user_form': user_form,
         'employe_form': employe_form,
+        'calendar_feeds': calendar_feed_links(request, request.user),
     }
 
     return render(request, 'managers/founder_dashboard.html', context)
@@ -290,14 +243,9 @@ def manager_dashboard(request):
     employees = get_employees_under_manager(manager)
 
     employees_with_status = []
-    today = timezone.now().date()
+    on_leave_today = absent_user_ids(timezone.now().date(), employees)
     for emp in employees:
-        is_on_leave = LeaveRequest.objects.filter(
-            employee=emp,
-            status='Approved',
-            start_date__lte=today,
-            end_date__gte=today
-        ).exists()
+        is_on_leave = emp.user_id in on_leave_today
 
         status_text = ''
         status_class = ''
@@ -326,7 +274,7 @@ def manager_dashboard(request):
         employee__in=employees,
         status='Pending',
         is_cancelled=False
-    ).order_by('-created_date')
+    ).select_related('employee__user').order_by('-created_date')
 
     manager_leave_requests = UnifiedLeaveRequest.objects.filter(
         manager=manager,
@@ -381,151 +329,116 @@ def manager_dashboard(request):
     return render(request, 'managers/manager_dashboard.html', context)
 
 
-@login_required(login_url='/managers/login')
-@role_required('manager', 'founder')
-def approve_employee_leave(request, leave_id):
-    leave_request = get_object_or_404(LeaveRequest, id=leave_id)
-    employee_profile = leave_request.employee
-
-    if request.method == 'POST':
-        can_approve = False
-        if request.user.is_superuser:
-            can_approve = True
-        elif is_founder(request.user):
-            # Founders can approve any employee leave
-            can_approve = True
-        elif is_manager(request.user):
-            # Managers can only approve leaves for their own employees
-            if employee_profile.manager and employee_profile.manager.user == request.user:
-                can_approve = True
-            else:
-                messages.error(request, "Managers can only approve leaves for their own employees.")
-                return redirect('managers:leavelist')
-
-        if not can_approve:
-            messages.error(request, "You do not have permission to approve this leave request.")
-            return redirect('managers:leavelist')
-
-        leave_days = calculate_leave_days(leave_request.start_date, leave_request.end_date)
-
-        if leave_request.leave_type == 'ML':
-            employee_profile.medical_leaves_taken += leave_days
-            employee_profile.available_medical_leaves -= leave_days
-        elif leave_request.leave_type == 'AL':
-            # Carry-forward deduction logic
-            cf_eligible_days = 0
-            
-            # Get holidays within range
-            from employe.models import Holiday # Local import to avoid potential circularity if not already imported correctly
-            holidays = Holiday.objects.filter(date__range=[leave_request.start_date, leave_request.end_date]).values_list('date', flat=True)
-            
-            curr = leave_request.start_date
-            while curr <= leave_request.end_date:
-                # Is it a working day and within Jan 1 - March 31?
-                if curr.weekday() < 5 and curr not in holidays:
-                    if curr.month <= 3:
-                        cf_eligible_days += 1
-                curr += timedelta(days=1)
-            
-            cf_available = employee_profile.carryforward_available_leaves
-            
-            # More robust check: how much CF is actually available from the grant
-            from django.db.models import Sum
-            other_cf_used = LeaveRequest.objects.filter(
-                employee=employee_profile, 
-                status='Approved'
-            ).exclude(id=leave_request.id).aggregate(total=Sum('carryforward_used'))['total'] or 0
-            
-            cf_available_from_grant = max(0, employee_profile.carryforward_granted - other_cf_used)
-            cf_to_use = min(cf_eligible_days, cf_available_from_grant)
-            
-            leave_request.carryforward_used = cf_to_use
-            # employee_profile fields will be updated by recalculate_leave_counts() below
-            
-        employee_profile.save()
-
-        leave_request.status = 'Approved'
-        leave_request.is_approved = True
-        leave_request.approval_date = timezone.now()
-        leave_request.leave_duration = leave_days
-        leave_request.save()
-
-        employee_profile.recalculate_leave_counts()
-
-        send_leave_notification(request, leave_request, 'approved', leave_request.employee.user.email, cc_founder=True)
+async def live_updates(request):
+    """
+    Server-sent events stream of leave events for the manager and founder
+    dashboards. Needs an ASGI server; see project/asgi.py.
+    """
+    # The auth decorators are sync-only on this Django version, so check here
+    scope, manager = await sync_to_async(approver_scope)(request.user)
+    if scope is None:
+        return HttpResponseForbidden()
 
-        messages.success(request, f"Leave request for {leave_request.employee.user.get_full_name()} approved.")
-        if is_founder(request.user):
-            return redirect('managers:founder_dashboard')
-        return redirect('managers:leavelist')
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    last_id = int(last_event_id) if last_event_id.isdigit() else None
+    response = StreamingHttpResponse(live_event_stream(scope, manager, last_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
-    if is_founder(request.user):
-        return redirect('managers:founder_dashboard')
-    return redirect('managers:leavelist')
 
 
-@login_required(login_url='/managers/login')
-@role_required('manager', 'founder')
-def reject_employee_leave(request, leave_id):
-    leave_request = get_object_or_404(LeaveRequest, id=leave_id)
+@require_GET
+def calendar_feed(request, token):
+    """
+    webcal:// feed of approved leaves for calendar apps, authorised by the
+    token in its URL. Answers 304 while the cached feed is unchanged.
+    """
+    user, scope = feed_user(token)
+    key = feed_key(user, scope) if user else None
+    if key is None:
+        raise Http404("Calendar feed not found")
+
+    feed = cached_feed(scope, key)
+    last_modified = int(feed['last_modified'].timestamp())
+    response = get_conditional_response(request, etag=feed['etag'], last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(feed['body'], content_type='text/calendar; charset=utf-8')
+    response['ETag'] = feed['etag']
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+# Notification sent to the requester for each leave action
+LEAVE_ACTION_EMAIL_TYPES = {'approve': 'approved', 'reject': 'rejected'}
+
+
+async def _action_employee_leave(request, leave_id, action):
+    """Approve or reject an employee leave request: the shared body of the async views below"""
+    leave_request = await sync_to_async(get_object_or_404)(
+        LeaveRequest.objects.select_related('employee__user', 'employee__manager'), id=leave_id
+    )
     employee_profile = leave_request.employee
+    founder = await sync_to_async(is_founder)(request.user)
+    done_url = 'managers:founder_dashboard' if founder else 'managers:leavelist'
+
+    if request.method != 'POST':
+        return redirect(done_url)
+
+    if not (request.user.is_superuser or founder):
+        if not is_manager(request.user):
+            messages.error(request, f"You do not have permission to {action} this leave request.")
+            return redirect(done_url)
+        # Managers can only action leaves for their own employees
+        if not employee_profile.manager or employee_profile.manager.user_id != request.user.pk:
+            messages.error(request, f"Managers can only {action} leaves for their own employees.")
+            return redirect('managers:leavelist')
 
-    if request.method == 'POST':
-        can_reject = False
-        if request.user.is_superuser:
-            can_reject = True
-        elif is_founder(request.user):
-            # Founders can reject any employee leave
-            can_reject = True
-        elif is_manager(request.user):
-            # Managers can only reject leaves for their own employees
-            if employee_profile.manager and employee_profile.manager.user == request.user:
-                can_reject = True
-            else:
-                messages.error(request, "Managers can only reject leaves for their own employees.")
-                return redirect('managers:leavelist')
+    service = LeaveApprovalService(request.user)
+    try:
+        leave_request = await sync_to_async(getattr(service, action))(
+            leave_request, expected_version=requested_leave_version(request)
+        )
+    except LeaveActionConflict as e:
+        return leave_conflict_response(request, e, done_url)
 
-        if not can_reject:
-            messages.error(request, "You do not have permission to reject this leave request.")
-            if is_founder(request.user):
-                return redirect('managers:founder_dashboard')
-            return redirect('managers:leavelist')
+    email_type = LEAVE_ACTION_EMAIL_TYPES[action]
+    await asend_leave_notifications(request, [
+        (leave_request, email_type, employee_profile.user.email, {'cc_founder': True}),
+    ])
 
-        leave_request.status = 'Rejected'
-        leave_request.is_rejected = True
-        leave_request.rejection_date = timezone.now()
-        leave_request.save()
+    messages.success(request, f"Leave request for {employee_profile.user.get_full_name()} {email_type}.")
+    return redirect(done_url)
 
-        send_leave_notification(request, leave_request, 'rejected', leave_request.employee.user.email, cc_founder=True)
 
-        messages.success(request, f"Leave request for {leave_request.employee.user.get_full_name()} rejected.")
-        if is_founder(request.user):
-            return redirect('managers:founder_dashboard')
-        return redirect('managers:leavelist')
+@async_view(login_required(login_url='/managers/login'), role_required('manager', 'founder'))
+async def approve_employee_leave(request, leave_id):
+    return await _action_employee_leave(request, leave_id, 'approve')
 
-    if is_founder(request.user):
-        return redirect('managers:founder_dashboard')
-    return redirect('managers:leavelist')
 
+@async_view(login_required(login_url='/managers/login'), role_required('manager', 'founder'))
+async def reject_employee_leave(request, leave_id):
+    return await _action_employee_leave(request, leave_id, 'reject')
 
-@login_required(login_url='/managers/login')
-@role_required('manager')
-def manager_apply_leave(request):
+
+@async_view(login_required(login_url='/managers/login'), role_required('manager'))
+async def manager_apply_leave(request):
     if request.method == 'POST':
         form = UnifiedLeaveRequestForm(request.POST, request.FILES)
-        if form.is_valid():
+        if await sync_to_async(form.is_valid)():
             leave_request = form.save(commit=False)
 
             try:
-                manager = Manager.objects.get(user=request.user)
+                manager = await Manager.objects.aget(user=request.user)
                 leave_request.manager = manager
                 leave_request.requested_by_role = 'manager'
-                leave_request.save()
+                await sync_to_async(LeaveApprovalService(request.user).submit)(leave_request)
 
-                # Notify all founders
-                send_leave_notification(request, leave_request, 'new_request', None, cc_founder=True)
-                
-                send_leave_notification(request, leave_request, 'submission_confirmation', request.user.email)
+                # Notify all founders, and confirm to the manager
+                await asend_leave_notifications(request, [
+                    (leave_request, 'new_request', None, {'cc_founder': True}),
+                    (leave_request, 'submission_confirmation', request.user.email, {}),
+                ])
 
                 messages.success(request, "Leave request submitted successfully!")
                 return redirect(reverse("managers:manager_leave_history"))
@@ -536,7 +449,7 @@ def manager_apply_leave(request):
     else:
         form = UnifiedLeaveRequestForm()
 
-    return render(request, 'managers/apply_leave.html', {'form': form})
+    return await sync_to_async(render)(request, 'managers/apply_leave.html', {'form': form})
 
 
 @login_required(login_url='/managers/login')
@@ -550,14 +463,12 @@ def manager_cancel_leave(request, id):
 
     leave_request = get_object_or_404(UnifiedLeaveRequest, id=id, manager=manager, requested_by_role='manager')
 
-    if leave_request.status != 'Pending':
-        messages.error(request, f"Cannot cancel a leave request that is already {leave_request.status}.")
-        return redirect(reverse('managers:manager_leave_history'))
-
-    leave_request.is_cancelled = True
-    leave_request.cancellation_date = timezone.now()
-    leave_request.cancelled_by = request.user
-    leave_request.save()
+    try:
+        leave_request = LeaveApprovalService(request.user).cancel(
+            leave_request, expected_version=requested_leave_version(request)
+        )
+    except LeaveActionConflict as e:
+        return leave_conflict_response(request, e, reverse('managers:manager_leave_history'))
 
     # Notify all founders
     try:
@@ -572,83 +483,46 @@ def manager_cancel_leave(request, id):
     return redirect(reverse('managers:manager_leave_history'))
 
 
-@login_required(login_url='/managers/founder/login/')
-@allow_founder
-def approve_manager_leave(request, id):
-    leave_request = get_object_or_404(UnifiedLeaveRequest, id=id, requested_by_role='manager')
+async def _action_manager_leave(request, id, action):
+    """Approve or reject a manager's leave request: the shared body of the async views below"""
+    leave_request = await sync_to_async(get_object_or_404)(
+        UnifiedLeaveRequest.objects.select_related('manager__user'), id=id, requested_by_role='manager'
+    )
     manager = leave_request.manager
 
-    # Check if the founder has permission to approve manager leave
-    if not is_founder(request.user) and not request.user.is_superuser:
-        messages.error(request, "Access denied. Only founders can approve manager leaves.")
+    # Check if the founder has permission to action manager leave
+    if not request.user.is_superuser and not await sync_to_async(is_founder)(request.user):
+        messages.error(request, f"Access denied. Only founders can {action} manager leaves.")
         return redirect(reverse("managers:index"))
 
-    actual_leave_days = calculate_leave_days(leave_request.start_date, leave_request.end_date)
-
-    if leave_request.leave_type == 'AL':
-        # Carry-forward deduction logic
-        cf_eligible_days = 0
-        
-        # Get holidays within range
-        from employe.models import Holiday
-        holidays = Holiday.objects.filter(date__range=[leave_request.start_date, leave_request.end_date]).values_list('date', flat=True)
-        
-        curr = leave_request.start_date
-        while curr <= leave_request.end_date:
-            # Is it a working day and within Jan 1 - March 31?
-            if curr.weekday() < 5 and curr not in holidays:
-                if curr.month <= 3:
-                    cf_eligible_days += 1
-            curr += timedelta(days=1)
-        
-        # How much CF is actually available from the grant
-        other_cf_used = UnifiedLeaveRequest.objects.filter(
-            manager=manager, 
-            is_approved=True
-        ).exclude(id=leave_request.id).aggregate(total=Sum('carryforward_used'))['total'] or 0
-        
-        cf_available_from_grant = max(0, manager.carryforward_granted - other_cf_used)
-        cf_to_use = min(cf_eligible_days, cf_available_from_grant)
-        
-        leave_request.carryforward_used = cf_to_use
-
-    leave_request.is_approved = True
-    leave_request.is_rejected = False
-    leave_request.approval_date = timezone.now()
-    leave_request.approved_by = request.user
-    leave_request.leave_duration = actual_leave_days
-    leave_request.save()
-
-    # Refresh leave counts
-    manager.recalculate_leave_counts()
+    service = LeaveApprovalService(request.user)
+    try:
+        leave_request = await sync_to_async(getattr(service, action))(
+            leave_request, expected_version=requested_leave_version(request)
+        )
+    except LeaveActionConflict as e:
+        return leave_conflict_response(request, e, reverse("managers:founder_dashboard"))
 
-    send_leave_notification(request, leave_request, 'approved', manager.user.email, cc_founder=True)
+    email_type = LEAVE_ACTION_EMAIL_TYPES[action]
+    await asend_leave_notifications(request, [
+        (leave_request, email_type, manager.user.email, {'cc_founder': True}),
+    ])
 
-    messages.success(request, f"Manager leave request approved successfully for {actual_leave_days} days.")
+    if action == 'approve':
+        messages.success(request, f"Manager leave request approved successfully for {leave_request.leave_duration} days.")
+    else:
+        messages.success(request, "Manager leave request rejected successfully.")
     return redirect(reverse("managers:founder_dashboard"))
 
 
-@login_required(login_url='/managers/founder/login/')
-@allow_founder
-def reject_manager_leave(request, id):
-    leave_request = get_object_or_404(UnifiedLeaveRequest, id=id, requested_by_role='manager')
-    manager = leave_request.manager
+@async_view(login_required(login_url='/managers/founder/login/'), allow_founder)
+async def approve_manager_leave(request, id):
+    return await _action_manager_leave(request, id, 'approve')
 
-    # Check if the founder has permission to reject manager leave
-    if not is_founder(request.user) and not request.user.is_superuser:
-        messages.error(request, "Access denied. Only founders can reject manager leaves.")
-        return redirect(reverse("managers:index"))
-
-    leave_request.is_rejected = True
-    leave_request.is_approved = False
-    leave_request.rejection_date = timezone.now()
-    leave_request.rejected_by = request.user
-    leave_request.save()
 
-    send_leave_notification(request, leave_request, 'rejected', leave_request.manager.user.email, cc_founder=True)
-
-    messages.success(request, "Manager leave request rejected successfully.")
-    return redirect(reverse("managers:founder_dashboard"))
+@async_view(login_required(login_url='/managers/founder/login/'), allow_founder)
+async def reject_manager_leave(request, id):
+    return await _action_manager_leave(request, id, 'reject')
 
 
 @login_required(login_url='/managers/login')
@@ -711,7 +585,7 @@ def manager_leave_requests_list(request):
         is_approved=False,
         is_rejected=False,
         is_cancelled=False
-    ).order_by('-created_date')
+    ).select_related('manager__user').order_by('-created_date')
 
     for leave_request in pending_requests:
         leave_request.calculated_duration = calculate_leave_days(leave_request.start_date, leave_request.end_date)
@@ -757,7 +631,7 @@ def leave_requests(request):
         employee__in=employees,
         status='Pending',
         is_cancelled=False
-    ).order_by('-created_date')
+    ).select_related('employee__user').order_by('-created_date')
 
     context = {
         'leave_requests': pending_employee_requests,
@@ -784,26 +658,19 @@ def login(request):
         password = request.POST.get("password")
 
         if email and password and manager_id:
-            user = authenticate(request, email=email, password=password)
+            # The backend reads the user's manager ID in the same query
+            user = authenticate(request, email=email, password=password, role='manager')
             
             if user:
-                try:
-                    manager_profile = Manager.objects.get(user=user)
-                    if manager_profile.manager_id != manager_id:
-                        messages.error(request, "Invalid Manager ID for this account")
-                        return render(request, "managers/login.html", {"title": "Manager Login", "messages": messages.get_messages(request)})
-                    
-                    auth_login(request, user)
-                    user.is_manager = True
-                    user.save()
-                    return HttpResponseRedirect(reverse("managers:index"))
-                except Manager.DoesNotExist:
-                    if not user.is_superuser:
-                        messages.error(request, "Manager profile not found")
-                        return render(request, "managers/login.html", {"title": "Manager Login", "messages": messages.get_messages(request)})
-                    else:
-                        auth_login(request, user)
-                        return HttpResponseRedirect(reverse("managers:index"))
+                if user.login_profile_id is None and not user.is_superuser:
+                    messages.error(request, "Manager profile not found")
+                    return render(request, "managers/login.html", {"title": "Manager Login", "messages": messages.get_messages(request)})
+                if user.login_profile_id is not None and user.login_profile_id != manager_id:
+                    messages.error(request, "Invalid Manager ID for this account")
+                    return render(request, "managers/login.html", {"title": "Manager Login", "messages": messages.get_messages(request)})
+
+                auth_login(request, user)
+                return HttpResponseRedirect(reverse("managers:index"))
             else:
                 messages.error(request, "Invalid email or password")
         else:
@@ -863,19 +730,69 @@ def viewlist(request, id):
     return render(request, 'managers/viewlist.html', context)
 
 
-@login_required(login_url='/managers/login')
-@role_required('manager', 'founder')
-def approve_leave(request, pk):
-    return approve_employee_leave(request, pk)
+@async_view(login_required(login_url='/managers/login'), role_required('manager', 'founder'))
+async def approve_leave(request, pk):
+    return await _action_employee_leave(request, pk, 'approve')
 
 
+@async_view(login_required(login_url='/managers/login'), role_required('manager', 'founder'))
+async def reject_leave(request, pk):
+    return await _action_employee_leave(request, pk, 'reject')
+
+
+from common.utils import get_user_role, is_founder, is_manager, get_user_profile, generate_manager_id, calculate_leave_days
+
 @login_required(login_url='/managers/login')
 @role_required('manager', 'founder')
-def reject_leave(request, pk):
-    return reject_employee_leave(request, pk)
+def bulk_leave_action(request):
+    """Approve or reject many pending leave requests in one round trip"""
+    kind = request.POST.get('kind', 'employee')
+    action = request.POST.get('action')
+    leave_ids = [int(leave_id) for leave_id in request.POST.getlist('leave_ids') if leave_id.isdigit()]
+    can_action_all = request.user.is_superuser or is_founder(request.user)
+
+    if kind == 'manager':
+        back = redirect(reverse('managers:manager_leave_requests_list'))
+    elif can_action_all:
+        back = redirect(reverse('managers:founder_dashboard'))
+    else:
+        back = redirect(reverse('managers:leavelist'))
+
+    if request.method != 'POST' or action not in ('approve', 'reject') or not leave_ids:
+        messages.error(request, "Select at least one leave request and an action.")
+        return back
+
+    # Permission scoping is part of the locking SELECT, so it costs no extra query
+    if kind == 'manager':
+        if not can_action_all:
+            messages.error(request, "Access denied. Only founders can action manager leaves.")
+            return back
+        queryset = UnifiedLeaveRequest.objects.filter(id__in=leave_ids, requested_by_role='manager')
+    else:
+        queryset = LeaveRequest.objects.filter(id__in=leave_ids)
+        if not can_action_all:
+            # Managers can only action leaves for their own employees
+            queryset = queryset.filter(employee__manager__user=request.user)
 
+    actioned, skipped = LeaveApprovalService(request.user).bulk_action(action, queryset)
+    denied = len(set(leave_ids)) - len(actioned) - len(skipped)
+    email_type = 'approved' if action == 'approve' else 'rejected'
+
+    if actioned:
+        try:
+            send_leave_notifications_batch.delay(
+                queryset.model._meta.label, [leave.id for leave in actioned], email_type
+            )
+        except Exception as e:
+            logger.error(f"Failed to queue bulk leave notifications: {e}")
+            messages.warning(request, "Leave requests updated, but notifications could not be queued.")
+        messages.success(request, f"{len(actioned)} leave request(s) {email_type}.")
+    if skipped:
+        messages.warning(request, f"{len(skipped)} leave request(s) were already actioned and were skipped.")
+    if denied:
+        messages.error(request, f"{denied} leave request(s) were not found or you do not have permission to action them.")
+    return back
 
-from common.utils import get_user_role, is_founder, is_manager, get_user_profile, generate_manager_id, calculate_leave_days
 
 @login_required(login_url='/managers/login')
 @role_required('manager', 'founder')
@@ -894,6 +811,8 @@ def add_employe(request):
 
                 employe = employe_form.save(commit=False)
                 employe.user = user
+                if not employe.employe_id:
+                    employe.employe_id = generate_employee_id()
                 
                 if is_manager(request.user):
                     try:
@@ -951,14 +870,9 @@ def add_employe(request):
             employees = get_employees_under_manager(manager)
 
             employees_with_status = []
-            today = timezone.now().date()
+            on_leave_today = absent_user_ids(timezone.now().date(), employees)
             for emp in employees:
-                is_on_leave = LeaveRequest.objects.filter(
-                    employee=emp,
-                    status='Approved',
-                    start_date__lte=today,
-                    end_date__gte=today
-                ).exists()
+                is_on_leave = emp.user_id in on_leave_today
 
                 status_text = ''
                 status_class = ''
@@ -1085,38 +999,13 @@ def edit_employe(request, id):
 @login_required(login_url='/managers/login')
 @role_required('manager', 'founder')
 def details(request, id):
-    from employe.models import Address, EmergencyContact, Benefits, WorkSchedule
-    employe = get_object_or_404(Employe, id=id)
-    user = employe.user
-    
-    # Fetch related data for employee
-    try:
-        address = Address.objects.filter(employe=employe).first()
-    except:
-        address = None
-        
-    try:
-        contact = EmergencyContact.objects.filter(employe=employe).first()
-    except:
-        contact = None
-        
-    try:
-        benefits = Benefits.objects.filter(employe=employe).first()
-    except:
-        benefits = None
-        
-    try:
-        workschedule = WorkSchedule.objects.filter(employe=employe).first()
-    except:
-        workschedule = None
+    aggregate = ProfileAggregate.load(Employe, EMPLOYE_SUMMARY_SECTIONS, id=id)
+    employe = aggregate.profile
 
     context = {
         'manager': employe,  # Use 'manager' key for template compatibility
-        'user': user,
-        'address': address,
-        'contact': contact,
-        'benefits': benefits,
-        'workschedule': workschedule,
+        'user': employe.user,
+        **aggregate.sections(),
         'is_employee_view': True,
         'back_url': request.META.get('HTTP_REFERER', reverse('managers:manager_dashboard')),
     }
@@ -1126,35 +1015,13 @@ def details(request, id):
 @login_required(login_url='/managers/founder/login/')
 @allow_founder
 def manager_full_details(request, id):
-    manager_obj = get_object_or_404(Manager, id=id)
-    
-    try:
-        address = AddressManager.objects.filter(manager=manager_obj).first()
-    except:
-        address = None
-        
-    try:
-        contact = EmergencyContactManager.objects.filter(manager=manager_obj).first()
-    except:
-        contact = None
-        
-    try:
-        benefits = BenefitsManager.objects.filter(manager=manager_obj).first()
-    except:
-        benefits = None
-        
-    try:
-        workschedule = WorkScheduleManager.objects.filter(manager=manager_obj).first()
-    except:
-        workschedule = None
+    aggregate = ProfileAggregate.load(Manager, MANAGER_SECTIONS, id=id)
+    manager_obj = aggregate.profile
 
     context = {
         'manager': manager_obj,
         'user': manager_obj.user,
-        'address': address,
-        'contact': contact,
-        'benefits': benefits,
-        'workschedule': workschedule,
+        **aggregate.sections(),
         'is_manager_view_by_founder': True,
         'back_url': request.META.get('HTTP_REFERER', reverse('managers:founder_dashboard')),
     }
@@ -1219,6 +1086,10 @@ def add_manager(request):
             if User.objects.filter(email=email).exists():
                 return JsonResponse({"status": "error", "message": "Email already exists."})
             
+            # Assign the next manager ID when none was entered
+            if not manager_id:
+                manager_id = generate_manager_id()
+
             # check duplicate manager_id
             if Manager.objects.filter(manager_id=manager_id).exists():
                 return JsonResponse({"status": "error", "message": "Manager ID already exists."})
@@ -1444,32 +1315,18 @@ def employees_list(request):
 def all_leave_history(request):
     user_role = get_user_role(request.user)
     
-    if user_role == 'founder':
-        # Fetch all leave requests for all employees
-        employee_leaves = LeaveRequest.objects.all().select_related('employee')
-        # Fetch all leave requests for all managers
-        manager_leaves = UnifiedLeaveRequest.objects.filter(
-            requested_by_role='manager'
-        ).select_related('manager__user')
-    else:
-        # Fallback for managers or others - should ideally be filtered too
+    # Employee and manager requests share one table, so this is a single ordered query
+    all_leaves = UnifiedLeaveRequest.objects.select_related('employee__user', 'manager__user')
+    if user_role != 'founder':
         try:
             manager = Manager.objects.get(user=request.user)
-            employee_leaves = LeaveRequest.objects.filter(employee__manager=manager).select_related('employee')
-            manager_leaves = UnifiedLeaveRequest.objects.filter(
-                manager=manager,
-                requested_by_role='manager'
-            ).select_related('manager__user')
+            all_leaves = all_leaves.filter(
+                Q(requested_by_role='employee', employee__manager=manager)
+                | Q(requested_by_role='manager', manager=manager)
+            )
         except Manager.DoesNotExist:
-            employee_leaves = LeaveRequest.objects.none()
-            manager_leaves = UnifiedLeaveRequest.objects.none()
-
-    # Combine and sort all leave requests by creation date
-    all_leaves = sorted(
-        list(employee_leaves) + list(manager_leaves),
-        key=lambda x: x.created_date,
-        reverse=True
-    )
+            all_leaves = all_leaves.none()
+    all_leaves = all_leaves.order_by('-created_date', '-id')
 
     context = {
         'all_leaves': all_leaves,
@@ -1521,21 +1378,22 @@ def leave_summary(request):
             'leave_balance': get_leave_balance_info(emp.user)
         })
     
-    manager_summary = []
-    for mng in managers:
-        # Calculate remaining leaves for the manager
-        total_annual_taken = UnifiedLeaveRequest.objects.filter(
-            manager=mng,
-            leave_type='AL',
-            is_approved=True
-        ).aggregate(total=Sum('leave_duration'))['total'] or 0
-
-        total_medical_taken = UnifiedLeaveRequest.objects.filter(
-            manager=mng,
-            leave_type='ML',
-            is_approved=True
-        ).aggregate(total=Sum('leave_duration'))['total'] or 0
+    # One grouped aggregate for every manager instead of two queries per manager
+    taken_by_manager = {
+        row['manager']: row
+        for row in UnifiedLeaveRequest.objects.filter(
+            requested_by_role='manager', manager__in=managers, status='Approved'
+        ).values('manager').annotate(
+            annual=Sum('leave_duration', filter=Q(leave_type='AL')),
+            medical=Sum('leave_duration', filter=Q(leave_type='ML')),
+        )
+    }
 
+    manager_summary = []
+    for mng in managers.select_related('user'):
+        taken = taken_by_manager.get(mng.id, {})
+        total_annual_taken = taken.get('annual') or 0
+        total_medical_taken = taken.get('medical') or 0
         manager_summary.append({
             'manager': mng,
             'annual_taken': total_annual_taken,
@@ -1567,45 +1425,34 @@ def employee_detail(request, id):
     return render(request, 'managers/employee_detail.html', context)
 
 
-def manager_forget_password(request):
+async def manager_forget_password(request):
     if request.method == 'POST':
         email = request.POST.get('email')
         try:
-            user = User.objects.get(Q(email=email) & (Q(is_manager=True) | Q(is_superuser=True)))
+            user = await User.objects.aget(Q(email=email) & (Q(is_manager=True) | Q(is_superuser=True)))
             
-            # Rate limiting: Max 3 OTPs per hour
-            one_hour_ago = timezone.now() - timedelta(hours=1)
-            otp_count = OTP.objects.filter(user=user, created_at__gte=one_hour_ago).count()
-            
-            if otp_count >= 3:
+            try:
+                otp_code = await sync_to_async(issue_otp)(user)
+            except OTPRateLimitExceeded:
                 messages.error(request, "Maximum OTP limit reached (3 per hour). Please try again later.")
-                return render(request, 'managers/forget_password.html')
-
-            otp_code = str(random.randint(100000, 999999))
-            otp, created = OTP.objects.update_or_create(
-                user=user,
-                defaults={
-                    'otp': otp_code,
-                    'expires_at': timezone.now() + timedelta(minutes=5)
-                }
-            )
+                return await sync_to_async(render)(request, 'managers/forget_password.html')
             
             subject = "Password Reset OTP"
             message = f"Your OTP for password reset is: {otp_code}\nThis OTP is valid for 5 minutes."
             
             try:
-                send_mail(subject, message, settings.EMAIL_HOST_USER, [email])
-                request.session['reset_email'] = email
+                await asend_mail(EmailMessage(subject, message, settings.EMAIL_HOST_USER, [email]))
+                await sync_to_async(request.session.__setitem__)('reset_email', email)
                 messages.success(request, "OTP sent to your email!")
                 return redirect(reverse('managers:reset_password'))
             except Exception as e:
                 messages.error(request, f"Failed to send email. You may have reached your daily limit or the configuration is incorrect. Error: {str(e)}")
-                return render(request, 'managers/forget_password.html')
+                return await sync_to_async(render)(request, 'managers/forget_password.html')
             
         except User.DoesNotExist:
             messages.error(request, "No manager account found with this email.")
     
-    return render(request, 'managers/forget_password.html')
+    return await sync_to_async(render)(request, 'managers/forget_password.html')
 
 
 def manager_resend_otp(request):
@@ -1617,22 +1464,11 @@ def manager_resend_otp(request):
     try:
         user = User.objects.get(email=email)
         
-        # Rate limiting: Max 3 OTPs per hour
-        one_hour_ago = timezone.now() - timedelta(hours=1)
-        otp_count = OTP.objects.filter(user=user, created_at__gte=one_hour_ago).count()
-        
-        if otp_count >= 3:
+        try:
+            otp_code = issue_otp(user)
+        except OTPRateLimitExceeded:
             messages.error(request, "Maximum OTP limit reached (3 per hour). Please try again later.")
             return redirect(reverse('managers:reset_password'))
-
-        otp_code = str(random.randint(100000, 999999))
-        OTP.objects.update_or_create(
-            user=user,
-            defaults={
-                'otp': otp_code,
-                'expires_at': timezone.now() + timedelta(minutes=5)
-            }
-        )
         
         subject = "Password Reset OTP"
         message = f"Your OTP for password reset is: {otp_code}\nThis OTP is valid for 5 minutes."
@@ -1662,16 +1498,19 @@ def manager_reset_password(request):
         
         try:
             user = User.objects.get(email=email)
-            otp = OTP.objects.get(user=user, otp=otp_code)
+            otp_status = check_otp(user, otp_code)
+            if otp_status == OTP_INVALID:
+                messages.error(request, "Invalid OTP!")
+                return render(request, 'managers/reset_password.html')
             
-            if otp.is_expired():
+            if otp_status == OTP_EXPIRED:
                 messages.error(request, "OTP has expired!")
                 return render(request, 'managers/reset_password.html')
             
             user.set_password(new_password)
             user.save()
             
-            otp.delete()
+            consume_otp(user)
             
             if 'reset_email' in request.session:
                 del request.session['reset_email']
@@ -1679,7 +1518,7 @@ def manager_reset_password(request):
             messages.success(request, "Password reset successfully! Please login.")
             return redirect(reverse('managers:login'))
             
-        except (User.DoesNotExist, OTP.DoesNotExist):
+        except User.DoesNotExist:
             messages.error(request, "Invalid OTP!")
     
     return render(request, 'managers/reset_password.html')
@@ -1688,35 +1527,14 @@ def manager_reset_password(request):
 @login_required(login_url='/managers/login')
 @role_required('manager')
 def view_profile(request):
-    manager = get_object_or_404(Manager, user=request.user)
-    
-    try:
-        address = AddressManager.objects.get(manager=manager)
-    except AddressManager.DoesNotExist:
-        address = None
-        
-    try:
-        contact = EmergencyContactManager.objects.get(manager=manager)
-    except EmergencyContactManager.DoesNotExist:
-        contact = None
-        
-    try:
-        benefits = BenefitsManager.objects.get(manager=manager)
-    except BenefitsManager.DoesNotExist:
-        benefits = None
-
-    try:
-        workschedule = WorkScheduleManager.objects.get(manager=manager)
-    except WorkScheduleManager.DoesNotExist:
-        workschedule = None
+    aggregate = ProfileAggregate.load(Manager, MANAGER_SECTIONS, user=request.user)
+    manager = aggregate.profile
 
     context = {
         'manager': manager,
         'user': manager.user,
-        'address': address,
-        'contact': contact,
-        'benefits': benefits,
-        'workschedule': workschedule,
+        **aggregate.sections(),
+        'calendar_feeds': calendar_feed_links(request, request.user),
     }
     return render(request, 'managers/details.html', context)
 
@@ -0,0 +1,443 @@
+"""
+Set-based year-end leave operations and the run ledger that keeps them idempotent.
+
+The yearly reset (Dec 31st), the carryforward grant (Dec 31st) and the
+carryforward cleanup (Mar 31st) can be triggered by Celery beat, the
+process_carryforward_leaves command and the APScheduler scheduler. Every
+trigger goes through a YearEndRun row keyed by (job, fiscal_year) and works
+through id-range partitions that each leave a YearEndPartition checkpoint, so
+a repeated trigger is a no-op and an interrupted run resumes where it stopped.
+"""
+import logging
+import multiprocessing
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, IntegerField, Max, Min, Q, Value, When, Sum
+from django.db.models.functions import Least
+from django.utils import timezone
+
+from employe.models import Employe
+from .models import Manager, YearEndPartition, YearEndRun
+
+logger = logging.getLogger(__name__)
+
+# Leave profile tables touched by the year-end jobs
+PROFILE_MODELS = (('employee', Employe), ('manager', Manager))
+
+# Width of the id range handled by one partition of a year-end job
+YEAR_END_PARTITION_SIZE = 2000
+
+# A dispatched run that has not completed after this long may be dispatched again
+YEAR_END_RUN_STALE_AFTER = timedelta(hours=2)
+
+# A completed run of the key job already covers the value job for that year
+YEAR_END_SUPERSEDED_BY = {
+    'carryforward_grant': 'yearly_reset',
+}
+
+
+# ==================== SET-BASED BALANCE UPDATES ====================
+
+def reset_profiles_for_new_year(queryset, annual_allocation, medical_allocation,
+                                carryforward_limit, eligibility_threshold):
+    """
+    Reset every profile in the queryset (Employe or Manager rows) with a single
+    set-based UPDATE ... CASE statement.
+
+    Returns a tuple of (total profiles, profiles granted carryforward).
+    """
+    eligible = Q(available_leaves__gte=eligibility_threshold)
+    carryforward = Case(
+        When(eligible, then=Value(carryforward_limit)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+    with transaction.atomic():
+        counts = queryset.aggregate(
+            total=Count('id'),
+            with_carryforward=Count('id', filter=eligible),
+        )
+
+        # The carryforward columns are assigned before available_leaves so the
+        # CASE reads last year's balance on backends that apply SET clauses
+        # left to right (MySQL).
+        queryset.update(
+            carryforward_available_leaves=carryforward,
+            carryforward_granted=carryforward,
+            available_leaves=annual_allocation,
+            leaves_taken=0,
+            available_medical_leaves=medical_allocation,
+            medical_leaves_taken=0,
+            carryforward_leaves_taken=0,
+            updated_datetime=timezone.now(),
+        )
+
+    return counts['total'], counts['with_carryforward']
+
+
+def cleanup_carryforward_balances(queryset, annual_allocation, dry_run=False):
+    """
+    Zero the carryforward columns and clamp available_leaves to the annual
+    allocation for every profile in the queryset with one UPDATE.
+
+    Returns a dict with the total profiles, the profiles that still held
+    carryforward leaves and the number of leaves forfeited.
+    """
+    holds_carryforward = Q(carryforward_available_leaves__gt=0)
+
+    with transaction.atomic():
+        counts = queryset.aggregate(
+            total=Count('id'),
+            cleaned=Count('id', filter=holds_carryforward),
+            forfeited=Sum('carryforward_available_leaves', filter=holds_carryforward),
+        )
+
+        if not dry_run:
+            queryset.update(
+                carryforward_available_leaves=0,
+                carryforward_leaves_taken=0,
+                available_leaves=Least(F('available_leaves'), Value(annual_allocation)),
+                updated_datetime=timezone.now(),
+            )
+
+    return {
+        'total': counts['total'],
+        'cleaned': counts['cleaned'],
+        'forfeited': counts['forfeited'] or 0,
+    }
+
+
+def grant_carryforward_balances(queryset, carryforward_limit, eligibility_threshold, dry_run=False):
+    """
+    Grant carryforward leaves to every profile in the queryset whose unused
+    annual balance meets the eligibility threshold, with one UPDATE.
+
+    Returns a dict with the total profiles and the number found eligible.
+    """
+    eligible = Q(available_leaves__gte=eligibility_threshold)
+
+    with transaction.atomic():
+        counts = queryset.aggregate(
+            total=Count('id'),
+            eligible=Count('id', filter=eligible),
+        )
+
+        if not dry_run:
+            queryset.filter(eligible).update(
+                carryforward_available_leaves=carryforward_limit,
+                carryforward_granted=carryforward_limit,
+                carryforward_leaves_taken=0,
+                updated_datetime=timezone.now(),
+            )
+
+    return counts
+
+
+# ==================== PARTITIONS ====================
+
+def id_range_partitions(model, partition_size=YEAR_END_PARTITION_SIZE):
+    """
+    Split a profile table into (start_id, end_id) ranges aligned to multiples
+    of partition_size, so the ranges of a run do not move when rows are added
+    or deleted between attempts.
+    """
+    bounds = model.objects.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return []
+
+    first = bounds['low'] // partition_size * partition_size
+    return [
+        (start_id, start_id + partition_size - 1)
+        for start_id in range(first, bounds['high'] + 1, partition_size)
+    ]
+
+
+def year_end_partitions(partition_size=YEAR_END_PARTITION_SIZE):
+    """List (role, start_id, end_id) partitions covering every employee and manager"""
+    return [
+        (role, start_id, end_id)
+        for role, model in PROFILE_MODELS
+        for start_id, end_id in id_range_partitions(model, partition_size)
+    ]
+
+
+def _apply_year_end_job(job, queryset):
+    """
+    Apply one year-end job to a queryset of profiles and return its stats as
+    {'total', 'affected', 'leaves'}.
+    """
+    config = settings.LEAVE_MANAGEMENT_CONFIG
+
+    if job == 'yearly_reset':
+        total, with_carryforward = reset_profiles_for_new_year(
+            queryset,
+            config['ANNUAL_LEAVE_ALLOCATION'],
+            config['MEDICAL_LEAVE_ALLOCATION'],
+            config['CARRYFORWARD_LIMIT'],
+            config['CARRYFORWARD_ELIGIBILITY_THRESHOLD'],
+        )
+        return {
+            'total': total,
+            'affected': with_carryforward,
+            'leaves': with_carryforward * config['CARRYFORWARD_LIMIT'],
+        }
+
+    if job == 'carryforward_cleanup':
+        stats = cleanup_carryforward_balances(queryset, config['ANNUAL_LEAVE_ALLOCATION'])
+        return {
+            'total': stats['total'],
+            'affected': stats['cleaned'],
+            'leaves': stats['forfeited'],
+        }
+
+    if job == 'carryforward_grant':
+        stats = grant_carryforward_balances(
+            queryset,
+            config['CARRYFORWARD_LIMIT'],
+            config['CARRYFORWARD_ELIGIBILITY_THRESHOLD'],
+        )
+        return {
+            'total': stats['total'],
+            'affected': stats['eligible'],
+            'leaves': stats['eligible'] * config['CARRYFORWARD_LIMIT'],
+        }
+
+    raise ValueError(f"Unknown year-end job: {job}")
+
+
+def apply_year_end_partition(job, role, start_id, end_id, fiscal_year):
+    """
+    Apply a year-end job to one id range of employees or managers.
+
+    The YearEndPartition checkpoint is written in the same transaction as the
+    balance update, so a partition that already committed returns the stats
+    it recorded the first time instead of applying the job again.
+    """
+    model = dict(PROFILE_MODELS)[role]
+
+    with transaction.atomic():
+        marker, created = YearEndPartition.objects.get_or_create(
+            job=job,
+            run_key=str(fiscal_year),
+            role=role,
+            start_id=start_id,
+            defaults={'end_id': end_id},
+        )
+        if not created:
+            logger.info(f"Year-end {job} partition {role} {start_id}-{end_id} already applied for {fiscal_year}")
+            return {'role': role, **marker.stats}
+
+        queryset = model.objects.filter(id__gte=start_id, id__lte=end_id)
+        marker.stats = _apply_year_end_job(job, queryset)
+        marker.save(update_fields=['stats'])
+
+    return {'role': role, **marker.stats}
+
+
+def merge_partition_stats(job, results):
+    """Merge partition results into the stats dict used by the notification emails"""
+    totals = {
+        role: {'total': 0, 'affected': 0, 'leaves': 0}
+        for role, _ in PROFILE_MODELS
+    }
+    for result in results:
+        role_totals = totals[result['role']]
+        for key in role_totals:
+            role_totals[key] += result.get(key, 0)
+
+    employees, managers = totals['employee'], totals['manager']
+
+    if job == 'carryforward_cleanup':
+        return {
+            'total_employees': employees['total'],
+            'total_managers': managers['total'],
+            'employees_cleaned': employees['affected'],
+            'managers_cleaned': managers['affected'],
+            'total_leaves_forfeited': employees['leaves'] + managers['leaves'],
+        }
+
+    return {
+        'total_employees': employees['total'],
+        'total_managers': managers['total'],
+        'employees_with_carryforward': employees['affected'],
+        'managers_with_carryforward': managers['affected'],
+        'total_carryforward_leaves': employees['leaves'] + managers['leaves'],
+    }
+
+
+# ==================== RUN LEDGER ====================
+
+def current_fiscal_year():
+    """Fiscal year used to key year-end runs"""
+    return timezone.localdate().year
+
+
+@contextmanager
+def year_end_lock(job, fiscal_year):
+    """
+    Hold a PostgreSQL session advisory lock for one (job, fiscal_year).
+
+    Yields False when another process already holds it. On other database
+    backends the lock is skipped and the ledger and partition checkpoints are
+    the only guard.
+    """
+    if connection.vendor != 'postgresql':
+        yield True
+        return
+
+    key = zlib.crc32(f"year-end:{job}:{fiscal_year}".encode())
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", [key])
+        acquired = cursor.fetchone()[0]
+
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [key])
+
+
+class YearEndPartitionSizeMismatch(Exception):
+    """An interrupted run is resumed with a partition size other than the one it started with"""
+
+
+def claim_year_end_run(job, fiscal_year, partition_size=YEAR_END_PARTITION_SIZE, allow_in_progress=True):
+    """
+    Return the YearEndRun ledger row to work on, or None when the job has
+    already completed (or been superseded) for this fiscal year.
+
+    With allow_in_progress=False a run that is still being worked on by
+    someone else, and is not stale yet, is also treated as a no-op.
+
+    Raises YearEndPartitionSizeMismatch when resuming a run that was started
+    with another partition size: its checkpoints would not line up with the
+    new ranges, so profiles would be updated twice or skipped.
+    """
+    superseded_by = YEAR_END_SUPERSEDED_BY.get(job)
+    if superseded_by and YearEndRun.objects.filter(
+        job=superseded_by, fiscal_year=fiscal_year, status='completed'
+    ).exists():
+        logger.info(f"Year-end {job} for {fiscal_year} skipped: already covered by {superseded_by}")
+        return None
+
+    run, created = YearEndRun.objects.get_or_create(
+        job=job, fiscal_year=fiscal_year, defaults={'partition_size': partition_size}
+    )
+    if created:
+        return run
+
+    if run.status == 'completed':
+        logger.info(f"Year-end {job} for {fiscal_year} already completed at {run.completed_at}")
+        return None
+
+    if not allow_in_progress and run.updated_datetime > timezone.now() - YEAR_END_RUN_STALE_AFTER:
+        logger.info(f"Year-end {job} for {fiscal_year} is already in progress")
+        return None
+
+    if run.partition_size is None:
+        # Started before runs recorded their partition size
+        run.partition_size = partition_size
+    elif run.partition_size != partition_size:
+        raise YearEndPartitionSizeMismatch(
+            f"Year-end {job} for {fiscal_year} was started with partitions of {run.partition_size} ids, "
+            f"resume it with that size instead of {partition_size}"
+        )
+
+    # Resuming a run that was interrupted: touch it so it is no longer stale
+    run.save(update_fields=['partition_size', 'updated_datetime'])
+    return run
+
+
+def complete_year_end_run(run, stats):
+    """
+    Mark a run completed with its merged stats. Returns False if another
+    caller completed it first, so side effects such as emails happen once.
+    """
+    return bool(
+        YearEndRun.objects.filter(pk=run.pk, status='running').update(
+            status='completed',
+            stats=stats,
+            completed_at=timezone.now(),
+            updated_datetime=timezone.now(),
+        )
+    )
+
+
+def _init_partition_worker():
+    """Process pool initializer: load Django in a freshly spawned worker"""
+    import django
+    django.setup()
+
+
+def _apply_partitions(job, partitions, fiscal_year, workers=1):
+    """Apply partitions in this process, or across a pool of worker processes"""
+    if workers <= 1 or len(partitions) <= 1:
+        return [
+            apply_year_end_partition(job, role, start_id, end_id, fiscal_year)
+            for role, start_id, end_id in partitions
+        ]
+
+    # Spawned (not forked) workers open their own database connections instead
+    # of sharing the socket that holds this process's advisory lock.
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_partition_worker,
+    ) as executor:
+        futures = [
+            executor.submit(apply_year_end_partition, job, role, start_id, end_id, fiscal_year)
+            for role, start_id, end_id in partitions
+        ]
+        return [future.result() for future in futures]
+
+
+def run_year_end_job_inline(job, fiscal_year=None, partition_size=YEAR_END_PARTITION_SIZE, workers=1):
+    """
+    Run a year-end job from this process, one partition at a time or across
+    `workers` processes.
+
+    Returns the merged stats, or None when the run was a no-op because it is
+    locked by another process, already completed or superseded.
+    """
+    fiscal_year = fiscal_year or current_fiscal_year()
+
+    with year_end_lock(job, fiscal_year) as acquired:
+        if not acquired:
+            logger.info(f"Year-end {job} for {fiscal_year} is locked by another process")
+            return None
+
+        run = claim_year_end_run(job, fiscal_year, partition_size)
+        if run is None:
+            return None
+
+        results = _apply_partitions(job, year_end_partitions(partition_size), fiscal_year, workers)
+        stats = merge_partition_stats(job, results)
+
+        if not complete_year_end_run(run, stats):
+            return None
+
+    logger.info(f"Year-end {job} for {fiscal_year} completed. Stats: {stats}")
+    return stats
+
+
+def year_end_progress(job, fiscal_year):
+    """Report the ledger status and checkpointed partitions of a year-end run"""
+    run = YearEndRun.objects.filter(job=job, fiscal_year=fiscal_year).first()
+    progress = YearEndPartition.objects.filter(job=job, run_key=str(fiscal_year)).aggregate(
+        completed=Count('id'),
+        last_completed_at=Max('completed_at'),
+    )
+    return {
+        'job': job,
+        'fiscal_year': fiscal_year,
+        'status': run.status if run else None,
+        'completed_partitions': progress['completed'],
+        'last_completed_at': progress['last_completed_at'],
+    }
@@ -3,6 +3,12 @@ ASGI config for project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server, e.g.
+``gunicorn project.asgi:application -k uvicorn.workers.UvicornWorker``, so the
+async views (leave apply/approve/reject, password reset OTPs) wait on SMTP
+without holding a worker, and the live dashboard updates (managers.live)
+stream without a thread per open dashboard.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -43,6 +43,18 @@ app.conf.beat_schedule = {
         'task': 'managers.tasks.test_carryforward_system',
         'schedule': crontab(minute=0, hour=2),
     },
+
+    # Hourly purge of expired password reset OTPs
+    'purge-expired-otps': {
+        'task': 'managers.tasks.purge_expired_otps',
+        'schedule': crontab(minute=15),
+    },
+
+    # Daily removal of uploads nothing references any more
+    'collect-unreferenced-blobs': {
+        'task': 'managers.tasks.collect_unreferenced_blobs',
+        'schedule': crontab(minute=30, hour=3),
+    },
 }
 
 # Timezone configuration
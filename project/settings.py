@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     'managers',
     'employe',
     'leaves',
+    'api',
 
 
 
@@ -136,6 +137,13 @@ else:
     MEDIA_URL = '/media/'  # ✅ FIX: Remove the comma
     MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Who sends leave attachments and PAN card files (common.views.serve_upload):
+# 'nginx' (X-Accel-Redirect to UPLOAD_SENDFILE_URL, an `internal` location
+# aliasing MEDIA_ROOT), 'apache' (mod_xsendfile's X-Sendfile) or unset to
+# stream them from Django
+UPLOAD_SENDFILE_BACKEND = os.getenv('UPLOAD_SENDFILE_BACKEND') or None
+UPLOAD_SENDFILE_URL = os.getenv('UPLOAD_SENDFILE_URL', '/protected-media/')
+
 STATIC_URL = '/static/'  # Also make this consistent with slash
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
@@ -143,9 +151,9 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 AUTH_USER_MODEL = 'users.User'
 AUTH_PROFILE_MODULE = 'users.User'
 
+# A single backend, so a failed login hashes the password only once
 AUTHENTICATION_BACKENDS = [
     'users.backends.EmailBackend',
-    'django.contrib.auth.backends.ModelBackend',
 ]
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -155,7 +163,12 @@ REST_FRAMEWORK = {
         'rest_framework_simplejwt.authentication.JWTAuthentication',
         'rest_framework.authentication.BasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-    ]
+    ],
+    'DEFAULT_VERSIONING_CLASS': 'rest_framework.versioning.URLPathVersioning',
+    'ALLOWED_VERSIONS': ['v1'],
+    'DEFAULT_VERSION': 'v1',
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.IdCursorPagination',
+    'EXCEPTION_HANDLER': 'common.exceptions.custom_exception_handler',
 }
 
 SIMPLE_JWT = {
@@ -216,6 +229,57 @@ CELERY_TASK_ROUTES = {
 # Default queue
 CELERY_TASK_DEFAULT_QUEUE = 'default'
 
+# ==================== LIVE DASHBOARD UPDATES ====================
+
+# Redis used to fan leave events out to the dashboard streams (managers.live)
+LIVE_UPDATES_REDIS_URL = os.getenv('LIVE_UPDATES_REDIS_URL', CELERY_BROKER_URL)
+
+# ==================== PUSH NOTIFICATIONS ====================
+
+# Leave events are pushed to registered devices through FCM when enabled
+PUSH_NOTIFICATIONS_ENABLED = os.getenv('PUSH_NOTIFICATIONS_ENABLED', 'False') == 'True'
+
+# Service account JSON for Firebase; application default credentials when empty
+FIREBASE_CREDENTIALS_FILE = os.getenv('FIREBASE_CREDENTIALS_FILE', '')
+
+FCM_DJANGO_SETTINGS = {
+    'ONE_DEVICE_PER_USER': False,
+    # Remove tokens FCM reports as unregistered instead of only deactivating them
+    'DELETE_INACTIVE_DEVICES': True,
+}
+
+# ==================== CALENDAR FEEDS ====================
+
+# Domain part of the UIDs of leave events in the webcal:// feeds
+LEAVE_FEED_UID_DOMAIN = os.getenv('LEAVE_FEED_UID_DOMAIN', 'leave-management')
+
+# Cached feeds are shared by every process only with a shared cache;
+# the default per-process memory cache is fine for a single process
+if os.getenv('CACHE_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('CACHE_REDIS_URL'),
+        }
+    }
+
+# ==================== GOOGLE CALENDAR ====================
+
+# Approved leaves are added to the approvers' Google Calendars when enabled
+GOOGLE_CALENDAR_ENABLED = os.getenv('GOOGLE_CALENDAR_ENABLED', 'False') == 'True'
+
+# OAuth client secrets, and the token written by `manage.py setup_google_calendar`
+GOOGLE_CALENDAR_CREDENTIALS_FILE = os.getenv('GOOGLE_CALENDAR_CREDENTIALS_FILE', os.path.join(BASE_DIR, 'credentials.json'))
+GOOGLE_CALENDAR_TOKEN_FILE = os.getenv('GOOGLE_CALENDAR_TOKEN_FILE', os.path.join(BASE_DIR, 'token.json'))
+
+# Shared "Team Leave" calendar id; when set, each leave keeps one event there
+# (upserted on approval, deleted on rejection or cancellation) instead of
+# an event in the manager's and every founder's own calendar
+GOOGLE_CALENDAR_TEAM_CALENDAR_ID = os.getenv('GOOGLE_CALENDAR_TEAM_CALENDAR_ID', '')
+
+# Overrides the Calendar API root URL, e.g. to point at a local fake server
+GOOGLE_CALENDAR_API_ENDPOINT = os.getenv('GOOGLE_CALENDAR_API_ENDPOINT', '')
+
 # Leave Management Configuration
 LEAVE_MANAGEMENT_CONFIG = {
     'ANNUAL_LEAVE_ALLOCATION': 18,
@@ -3,12 +3,18 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from common.views import serve_upload
+
 urlpatterns = [
     path('admin/', admin.site.urls),
 
     path("",include("employe.urls", namespace="employe")),
     path("managers/",include("managers.urls", namespace="managers")),
     path("leaves/",include("leaves.urls", namespace="leaves")),
+    path("api/",include("api.urls", namespace="api")),
+
+    # Leave attachments and PAN card files, see common/storage.py
+    path("files/<path:name>", serve_upload, name="serve_upload"),
 ]
 
 
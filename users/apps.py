@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from django.contrib.auth.signals import user_logged_in
+        from .backends import dummy_password_hash
+
+        # A login is one query: last_login is not stamped on every sign-in
+        user_logged_in.disconnect(dispatch_uid='update_last_login')
+        # Hash the dummy password now, so the first unknown-email login does
+        # not pay for two hashes
+        dummy_password_hash()
@@ -1,15 +1,67 @@
+from functools import lru_cache
+
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, make_password
+from django.db.models import Exists, OuterRef, Subquery
+from django.utils.crypto import get_random_string
 
 User = get_user_model()
 
+
+@lru_cache(maxsize=1)
+def dummy_password_hash():
+    """
+    Hash checked for unknown emails, so they take as long to reject as a
+    wrong password. Computed once at startup by UsersConfig.ready().
+    """
+    return make_password(get_random_string(32))
+
+
+def with_founder_flag(queryset):
+    """Annotate `founder_flag`, which common.utils.is_founder reads instead of querying Founder"""
+    from managers.models import Founder
+
+    return queryset.annotate(founder_flag=Exists(Founder.objects.filter(user=OuterRef('pk'))))
+
+
+def with_login_profile(queryset, role):
+    """Annotate `login_profile_id`: the manager or employee ID a role login form asks for"""
+    from employe.models import Employe
+    from managers.models import Manager
+
+    model, field = {'manager': (Manager, 'manager_id'), 'employee': (Employe, 'employe_id')}[role]
+    return queryset.annotate(
+        login_profile_id=Subquery(model.objects.filter(user=OuterRef('pk')).values(field)[:1])
+    )
+
+
 class EmailBackend(ModelBackend):
-    def authenticate(self, request, username=None, password=None, **kwargs):
+    """
+    The only authentication backend. A login is one lookup on the unique
+    email index, which also reads the founder flag and, for manager and
+    employee logins (`role`), the profile ID to compare with the form.
+    """
+
+    def authenticate(self, request, username=None, password=None, role=None, **kwargs):
         email = kwargs.get('email', username)
-        try:
-            user = User.objects.get(email=email)
-            if user.check_password(password):
-                return user
-        except User.DoesNotExist:
+        if email is None or password is None:
             return None
+
+        users = with_founder_flag(User._default_manager.filter(email=email))
+        if role is not None:
+            users = with_login_profile(users, role)
+        user = users.first()
+
+        if user is None:
+            # Spend the same hashing time as for a wrong password
+            check_password(password, dummy_password_hash())
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
         return None
+
+    def get_user(self, user_id):
+        # Runs on every request; the founder flag spares the role checks a query
+        user = with_founder_flag(User._default_manager.filter(pk=user_id)).first()
+        return user if user is not None and self.user_can_authenticate(user) else None
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:18
+
+from django.db import migrations, models
+
+
+def delete_plaintext_otps(apps, schema_editor):
+    # Codes were stored in plaintext until now and cannot be checked against hashes
+    apps.get_model('users', 'OTP').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_user_employee_user_manager'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_plaintext_otps, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='otp',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='otp',
+            name='otp',
+            field=models.CharField(max_length=64),
+        ),
+    ]
@@ -10,6 +10,8 @@ from django.utils import timezone
 class Profile(models.Model):
     user = models.OneToOneField('User', on_delete=models.CASCADE)
     image = models.ImageField(upload_to='profile_images/', default='profile_images/default.jpg', null=True, blank=True)
+    # Thumbnail storage names by rendition and format, see managers/thumbnails.py
+    image_thumbnails = models.JSONField(default=dict, blank=True, editable=False)
     designation = models.CharField(max_length=100, null=True, blank=True)
     department = models.CharField(max_length=100, null=True, blank=True)
 
@@ -66,6 +68,10 @@ class User(AbstractUser):
     manager = models.OneToOneField('managers.Manager', on_delete=models.CASCADE, null=True, blank=True, related_name='user_manager')
     employee = models.OneToOneField('employe.Employe', on_delete=models.CASCADE, null=True, blank=True, related_name='user_employee')
 
+    # Last save of the account; the people API tags its responses with it
+    # since they show the name, email and phone number
+    updated_at = models.DateTimeField(auto_now=True, null=True, blank=True)
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
 
@@ -78,7 +84,11 @@ from django.db.models.signals import post_save
 from django.dispatch import receiver
 
 @receiver(post_save, sender=User)
-def create_or_update_user_profile(sender, instance, created, **kwargs):
+def create_or_update_user_profile(sender, instance, created, update_fields=None, **kwargs):
+    # A save that only stamps last_login has nothing to update on the profile
+    if update_fields == frozenset({'last_login'}):
+        return
+
     if created:
         Profile.objects.create(user=instance)
     
@@ -89,9 +99,12 @@ def create_or_update_user_profile(sender, instance, created, **kwargs):
 
 class OTP(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    otp = models.CharField(max_length=6)
+    # Keyed hash of the code (users.otp.hash_otp), never the code itself
+    otp = models.CharField(max_length=64)
+    # Wrong guesses so far, see users.otp.OTP_MAX_ATTEMPTS
+    attempts = models.PositiveSmallIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
-    expires_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
 
     class Meta:
         ordering = ['-created_at']
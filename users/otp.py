@@ -0,0 +1,111 @@
+"""
+One-time passwords for the employee and manager password reset flows.
+
+Only a keyed hash of a code is stored, in its OTP row. The row is the only
+record of the code and of the wrong guesses made against it, so every
+process sees a resent or used-up code at once. Sends are limited per user
+with a counter in the cache, so issuing a code never counts rows; the limit
+is shared by all processes only with a shared cache (CACHE_REDIS_URL).
+purge_expired_otps() (run by Celery beat) deletes the rows of codes that
+have run out.
+"""
+import secrets
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from .models import OTP
+
+# How long a code stays valid
+OTP_LIFETIME = timedelta(minutes=5)
+
+# Codes a user may be sent within OTP_RATE_WINDOW
+OTP_RATE_LIMIT = 3
+OTP_RATE_WINDOW = timedelta(hours=1)
+
+# Wrong guesses after which a code stops being accepted
+OTP_MAX_ATTEMPTS = 5
+
+# check_otp() results
+OTP_VALID = 'valid'
+OTP_INVALID = 'invalid'
+OTP_EXPIRED = 'expired'
+
+_HASH_SALT = 'users.otp'
+
+
+class OTPRateLimitExceeded(Exception):
+    """The user has been sent OTP_RATE_LIMIT codes within the last OTP_RATE_WINDOW"""
+
+
+def _sent_key(user_id):
+    return f"otp:sent:{user_id}"
+
+
+def hash_otp(user_id, code):
+    """Keyed hash of a code, bound to the user it was issued to"""
+    return salted_hmac(_HASH_SALT, f"{user_id}:{code}", algorithm='sha256').hexdigest()
+
+
+def _count_send(user_id):
+    """Count a send in the user's current rate window and return the sends so far"""
+    key = _sent_key(user_id)
+    window = OTP_RATE_WINDOW.total_seconds()
+    if cache.add(key, 1, window):
+        return 1
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The window ran out between add() and incr()
+        cache.add(key, 1, window)
+        return 1
+
+
+def issue_otp(user):
+    """
+    Generate a new code for the user, replacing any earlier one, and return
+    it for sending. Raises OTPRateLimitExceeded once the user is at the limit.
+    """
+    if _count_send(user.pk) > OTP_RATE_LIMIT:
+        raise OTPRateLimitExceeded()
+
+    code = str(secrets.randbelow(900000) + 100000)
+    otp = OTP(user=user, otp=hash_otp(user.pk, code), expires_at=timezone.now() + OTP_LIFETIME)
+    with transaction.atomic():
+        OTP.objects.filter(user=user).delete()
+        otp.save()
+    return code
+
+
+def check_otp(user, code):
+    """OTP_VALID, OTP_INVALID or OTP_EXPIRED for a code the user entered; does not use it up"""
+    otp = OTP.objects.filter(user=user).only('otp', 'expires_at').first()
+    if otp is None:
+        return OTP_INVALID
+    if otp.expires_at < timezone.now():
+        return OTP_EXPIRED
+
+    # Take an attempt before comparing, so concurrent guesses cannot all
+    # get past the limit, and hand it back if the code was right
+    attempt = OTP.objects.filter(pk=otp.pk, attempts__lt=OTP_MAX_ATTEMPTS)
+    if not attempt.update(attempts=F('attempts') + 1):
+        return OTP_INVALID
+    if not constant_time_compare(otp.otp, hash_otp(user.pk, code or '')):
+        return OTP_INVALID
+    OTP.objects.filter(pk=otp.pk).update(attempts=F('attempts') - 1)
+    return OTP_VALID
+
+
+def consume_otp(user):
+    """Discard the user's code once it has been used"""
+    OTP.objects.filter(user=user).delete()
+
+
+def purge_expired_otps():
+    """Delete the OTP rows of expired codes and return how many were removed"""
+    deleted, _ = OTP.objects.filter(expires_at__lt=timezone.now()).delete()
+    return deleted
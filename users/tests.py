@@ -1,3 +1,69 @@
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from project.celery import app
+from .backends import dummy_password_hash
+from .models import User
+from .otp import (
+    OTP_INVALID, OTP_MAX_ATTEMPTS, OTP_RATE_LIMIT, OTP_VALID,
+    OTPRateLimitExceeded, check_otp, consume_otp, issue_otp,
+)
+
+
+class OTPTests(TestCase):
+    """Codes are checked against their OTP row, whatever the local cache holds"""
+
+    def setUp(self):
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', False)
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(username='employee', email='employee@example.com', password='x')
+
+    def test_used_code_is_rejected_everywhere(self):
+        code = issue_otp(self.user)
+        self.assertEqual(check_otp(self.user, code), OTP_VALID)
+        consume_otp(self.user)
+        self.assertEqual(check_otp(self.user, code), OTP_INVALID)
+
+    def test_resent_code_replaces_the_old_one(self):
+        old = issue_otp(self.user)
+        new = issue_otp(self.user)
+        self.assertEqual(check_otp(self.user, new), OTP_VALID)
+        if old != new:
+            self.assertEqual(check_otp(self.user, old), OTP_INVALID)
+
+    def test_wrong_guesses_use_up_the_code(self):
+        code = issue_otp(self.user)
+        wrong = '000000' if code != '000000' else '111111'
+        for _ in range(OTP_MAX_ATTEMPTS):
+            self.assertEqual(check_otp(self.user, wrong), OTP_INVALID)
+        self.assertEqual(check_otp(self.user, code), OTP_INVALID)
+
+    def test_right_code_does_not_count_as_an_attempt(self):
+        code = issue_otp(self.user)
+        for _ in range(OTP_MAX_ATTEMPTS + 1):
+            self.assertEqual(check_otp(self.user, code), OTP_VALID)
+
+    def test_sends_are_limited(self):
+        for _ in range(OTP_RATE_LIMIT):
+            issue_otp(self.user)
+        with self.assertRaises(OTPRateLimitExceeded):
+            issue_otp(self.user)
+
+
+class LoginTests(TestCase):
+    """A login reads the user once and writes nothing back"""
+
+    def setUp(self):
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', False)
+        self.user = User.objects.create_user(username='employee', email='employee@example.com', password='x')
+
+    def test_login_does_not_stamp_last_login(self):
+        self.assertTrue(self.client.login(email='employee@example.com', password='x'))
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_login)
+
+    def test_dummy_hash_is_ready_before_the_first_login(self):
+        self.assertEqual(dummy_password_hash.cache_info().currsize, 1)